@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+USE_CASE = "As an underwriter I want to add a driver to an auto policy mid-term so that the premium is recalculated."
+
+
+def start_local_server(concurrency, waiting, timeout):
+    """The API on a free local port, backed by the stub model, served from a daemon thread."""
+    import uvicorn
+
+    from api_server import Admission, create_app
+    from genai_client import get_model
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    app = create_app(get_model("stub"), Admission(concurrency, waiting, timeout), token="")
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=2048))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("the local API server did not start")
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def request(url, method="GET", body=None, token="", timeout=600):
+    # Minimal HTTP/1.1 client (one connection per request) so the load test needs nothing beyond the stdlib
+    parts = urlsplit(url)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    try:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = [f"{method} {parts.path or '/'}{'?' + parts.query if parts.query else ''} HTTP/1.1",
+                f"Host: {parts.netloc}", "Connection: close", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            head.append("Content-Type: application/json")
+        if token:
+            head.append(f"Authorization: Bearer {token}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    header, _, content = data.partition(b"\r\n\r\n")
+    lines = header.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+    return int(lines[0].split(" ", 2)[1]), {key.lower(): value for key, value in headers.items()}, content
+
+
+async def run_load(url, endpoint, requests, clients, fmt, mode, token, timeout, retries):
+    pending = iter(range(requests))
+    results = []
+    busy = Counter()
+
+    async def client():
+        for i in pending:
+            # A distinct use case per request, so neither the response cache nor single-flight can serve it
+            body = {"use_case": f"{USE_CASE} Request {i}.", "format": fmt, "mode": mode}
+            if endpoint == "test-cases":
+                body["brd"] = f"# BRD {i}\n\n## 1. Scope\n\n{USE_CASE}"
+            started = time.perf_counter()
+            for attempt in range(retries + 1):
+                try:
+                    status, headers, _ = await request(f"{url}/v1/{endpoint}", "POST", body, token, timeout)
+                except (OSError, asyncio.TimeoutError) as e:
+                    status = type(e).__name__
+                    break
+                if status != 503 or attempt == retries:
+                    break
+                # Backpressure: come back when the server says to, as a CI client would
+                busy["retried"] += 1
+                await asyncio.sleep(float(headers.get("retry-after", 1)))
+            results.append((status, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return results, busy["retried"], time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the generation API; starts a local stub-backed server unless --url is given.")
+    parser.add_argument("--url", help="Existing API base URL (default: start one locally on the stub model)")
+    parser.add_argument("--token", default=os.getenv("API_TOKEN", ""))
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--clients", type=int, default=64, help="Concurrent HTTP clients")
+    parser.add_argument("--endpoint", choices=["pipeline", "test-cases", "brd"], default="pipeline")
+    parser.add_argument("--format", choices=["json", "csv", "xlsx", "txt"], default="json")
+    parser.add_argument("--mode", choices=["single", "parallel", "chunked"], default="single")
+    parser.add_argument("--retries", type=int, default=5, help="Retries of a 503 after its Retry-After (0 = count them as failures)")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="Seconds per stub model call (local server only)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Server requests generating at once (local server only)")
+    parser.add_argument("--waiting", type=int, default=32, help="Server queue before 503s (local server only)")
+    parser.add_argument("--timeout", type=float, default=60, help="Server request timeout (local server only)")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if not url:
+        # Settings are read when the modules are first imported
+        os.environ.update({
+            "GENAI_STUB_LATENCY": str(args.stub_latency),
+            "GENAI_RPM": "0",
+            "GENAI_TPM": "0",
+            "API_RECORD_HISTORY": "0",
+        })
+        os.environ.setdefault("GENAI_CACHE_DIR", tempfile.mkdtemp(prefix="genai-load-"))
+        os.environ.setdefault("LOG_LEVEL", "ERROR")  # rejected requests are expected here, not worth a log line each
+        server, url = start_local_server(args.concurrency, args.waiting, args.timeout)
+
+    print(f"{args.requests} x POST /v1/{args.endpoint} ({args.mode}, {args.format}) from {args.clients} clients -> {url}")
+    results, retried, wall = asyncio.run(run_load(url, args.endpoint, args.requests, args.clients, args.format, args.mode,
+                                                  args.token, args.timeout * 2, args.retries))
+    _, _, health = asyncio.run(request(f"{url}/healthz"))
+    health = json.loads(health)
+
+    statuses = Counter(status for status, _ in results)
+    ok = [seconds for status, seconds in results if status == 200]
+    print(f"  statuses           {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str))}")
+    print(f"  retried after 503  {retried}")
+    print(f"  throughput         {len(ok) / wall:.1f} ok requests/s over {wall:.1f}s")
+    if ok:
+        ok.sort()
+        print(f"  latency (200)      p50 {statistics.median(ok):.2f}s  p95 {ok[int(0.95 * (len(ok) - 1))]:.2f}s  "
+              f"p99 {ok[int(0.99 * (len(ok) - 1))]:.2f}s  max {ok[-1]:.2f}s")
+    print(f"  server             peak {health['peak_in_flight']}/{health['concurrency']} generating, "
+          f"{health['rejected']} rejected (503), {health['timed_out']} timed out (504)")
+    if server is not None:
+        server.should_exit = True
+
+    failures = []
+    if not ok:
+        failures.append("no request succeeded")
+    unexpected = {status: count for status, count in statuses.items() if status not in (200, 503, 504)}
+    if unexpected:
+        failures.append(f"unexpected responses {unexpected}")
+    if health["peak_in_flight"] > health["concurrency"]:
+        failures.append("more requests generated at once than the server's concurrency limit")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
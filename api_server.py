@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from exports import XLSX_MIME, csv_bytes, lazy_export, xlsx_bytes
+from generation_jobs import CHUNKED_MODE, PARALLEL_MODE, SINGLE_MODE, build_test_cases, is_parsed, record_history
+from genai_client import PROVIDER, PROVIDERS, get_model
+from job_queue import Job
+from metrics import log_event, registry
+from pipeline import DEFAULT_COLUMNS, generate_brd
+from template_reader import read_template_columns
+from token_usage import BUDGET_ACTIONS, PromptTooLarge, track_tokens
+
+# --- API Settings ---
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_TOKEN = os.getenv("API_TOKEN", "")  # when set, requests need "Authorization: Bearer <token>"
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))  # requests generating at once
+API_MAX_WAITING = int(os.getenv("API_MAX_WAITING", "64"))  # requests queued behind those before 503s
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "300"))  # seconds, waiting included
+API_MAX_BODY_MB = float(os.getenv("API_MAX_BODY_MB", "5"))
+API_RETRY_AFTER = int(os.getenv("API_RETRY_AFTER", "2"))  # seconds, sent with 503s
+API_RECORD_HISTORY = os.getenv("API_RECORD_HISTORY", "1") == "1"
+
+# Stateless API: incremental mode needs the previous run, so it stays in the apps
+MODES = {"single": SINGLE_MODE, "parallel": PARALLEL_MODE, "chunked": CHUNKED_MODE}
+TEST_CASE_FORMATS = {"json": "application/json", "csv": "text/csv", "xlsx": XLSX_MIME}
+BRD_FORMATS = {"json": "application/json", "txt": "text/plain"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Admission:
+    """Backpressure for model work: `concurrency` requests run at once, `waiting` more may queue.
+
+    Beyond that requests get a 503 with Retry-After straight away. A slot is
+    held until its worker thread returns, even after the request timed out, so
+    the limit tracks the model calls actually in flight.
+    """
+
+    def __init__(self, concurrency=API_MAX_CONCURRENCY, waiting=API_MAX_WAITING, timeout=API_REQUEST_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.max_waiting = max(0, waiting)
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="genai-api")
+        self.in_flight = self.waiting = self.peak_in_flight = 0
+        self.completed = self.rejected = self.timed_out = 0
+        self._slots = None  # created on the serving event loop
+
+    async def run(self, fn, *args):
+        """Runs fn(job, *args) on a worker thread; raises ApiError(503) when full and ApiError(504) on timeout."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        if self.in_flight >= self.concurrency and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise ApiError(503, f"server busy: {self.in_flight} requests generating and {self.waiting} waiting",
+                           {"Retry-After": str(API_RETRY_AFTER)})
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except TimeoutError:
+            self.timed_out += 1
+            raise ApiError(504, f"no worker became free within {self.timeout:.0f}s")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        job = Job("api", fn.__name__)
+        future = loop.run_in_executor(self.executor, fn, job, *args)
+
+        def release(_):
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+        future.add_done_callback(release)
+        try:
+            # shield: a timeout must not mark the future done while its thread still runs
+            return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+        except TimeoutError:
+            self.timed_out += 1
+            job.cancel()  # pipelines stop at their next progress point
+            raise ApiError(504, f"request took longer than {self.timeout:.0f}s")
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+# --- Request parsing ---
+async def read_options(request):
+    """Request options from a JSON object or a multipart form.
+
+    Form fields are strings; an uploaded "template" (.csv or .xlsx) supplies
+    the columns and any other uploaded file (e.g. use_case) is read as text.
+    """
+    max_bytes = int(API_MAX_BODY_MB * 1024 * 1024)
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise ApiError(413, f"request body is over {API_MAX_BODY_MB:g} MB")
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        options = {}
+        async with request.form(max_part_size=max_bytes) as form:
+            for key, value in form.multi_items():
+                if isinstance(value, str):
+                    options[key] = value
+                    continue
+                data = await value.read()
+                if key == "template":
+                    try:
+                        options["columns"] = read_template_columns(value.filename or "template.csv", data)
+                    except Exception as e:
+                        raise ApiError(400, f"could not read the template header: {e}")
+                else:
+                    options[key] = data.decode("utf-8-sig")
+    else:
+        body = await request.body()
+        if len(body) > max_bytes:
+            raise ApiError(413, f"request body is over {API_MAX_BODY_MB:g} MB")
+        try:
+            options = json.loads(body or b"{}")
+        except ValueError as e:
+            raise ApiError(400, f"invalid JSON body: {e}")
+        if not isinstance(options, dict):
+            raise ApiError(400, "the JSON body must be an object")
+    # ?format=csv works for either body type
+    for key, value in request.query_params.items():
+        options.setdefault(key, value)
+    return options
+
+
+def _text(options, name):
+    value = options.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(400, f"'{name}' is required")
+    return value.strip()
+
+
+def _flag(options, name, default):
+    value = options.get(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def _number(options, name, default):
+    value = options.get(name, default)
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' must be a whole number")
+
+
+def _choice(options, name, choices, default):
+    value = str(options.get(name) or default).lower()
+    if value not in choices:
+        raise ApiError(400, f"unknown {name} '{value}', expected one of {', '.join(choices)}")
+    return value
+
+
+def _columns(options):
+    columns = options.get("columns") or DEFAULT_COLUMNS
+    if isinstance(columns, str):
+        # Form field: comma-separated or a JSON list
+        try:
+            columns = json.loads(columns) if columns.lstrip().startswith("[") else columns.split(",")
+        except ValueError as e:
+            raise ApiError(400, f"invalid 'columns': {e}")
+    if not isinstance(columns, list) or not all(isinstance(column, str) for column in columns):
+        raise ApiError(400, "'columns' must be a list of column names")
+    columns = [column.strip() for column in columns if column.strip()]
+    if not columns:
+        raise ApiError(400, "'columns' is empty")
+    return columns
+
+
+def _budget(options):
+    action = options.get("budget_action")
+    if action is not None and action not in BUDGET_ACTIONS:
+        raise ApiError(400, f"unknown budget_action '{action}', expected one of {', '.join(BUDGET_ACTIONS)}")
+    return _number(options, "token_budget", None), action
+
+
+def _test_case_settings(options):
+    token_budget, budget_action = _budget(options)
+    return {
+        "mode": MODES[_choice(options, "mode", MODES, "single")],
+        "structured": _flag(options, "structured", False),
+        "prune": _flag(options, "prune", True),
+        "compact": _flag(options, "compact", True),
+        "chunk_token_budget": _number(options, "chunk_token_budget", 6000),
+        "token_budget": token_budget,
+        "budget_action": budget_action,
+        "bypass_cache": _flag(options, "bypass_cache", False),
+    }
+
+
+# --- Worker functions (run on Admission's threads) ---
+def _brd_work(job, model, usecase, token_budget, budget_action, bypass_cache):
+    job.update(0.1, "Generating the BRD")
+    with track_tokens(token_budget, budget_action) as tokens:
+        brd_text = generate_brd(model, usecase, bypass_cache=bypass_cache)
+    return brd_text, tokens
+
+
+def _test_case_work(job, model, usecase, brd_text, columns, settings, fmt):
+    brd_tokens = None
+    if brd_text is None:
+        # Combined pipeline: BRD first, with the same budget and cache settings
+        brd_text, brd_tokens = _brd_work(job, model, usecase, settings["token_budget"], settings["budget_action"],
+                                         settings["bypass_cache"])
+    df, report, run = build_test_cases(job, model, brd_text, columns, **settings)
+    job.check()
+    if API_RECORD_HISTORY:
+        record_history(report, usecase or "", df, brd_text, run, model, settings["mode"], app="api")
+    if not is_parsed(df):
+        raise ApiError(502, "the model output could not be parsed as test cases: " + "; ".join(report["warnings"]))
+    # Files are rendered here, off the event loop, and memoized by content hash
+    body = None if fmt == "json" else lazy_export(fmt, df, csv_bytes if fmt == "csv" else xlsx_bytes, report["digest"])()
+    return brd_text, brd_tokens, df, report, run["tokens"], body
+
+
+def _token_stats(*tallies):
+    totals = {}
+    for tally in tallies:
+        if tally is not None:
+            for key, value in tally.stats().items():
+                totals[key] = max(totals.get(key, 0), value) if key == "largest_prompt" else totals.get(key, 0) + value
+    return totals
+
+
+# --- Endpoints ---
+def endpoint(name):
+    """Auth, error mapping, metrics and a structured log line for each request."""
+    def wrap(handler):
+        async def run(request):
+            started = time.perf_counter()
+            try:
+                token = request.app.state.token
+                if token and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+                    raise ApiError(401, "missing or wrong API token", {"WWW-Authenticate": "Bearer"})
+                response = await handler(request)
+            except ApiError as e:
+                response = JSONResponse({"error": str(e)}, e.status, headers=e.headers)
+            except PromptTooLarge as e:
+                response = JSONResponse({"error": str(e)}, 413)
+            except Exception as e:
+                # Rate-limit and transient errors were already retried with backoff
+                response = JSONResponse({"error": f"generation failed: {e}"}, 502)
+            seconds = time.perf_counter() - started
+            registry.inc("genai_api_requests_total", endpoint=name, status=response.status_code)
+            registry.observe("genai_api_request_seconds", seconds, endpoint=name)
+            log_event("api_request", logging.INFO if response.status_code < 500 else logging.WARNING, endpoint=name,
+                      status=response.status_code, seconds=round(seconds, 3))
+            return response
+        return run
+    return wrap
+
+
+@endpoint("brd")
+async def brd_endpoint(request):
+    options = await read_options(request)
+    usecase = _text(options, "use_case")
+    fmt = _choice(options, "format", BRD_FORMATS, "json")
+    token_budget, budget_action = _budget(options)
+    state = request.app.state
+    brd_text, tokens = await state.admission.run(_brd_work, state.model, usecase, token_budget, budget_action,
+                                                 _flag(options, "bypass_cache", False))
+    if fmt == "txt":
+        return PlainTextResponse(brd_text)
+    return JSONResponse({"brd": brd_text, "warnings": list(tokens.warnings), "tokens": _token_stats(tokens)})
+
+
+async def _test_cases(request, pipeline):
+    options = await read_options(request)
+    usecase = _text(options, "use_case") if pipeline else (options.get("use_case") or "").strip()
+    brd_text = None if pipeline else _text(options, "brd")
+    columns = _columns(options)
+    settings = _test_case_settings(options)
+    fmt = _choice(options, "format", TEST_CASE_FORMATS, "json")
+    state = request.app.state
+    brd_text, brd_tokens, df, report, tokens, body = await state.admission.run(
+        _test_case_work, state.model, usecase, brd_text, columns, settings, fmt
+    )
+    if body is not None:
+        filename = f"test_cases.{fmt}"
+        return Response(body, media_type=TEST_CASE_FORMATS[fmt], headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Test-Case-Rows": str(len(df)),
+            "X-Warnings": str(len(report["warnings"])),
+        })
+    result = {
+        "columns": list(df.columns),
+        "rows": df.fillna("").to_dict("records"),
+        "warnings": report["warnings"],
+        "notes": report["captions"],
+        "tokens": _token_stats(brd_tokens, tokens),
+    }
+    if pipeline:
+        result["brd"] = brd_text
+    return JSONResponse(result)
+
+
+@endpoint("test_cases")
+async def test_cases_endpoint(request):
+    return await _test_cases(request, pipeline=False)
+
+
+@endpoint("pipeline")
+async def pipeline_endpoint(request):
+    return await _test_cases(request, pipeline=True)
+
+
+async def health_endpoint(request):
+    return JSONResponse({"status": "ok", "model": request.app.state.model_name, **request.app.state.admission.stats()})
+
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def create_app(model, admission=None, token=API_TOKEN):
+    app = Starlette(routes=[
+        Route("/healthz", health_endpoint),
+        Route("/metrics", metrics_endpoint),
+        Route("/v1/brd", brd_endpoint, methods=["POST"]),
+        Route("/v1/test-cases", test_cases_endpoint, methods=["POST"]),
+        Route("/v1/pipeline", pipeline_endpoint, methods=["POST"]),
+    ])
+    app.state.model = model
+    app.state.model_name = getattr(model, "model_name", type(model).__name__)
+    app.state.admission = admission or Admission()
+    app.state.token = token
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="HTTP API for BRD and test case generation: POST /v1/brd, /v1/test-cases and /v1/pipeline"
+    )
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default=PROVIDER, help="Model backend (stub runs offline)")
+    parser.add_argument("--concurrency", type=int, default=API_MAX_CONCURRENCY, help="Requests generating at once")
+    parser.add_argument("--waiting", type=int, default=API_MAX_WAITING, help="Requests allowed to queue before 503s")
+    parser.add_argument("--timeout", type=float, default=API_REQUEST_TIMEOUT, help="Seconds per request, queueing included")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    load_dotenv()
+    model = get_model(args.provider)
+    app = create_app(model, Admission(args.concurrency, args.waiting, args.timeout), token=os.getenv("API_TOKEN", API_TOKEN))
+    # One event loop serves every connection; model calls run on the admission pool's threads
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", backlog=2048)
+
+
+if __name__ == "__main__":
+    main()
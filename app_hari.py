@@ -1,12 +1,12 @@
 import os
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as genai
+from genai_client import get_model, warm_up_in_background
 import pandas as pd
-from io import BytesIO
-import io
-import csv
-from fpdf import FPDF
+from exports import xlsx_bytes
+from pdf_renderer import generate_pdf_from_text
+from pipeline import parse_issue_summary, parse_test_cases
+from template_reader import uploaded_template_columns
 from datetime import datetime
 
 # Load environment variables
@@ -34,6 +34,8 @@ if not st.session_state.logged_in:
     if login_button:
         if username == VALID_USERNAME and password == VALID_PASSWORD:
             st.session_state.logged_in = True
+            # The model client warms up in the background while the main page loads
+            warm_up_in_background(api_key=GOOGLE_API_KEY)
             st.success("Welcome to the Test Case Generator!")
             st.rerun()
         else:
@@ -49,45 +51,8 @@ if st.session_state.logged_in:
     #         st.session_state.clear()
     #         st.rerun()
 
-    # --- Gemini Model Config ---
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel("gemini-2.0-flash-exp")
-
-    def sanitize_text_for_pdf(text):
-    # Replace characters not supported by latin-1
-        return text.encode("latin-1", errors="replace").decode("latin-1")
-
-    # --- PDF Generator ---
-    def generate_pdf_from_text(text: str) -> BytesIO:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        lines = sanitize_text_for_pdf(text).strip().splitlines()
-
-        if any("|" in line for line in lines):
-            for line in lines:
-                if "|" not in line:
-                    pdf.multi_cell(0,10,line)
-                else:
-                    coloumn = [col.strip() for col in line.split("|") if col.strip()]
-                    for col in coloumn:
-                        pdf.cell(40, 10, txt=col, border= 1)
-                    pdf.ln()
-        else:
-            for line in lines:
-                pdf.multi_cell(0,10,line)
-
-
-
-        # for line in text.splitlines():
-        #     safe_line = line.encode("latin-1", errors="replace").decode("latin-1")
-        #     pdf.multi_cell(0, 10, safe_line)
-        buffer = BytesIO()
-        pdf_output = pdf.output(dest="S").encode("latin-1", errors="replace")
-        buffer.write(pdf_output)
-        buffer.seek(0)
-        return buffer
+    # --- Gemini Model Config (one shared client per process) ---
+    model = get_model(api_key=GOOGLE_API_KEY)
 
     # --- Session State Init ---
     if "brd_text" not in st.session_state:
@@ -126,8 +91,8 @@ if st.session_state.logged_in:
     template_file = st.file_uploader("Upload Template (.csv or .xlsx)", type=["csv", "xlsx"])
     template_columns = []
     if template_file:
-        df_template = pd.read_csv(template_file) if template_file.name.endswith(".csv") else pd.read_excel(template_file)
-        template_columns = list(df_template.columns)
+        # Header row only, cached by file hash so reruns do not re-read the upload
+        template_columns = uploaded_template_columns(template_file)
 
     # --- Generate Test Cases ---
     if st.button("🚀 Generate Test Cases"):
@@ -173,18 +138,16 @@ if st.session_state.logged_in:
                     else ""
                 )
 
-            # --- Clean and Parse Output ---
-            cleaned = output_text.strip().strip("`").replace("```csv", "").replace("```", "")
+            # --- Parse Output (salvages every row it can) ---
             try:
-                df_result = pd.read_csv(io.StringIO(cleaned), quoting=csv.QUOTE_ALL)
                 expected_cols = [
                     "Test Case Number", "Title", "Preconditions", "Steps",
                     "Expected Results", "Transaction Type", "Status", "Test Data"
                 ]
-                for col in expected_cols:
-                    if col not in df_result.columns:
-                        df_result[col] = ""
-                df_result = df_result[expected_cols]
+                df_result = parse_test_cases(output_text, expected_cols)
+                parse_note = parse_issue_summary(df_result)
+                if parse_note:
+                    st.caption(parse_note)
             except Exception as e:
                 st.warning(f"Error parsing CSV: {e}")
                 df_result = pd.DataFrame({"Output": [output_text]})
@@ -193,12 +156,7 @@ if st.session_state.logged_in:
             st.subheader("✅ Generated Test Cases")
             st.dataframe(df_result, use_container_width=True, hide_index=True)
 
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                df_result.to_excel(writer, index=False, sheet_name="TestCases")
-            excel_buffer.seek(0)
-
-            st.download_button("⬇️ Download Excel", data=excel_buffer,
+            st.download_button("⬇️ Download Excel", data=xlsx_bytes(df_result),
                             file_name="test_cases.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
             st.download_button("⬇️ Download CSV", data=df_result.to_csv(index=False).encode("utf-8"),
                             file_name="test_cases.csv", mime="text/csv")
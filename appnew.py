@@ -1,11 +1,11 @@
 import os
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as gen_ai
+from genai_client import get_model, warm_up_in_background
 import pandas as pd
-from io import BytesIO
-import io
-import re
+from pipeline import parse_issue_summary, parse_test_cases
+from template_reader import uploaded_template_columns
+from exports import xlsx_bytes
 
 # Load environment variables
 load_dotenv()
@@ -30,6 +30,8 @@ if not st.session_state.logged_in:
     if login_button:
         if username == VALID_USERNAME and password == VALID_PASSWORD:
             st.session_state.logged_in = True
+            # The model client warms up in the background while the main page loads
+            warm_up_in_background(api_key=GOOGLE_API_KEY)
             st.success("Welcome to the Test Case Generator!")
             st.rerun()
         else:
@@ -40,11 +42,8 @@ if not st.session_state.logged_in:
 # --- Dashboard ---
 if st.session_state.logged_in:
     st.title("🧪 GenAI Test Case Generator")
-    def configure_google_model():
-        gen_ai.configure(api_key=GOOGLE_API_KEY)
-        return gen_ai.GenerativeModel("gemini-2.0-flash-exp")
-
-    model = configure_google_model()
+    # One shared client per process instead of reconfiguring on every rerun
+    model = get_model(api_key=GOOGLE_API_KEY)
     selected_model = st.selectbox("Select a Model", ["Google Gemini AI"])
     uploaded_file = st.file_uploader("Upload Use Case File (.txt, .docx, .pdf)")
     manual_input = st.text_area("Or paste the user story directly")
@@ -61,14 +60,10 @@ if st.session_state.logged_in:
     # --- Template Handling ---
     template_columns_str = ""
     if template_file:
-        if template_file.name.endswith('.csv'):
-            df_template = pd.read_csv(template_file)
-        else:
-            df_template = pd.read_excel(template_file)
-        template_columns = list(df_template.columns)
+        # Header row only, cached by file hash so reruns do not re-read the upload
+        template_columns = uploaded_template_columns(template_file)
         template_columns_str = ", ".join(template_columns)
     else:
-        df_template = None
         template_columns = []
 
     if st.button("🚀 Generate Test Cases"):
@@ -96,35 +91,18 @@ if st.session_state.logged_in:
             response = model.generate_content([prompt_test_cases])
             generated_text = response.candidates[0].content.parts[0].text if response and response.candidates else "No Test case generated"
 
-            # Try to extract the CSV table from the LLM output
-            # Find the CSV part (if LLM wraps it in markdown, remove backticks)
-            csv_match = re.search(r"((?:.|\n)*?,(?:.|\n)*?)$", generated_text.strip())
-            csv_text = csv_match.group(1) if csv_match else generated_text
-
-            # Remove markdown code fences and extra text
-            cleaned_text = re.sub(r"^```.*?```$", "", generated_text, flags=re.MULTILINE | re.DOTALL).strip()
-
-            lines = cleaned_text.splitlines()
-            header_ok = len(lines) > 0 and all(col.strip() in lines[0] for col in template_columns)
-            has_data = len(lines) > 1
-
-            if not cleaned_text or not header_ok or not has_data:
+            # Tolerant parse: code fences, stray quotes and ragged rows are repaired
+            # instead of dropping rows; always select only the template columns, in order
+            try:
+                df_generated = parse_test_cases(generated_text, template_columns)
+                parse_note = parse_issue_summary(df_generated)
+                if parse_note:
+                    st.caption(parse_note)
+                    with st.expander("Parsing details"):
+                        st.dataframe(pd.DataFrame(df_generated.attrs["parse_issues"]), hide_index=True)
+            except ValueError:
                 st.warning("No table detected in the generated output. Showing raw output.")
                 df_generated = pd.DataFrame({"Output": [generated_text]})
-            else:
-                try:
-                    df_generated = pd.read_csv(io.StringIO(cleaned_text), delimiter=",", on_bad_lines='skip')
-                    df_generated = df_generated.loc[:, ~df_generated.columns.str.contains('^Unnamed')]
-                    # Always select only the template columns, in order
-                    if template_columns:
-                        for col in template_columns:
-                            if col not in df_generated.columns:
-                                df_generated[col] = ""
-                        df_generated = df_generated[template_columns]
-                    print(df_generated)
-                except Exception as e:
-                    st.warning(f"Could not parse generated test cases as a table. Showing raw output. Error: {e}")
-                    df_generated = pd.DataFrame({"Output": [generated_text]})
             print("RAW GENERATED TEXT:\n", generated_text)
 
     # --- Build the final DataFrame for download/display ---
@@ -139,14 +117,9 @@ if st.session_state.logged_in:
         st.warning("No test cases were generated. Please check your prompt, template, and use case details.")
 
     # --- Download Excel ---
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df_final.to_excel(writer, index=False, sheet_name='TestCases')
-    output.seek(0)
-
     st.download_button(
         label="⬇️ Download Excel",
-        data=output,
+        data=xlsx_bytes(df_final),
         file_name="test_cases.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
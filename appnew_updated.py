@@ -1,13 +1,11 @@
 import os
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as genai
-import pandas as pd
+from genai_client import get_model, warm_up_in_background
+from metrics import start_metrics_server
 from io import BytesIO
-import io
-import csv
-from fpdf import FPDF
 from datetime import datetime
+from response_cache import get_response_cache
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +14,9 @@ VALID_USERNAME = os.getenv("VALID_USERNAME")
 VALID_PASSWORD = os.getenv("VALID_PASSWORD")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Prometheus endpoint (METRICS_PORT), shared by every session in this process
+start_metrics_server()
+
 # --- Streamlit Config ---
 st.set_page_config(page_title="GenAI Test Case Generator", layout="centered")
 st.title("🚀 Guidewire PolicyCenter – GenAI Test Case Generator")
@@ -34,6 +35,8 @@ if not st.session_state.logged_in:
     if login_button:
         if username == VALID_USERNAME and password == VALID_PASSWORD:
             st.session_state.logged_in = True
+            # The model client warms up in the background while the main page loads
+            warm_up_in_background(api_key=GOOGLE_API_KEY)
             st.success("Welcome to the Test Case Generator!")
             st.rerun()
         else:
@@ -42,41 +45,39 @@ if not st.session_state.logged_in:
 # --- Post Login ---
 if st.session_state.logged_in:
 
-    # Gemini Model Setup
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel("gemini-2.0-flash-exp")
+    # Generation stack is imported on first use after login, not on the login page
+    import pandas as pd
+    from rate_limiter import get_rate_limiter
+    from single_flight import get_single_flight
+    from template_reader import uploaded_template_columns
+    from session_store import get_session_store, new_session_id
+    from history_store import get_history_store
+    from history_view import show_history
+    from metrics import registry
+    from token_usage import BUDGET_ACTIONS, PROMPT_BUDGET_ACTION, PROMPT_TOKEN_BUDGET, get_token_totals
+    from pipeline import DEFAULT_COLUMNS
+    from job_queue import QueueFull, get_job_queue
+    from job_view import show_job, show_job_outcome, show_test_case_report
+    from generation_jobs import (
+        CHUNKED_MODE, GENERATION_MODES, INCREMENTAL_MODE, SINGLE_MODE, brd_job, result_report, test_case_job,
+    )
+    from exports import XLSX_MIME, csv_bytes, lazy_export, text_bytes, xlsx_bytes
 
-    def sanitize_text_for_pdf(text):
-        return text.encode("latin-1", errors="replace").decode("latin-1")
+    # Gemini Model Setup (one shared client per process)
+    model = get_model(api_key=GOOGLE_API_KEY)
 
     def generate_pdf_from_text(text: str) -> BytesIO:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        lines = sanitize_text_for_pdf(text).strip().splitlines()
-
-        if any("|" in line for line in lines):
-            for line in lines:
-                if "|" not in line:
-                    pdf.multi_cell(0, 10, line)
-                else:
-                    coloumn = [col.strip() for col in line.split("|") if col.strip()]
-                    for col in coloumn:
-                        pdf.cell(40, 10, txt=col, border=1)
-                    pdf.ln()
-        else:
-            for line in lines:
-                pdf.multi_cell(0, 10, line)
+        # Imported on first PDF export so fpdf stays off the page until it is needed
+        from pdf_renderer import generate_pdf_from_text as render_pdf
 
-        buffer = BytesIO()
-        pdf_output = pdf.output(dest="S").encode("latin-1", errors="replace")
-        buffer.write(pdf_output)
-        buffer.seek(0)
-        return buffer
+        return render_pdf(text)
 
-    # Session BRD Text
-    if "brd_text" not in st.session_state:
-        st.session_state.brd_text = ""
+    # Session artifacts (BRD, results) live in a bounded store that spills to disk;
+    # session_state only keeps the key
+    session_store = get_session_store()
+    if "artifact_session" not in st.session_state:
+        st.session_state.artifact_session = new_session_id()
+    session_id = st.session_state.artifact_session
 
     # Step 1: Template Upload or Default
     st.subheader("📁 Step 1: Template Selection")
@@ -87,16 +88,13 @@ if st.session_state.logged_in:
     )
 
     template_columns = []
-    default_columns = [
-        "Test Case Number", "Title", "Preconditions", "Steps",
-        "Expected Results", "Transaction Type", "Status", "Test Data"
-    ]
+    default_columns = DEFAULT_COLUMNS
 
     if upload_template_option == "Yes":
         template_file = st.file_uploader("Upload Template (.csv or .xlsx)", type=["csv", "xlsx"])
         if template_file:
-            df_template = pd.read_csv(template_file) if template_file.name.endswith(".csv") else pd.read_excel(template_file)
-            template_columns = list(df_template.columns)
+            # Header row only, cached by file hash so reruns do not re-read the upload
+            template_columns = uploaded_template_columns(template_file)
     elif upload_template_option == "No":
         st.info("Using default test case template structure.")
         template_columns = default_columns
@@ -115,89 +113,136 @@ if st.session_state.logged_in:
         elif usecase_text.strip():
             final_usecase = usecase_text.strip()
 
-        # BRD Generation
+        # Response cache: repeated prompts are served from disk
+        bypass_cache = st.checkbox("Bypass response cache (force a fresh generation)", value=False)
+        generation_mode = st.selectbox(
+            "Test case generation mode",
+            options=GENERATION_MODES,
+            index=0
+        )
+        # Structured mode requests JSON matching a schema built from the columns; no CSV cleanup
+        structured_output = st.checkbox("Structured JSON output (schema built from the template columns)", value=False)
+        prune_duplicates = st.checkbox("Prune near-duplicate test cases", value=True)
+        # Revision tables, sign-off blocks and repeated headings are dropped from the BRD embedded in prompts
+        compact_prompt_brd = st.checkbox("Compact the BRD before embedding it in test case prompts", value=True)
+        col_budget, col_action = st.columns(2)
+        prompt_token_budget = col_budget.number_input("Prompt token budget", min_value=1000, max_value=2000000,
+                                                      value=PROMPT_TOKEN_BUDGET, step=1000)
+        budget_action = col_action.selectbox("When a prompt is over budget", options=list(BUDGET_ACTIONS),
+                                             index=BUDGET_ACTIONS.index(PROMPT_BUDGET_ACTION) if PROMPT_BUDGET_ACTION in BUDGET_ACTIONS else 0)
+        stream_test_cases = False
+        chunk_token_budget = 6000
+        if generation_mode == SINGLE_MODE and not structured_output:
+            stream_test_cases = st.checkbox("Stream test cases as they are generated", value=True)
+        elif generation_mode in (CHUNKED_MODE, INCREMENTAL_MODE):
+            chunk_token_budget = st.number_input("Token budget per BRD chunk", min_value=500, max_value=30000, value=6000, step=500)
+        token_totals = get_token_totals().stats()
+        if token_totals["calls"]:
+            st.caption(f"Model tokens: {token_totals['prompt_tokens']:,} prompt + {token_totals['response_tokens']:,} response "
+                       f"over {token_totals['calls']} call(s), {token_totals['over_budget']} over budget ({token_totals['blocked']} blocked)")
+        cache_stats = get_response_cache().stats()
+        st.caption(f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+        flight_stats = get_single_flight().stats()
+        if flight_stats["coalesced"]:
+            st.caption(f"Identical in-flight requests: {flight_stats['coalesced']} model calls saved")
+        store_stats = session_store.stats()
+        if store_stats["spills"]:
+            st.caption(f"Session store: {store_stats['memory_mb']} MB in memory across {store_stats['sessions']} session(s), "
+                       f"{store_stats['spills']} artifact(s) spilled to disk, {store_stats['rehydrates']} reloaded")
+        # Shared by every session in this process
+        limiter_stats = get_rate_limiter().stats()
+        if limiter_stats["calls"]:
+            st.caption(f"Model rate limiter: {limiter_stats['queue_depth']} queued, {limiter_stats['throttled']} throttled "
+                       f"({limiter_stats['throttle_seconds']:.0f}s), {limiter_stats['retries']} retries, {limiter_stats['failures']} failed")
+        job_queue = get_job_queue()
+        queue_stats = job_queue.stats()
+        if queue_stats["queued"] or queue_stats["running"]:
+            st.caption(f"Generation jobs: {queue_stats['running']} running, {queue_stats['queued']} queued "
+                       f"on {queue_stats['workers']} worker(s)")
+
+        # BRD Generation runs as a background job; the page only polls it, so no script runner waits on the model
         if final_usecase and st.button("📝 Generate BRD Manually"):
-            with st.spinner("Generating BRD from use case..."):
-                brd_prompt = f"Create a detailed Business Requirements Document (BRD) with today's date ({today}) based on the following Guidewire PolicyCenter use case:\n\n{final_usecase}"
-                response = model.generate_content(brd_prompt)
-                st.session_state.brd_text = (
-                    response.candidates[0].content.parts[0].text.strip()
-                    if response and response.candidates and response.candidates[0].content.parts
-                    else ""
-                )
-
-        # BRD Download
-        if st.session_state.brd_text:
-            st.download_button("⬇️ Download BRD (TXT)", data=st.session_state.brd_text,
-                            file_name="generated_brd.txt", mime="text/plain")
-            st.download_button("⬇️ Download BRD (PDF)", data=generate_pdf_from_text(st.session_state.brd_text),
-                            file_name="generated_brd.pdf", mime="application/pdf")
-
-        # Step 3: Test Case Generation
+            try:
+                st.session_state.brd_job = job_queue.submit(
+                    session_id, "brd", brd_job, model, session_store, session_id, final_usecase, today,
+                    revise=generation_mode == INCREMENTAL_MODE, token_budget=int(prompt_token_budget),
+                    budget_action=budget_action, bypass_cache=bypass_cache, label="Generating BRD",
+                ).id
+            except QueueFull as e:
+                st.warning(f"BRD generation was not started: {e}")
+        current_brd_job = job_queue.get(st.session_state.get("brd_job"), session_id)
+        if current_brd_job is not None:
+            if current_brd_job.done:
+                show_job_outcome(current_brd_job, "BRD generation")
+                del st.session_state.brd_job
+            else:
+                show_job(job_queue, current_brd_job.id, session_id)
+
+        # BRD Download: files are rendered on click and memoized by content hash
+        brd_text = session_store.get(session_id, "brd_text", "")
+        if brd_text:
+            st.download_button("⬇️ Download BRD (TXT)", data=lazy_export("brd.txt", brd_text, text_bytes),
+                            file_name="generated_brd.txt", mime="text/plain", on_click="ignore")
+            st.download_button("⬇️ Download BRD (PDF)", data=lazy_export("brd.pdf", brd_text, lambda text: generate_pdf_from_text(text).getvalue()),
+                            file_name="generated_brd.pdf", mime="application/pdf", on_click="ignore")
+
+        # Step 3: Test Case Generation, also a background job; results land in the session store
         if st.button("🚀 Generate Test Cases"):
-            if not st.session_state.brd_text:
+            if not brd_text:
                 st.warning("Please generate the BRD manually first.")
+            elif current_brd_job is not None and not current_brd_job.done:
+                st.warning("Please wait for the BRD to finish generating.")
             else:
-                prompt_test_cases = f"""
-You are a QA test case generator for Guidewire PolicyCenter. Based on the BRD below, do the following:
-
-1. Automatically detect the transaction type (e.g., New Business, Policy Change, etc.).
-2. Generate detailed test cases.
-3. Each test case must include:
-- Test Case Number (1, 2, 3...)
-- A descriptive Title
-- Preconditions
-- Detailed, numbered Steps
-- Expected Results
-- Transaction Type (e.g., Submission, Policy Change)
-- Status = Draft
-- Test Data (e.g., customer info, product, vehicle)
-4. Include additional scenarios based on the BRD (both Positive and Negative)
-5. Include at least one of each Transaction type other than Use Case (e.g., Submission, Policy Change, Cancellation, Rewrite, Reinstatement)
-
-Output strict CSV format (comma-separated). Wrap all fields in double quotes, even multiline ones.
-Do NOT include markdown or ``` formatting.
-
-Use the exact headers below:
-"{'","'.join(default_columns)}"
-
-In the steps field, number each step (e.g., 1. Do this, 2. Do that, 3. ...). Do not use "\\n" or any escape characters. Each new step should be on a new line inside the cell using a real line break (press Enter/Return), not the characters "\\n"
-
-BRD:
-{st.session_state.brd_text}
-                """
-
-                with st.spinner("Generating Test Cases..."):
-                    response = model.generate_content(prompt_test_cases)
-                    output_text = (
-                        response.candidates[0].content.parts[0].text.strip()
-                        if response and response.candidates and response.candidates[0].content.parts
-                        else ""
-                    )
-
-                cleaned = output_text.strip().strip("`").replace("```csv", "").replace("```", "")
                 try:
-                    df_result = pd.read_csv(io.StringIO(cleaned), quoting=csv.QUOTE_ALL)
-                    for col in default_columns:
-                        if col not in df_result.columns:
-                            df_result[col] = ""
-                    df_result = df_result[default_columns]
-                except Exception as e:
-                    st.warning(f"Error parsing CSV: {e}")
-                    df_result = pd.DataFrame({"Output": [output_text]})
-
-                # Output
+                    st.session_state.test_case_job = job_queue.submit(
+                        session_id, "test_cases", test_case_job, model, session_store, session_id, final_usecase, brd_text,
+                        default_columns, mode=generation_mode, structured=structured_output, stream=stream_test_cases,
+                        prune=prune_duplicates, compact=compact_prompt_brd, chunk_token_budget=int(chunk_token_budget),
+                        token_budget=int(prompt_token_budget), budget_action=budget_action, bypass_cache=bypass_cache,
+                        app="policycenter", label="Generating test cases",
+                    ).id
+                except QueueFull as e:
+                    st.warning(f"Test case generation was not started: {e}")
+        current_test_case_job = job_queue.get(st.session_state.get("test_case_job"), session_id)
+        test_case_running = current_test_case_job is not None and not current_test_case_job.done
+        test_case_report = session_store.get(session_id, "test_case_report")
+        if test_case_running:
+            st.subheader("✅ Generated Test Cases")
+            show_job(job_queue, current_test_case_job.id, session_id)
+        else:
+            if current_test_case_job is not None:
+                show_job_outcome(current_test_case_job, "Test case generation")
+                del st.session_state.test_case_job
+            if test_case_report and session_store.has(session_id, "test_case_result"):
                 st.subheader("✅ Generated Test Cases")
-                st.dataframe(df_result, use_container_width=True, hide_index=True)
-
-                excel_buffer = BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                    df_result.to_excel(writer, index=False, sheet_name="TestCases")
-                excel_buffer.seek(0)
-
-                st.download_button("⬇️ Download Excel", data=excel_buffer,
-                                file_name="test_cases.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-                st.download_button("⬇️ Download CSV", data=df_result.to_csv(index=False).encode("utf-8"),
-                                file_name="test_cases.csv", mime="text/csv")
+                show_test_case_report(session_store.get(session_id, "test_case_result"), test_case_report)
+
+        # Test Case Download: Excel/CSV are rendered on click and memoized by content hash
+        if test_case_report and session_store.has(session_id, "test_case_result"):
+            # Exports read the table back from the store (possibly from disk) when a download is clicked
+            df_export = session_store.loader(session_id, "test_case_result")
+            export_digest = test_case_report["digest"]
+            st.download_button("⬇️ Download Excel", data=lazy_export("xlsx", df_export, xlsx_bytes, export_digest),
+                            file_name="test_cases.xlsx", mime=XLSX_MIME, on_click="ignore")
+            st.download_button("⬇️ Download CSV", data=lazy_export("csv", df_export, csv_bytes, export_digest),
+                            file_name="test_cases.csv", mime="text/csv", on_click="ignore")
     else:
         st.info("Please select an option above to proceed.")
+
+    # Where the time goes: mean seconds per pipeline stage since this process started
+    stage_timings = registry.stage_summary()
+    if stage_timings:
+        with st.expander("⏱️ Stage timings"):
+            st.dataframe(pd.DataFrame(stage_timings), use_container_width=True, hide_index=True)
+
+    # Generation history (SQLite): survives refreshes, and a past run can be reused instead of regenerated
+    with st.expander("📚 Generation history"):
+        reused_run = show_history(get_history_store())
+    if reused_run:
+        if reused_run["brd"]:
+            session_store.put(session_id, "brd_text", reused_run["brd"])
+        df_reused = pd.DataFrame(reused_run["rows"], columns=reused_run["columns"] or None)
+        session_store.put(session_id, "test_case_result", df_reused)
+        session_store.put(session_id, "test_case_report",
+                          result_report(df_reused, captions=[f"Reused run #{reused_run['id']} from the generation history"]))
+        st.rerun()
@@ -0,0 +1,280 @@
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from brd_sections import compact_brd
+from exports import write_xlsx
+from genai_client import PROVIDER, PROVIDERS, get_model
+from metrics import write_metrics_file
+from near_duplicates import NEAR_DUPLICATE_THRESHOLD, near_duplicate_summary
+from pipeline import (
+    BRD_PACK_MAX, BRD_PACK_TOKENS, DEFAULT_COLUMNS, TRANSACTION_TYPES, fan_out_test_cases, generate_brd, generate_brds_packed,
+    generate_test_cases, map_reduce_test_cases, prune_test_cases,
+)
+from token_usage import BUDGET_ACTIONS, PROMPT_BUDGET_ACTION, PROMPT_TOKEN_BUDGET, PromptTooLarge, record_saved, track_tokens
+
+
+def find_usecase_files(inputs):
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(glob.glob(os.path.join(item, "*.txt"))))
+        else:
+            files.extend(sorted(glob.glob(item)))
+    # Keep the first occurrence when a file matches several inputs
+    return list(dict.fromkeys(os.path.normpath(path) for path in files))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def output_stem(path):
+    return os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+
+
+def output_stems(paths):
+    # {path: stem}; a repeated stem (a/login.txt, b/login.txt) gets _2, _3, ... so no file overwrites another's output
+    stems, taken = {}, set()
+    for path in paths:
+        base = stem = output_stem(path)
+        suffix = 2
+        while stem.lower() in taken:
+            stem = f"{base}_{suffix}"
+            suffix += 1
+        taken.add(stem.lower())
+        stems[path] = stem
+    return stems
+
+
+def read_usecase(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def process_file(model, path, output_dir, formats, retries, today, bypass_cache, fan_out, chunk_tokens, structured,
+                 near_dup_threshold, compact, token_budget, budget_action, print_lock, packed_brd=None, stem=None):
+    # packed_brd: (BRD, seconds) from a packed request, used for the first attempt only.
+    # stem names the output files; main() makes it unique across the batch.
+    usecase = read_usecase(path)
+    stem = stem or output_stem(path)
+
+    result = {"file": path, "ok": False, "attempts": 0, "brd_seconds": None, "test_case_seconds": None}
+    # Every model call for this file (BRD, test cases, retries) is counted against the budget
+    with track_tokens(token_budget, budget_action) as tokens:
+        for attempt in range(retries + 1):
+            result["attempts"] = attempt + 1
+            # Retries skip the cache so a bad cached answer is not replayed
+            fresh = bypass_cache or attempt > 0
+            try:
+                if packed_brd and attempt == 0:
+                    brd_text, result["brd_seconds"] = packed_brd
+                else:
+                    started = time.perf_counter()
+                    brd_text = generate_brd(model, usecase, today, bypass_cache=fresh)
+                    result["brd_seconds"] = time.perf_counter() - started
+                if not brd_text:
+                    raise ValueError("empty BRD returned by the model")
+
+                # Boilerplate is stripped from the copy embedded in the test case prompts only
+                prompt_brd, compaction = compact_brd(brd_text) if compact else (brd_text, None)
+                started = time.perf_counter()
+                if fan_out:
+                    df_result, failures = fan_out_test_cases(model, prompt_brd, DEFAULT_COLUMNS, bypass_cache=fresh, structured=structured)
+                    for transaction_type, error in failures.items():
+                        with print_lock:
+                            print(f"[{stem}] no {transaction_type} test cases: {error}", file=sys.stderr)
+                elif chunk_tokens:
+                    df_result, chunk_report = map_reduce_test_cases(model, prompt_brd, DEFAULT_COLUMNS, chunk_tokens, bypass_cache=fresh,
+                                                                    structured=structured)
+                    with print_lock:
+                        for entry in chunk_report:
+                            status = f"{entry['Rows']} rows in {entry['Seconds']}s" if not entry["Error"] else f"failed: {entry['Error']}"
+                            print(f"[{stem}] chunk {entry['Chunk']}/{len(chunk_report)}: {status}")
+                else:
+                    df_result, _ = generate_test_cases(model, prompt_brd, DEFAULT_COLUMNS, bypass_cache=fresh, structured=structured)
+                result["test_case_seconds"] = time.perf_counter() - started
+                if df_result.empty:
+                    raise ValueError("no test cases parsed from the model output")
+                if compaction:
+                    record_saved(compaction["Tokens Saved"] * (len(TRANSACTION_TYPES) if fan_out else 1))
+                break
+            except Exception as e:
+                result["error"] = str(e)
+                with print_lock:
+                    print(f"[{stem}] attempt {attempt + 1} failed: {e}", file=sys.stderr)
+                if isinstance(e, PromptTooLarge):
+                    # A retry would send the same oversized prompt
+                    df_result = None
+                    break
+                if attempt < retries:
+                    time.sleep(2 ** attempt)
+        else:
+            df_result = None
+    result.update(prompt_tokens=tokens.prompt_tokens, response_tokens=tokens.response_tokens, model_calls=tokens.calls,
+                  saved_tokens=tokens.saved_tokens)
+    if df_result is None:
+        return result, None
+
+    if near_dup_threshold:
+        df_result = prune_test_cases(df_result, near_dup_threshold)
+        if df_result.attrs["near_duplicates"]:
+            with print_lock:
+                print(f"[{stem}] {near_duplicate_summary(df_result)}")
+    with open(os.path.join(output_dir, f"{stem}_brd.txt"), "w", encoding="utf-8") as f:
+        f.write(brd_text)
+    if "csv" in formats:
+        df_result.to_csv(os.path.join(output_dir, f"{stem}_test_cases.csv"), index=False)
+    if "xlsx" in formats:
+        write_xlsx(df_result, os.path.join(output_dir, f"{stem}_test_cases.xlsx"))
+
+    result["ok"] = True
+    result.pop("error", None)
+    result["rows"] = len(df_result)
+    return result, df_result.assign(**{"Use Case": stem})
+
+
+def pack_brds(model, files, today, bypass_cache, pack_tokens, token_budget, budget_action):
+    """{path: (BRD, seconds)} for the files, with several short use cases per model request.
+
+    Seconds are the pack's wall-clock time split evenly over its use cases.
+    Files whose BRD failed are left out; process_file then generates them itself.
+    """
+    with track_tokens(token_budget, budget_action) as tokens:
+        brds, report = generate_brds_packed(model, [read_usecase(path) for path in files], today, pack_tokens, BRD_PACK_MAX,
+                                            bypass_cache=bypass_cache)
+    seconds, start = {}, 0
+    for entry in report:
+        # Packs hold consecutive use cases, in order
+        for i in range(start, start + entry["Use Cases"]):
+            seconds[i] = entry["Seconds"] / entry["Use Cases"]
+        start += entry["Use Cases"]
+    packed = {path: (brd, seconds[i]) for i, (path, brd) in enumerate(zip(files, brds)) if isinstance(brd, str) and brd}
+    packs = [entry for entry in report if entry["Use Cases"] > 1]
+    summary = {
+        "use_cases": len(files),
+        "cached": tokens.cached_calls,
+        "packs": len(packs),
+        "split": sum(entry["Split"] for entry in packs),
+        "fallbacks": sum(entry["Fallbacks"] for entry in packs),
+        "prompt_tokens": tokens.prompt_tokens,
+        "response_tokens": tokens.response_tokens,
+        "model_calls": tokens.calls,
+    }
+    return packed, summary
+
+
+def print_summary(results, elapsed, packing=None):
+    ok = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    brd_times = [r["brd_seconds"] for r in ok]
+    test_case_times = [r["test_case_seconds"] for r in ok]
+    files_per_min = len(ok) / elapsed * 60 if elapsed else 0.0
+
+    print()
+    print(f"Processed {len(results)} use case(s) in {elapsed:.1f}s: {len(ok)} ok, {len(failed)} failed")
+    print(f"Throughput: {files_per_min:.2f} files/min, {sum(r['rows'] for r in ok)} test cases")
+    print(f"BRD stage        p50 {percentile(brd_times, 50):6.2f}s  p95 {percentile(brd_times, 95):6.2f}s")
+    print(f"Test case stage  p50 {percentile(test_case_times, 50):6.2f}s  p95 {percentile(test_case_times, 95):6.2f}s")
+    if packing:
+        print(f"BRD packing: {packing['use_cases']} use case(s) in {packing['model_calls']} model request(s)"
+              + (f" and {packing['cached']} cached response(s)" if packing["cached"] else "")
+              + f"; {packing['split']} split from {packing['packs']} packed request(s), {packing['fallbacks']} fell back to a request of their own")
+    # Packed BRD calls are counted once for the batch, not per file
+    packed = [packing] if packing else []
+    prompt_tokens = sum(r["prompt_tokens"] for r in results + packed)
+    response_tokens = sum(r["response_tokens"] for r in results + packed)
+    print(f"Tokens: {prompt_tokens:,} prompt + {response_tokens:,} response over {sum(r['model_calls'] for r in results + packed)} "
+          f"model call(s), ~{sum(r['saved_tokens'] for r in results):,} prompt tokens saved by BRD compaction")
+    for r in failed:
+        print(f"FAILED {r['file']} after {r['attempts']} attempt(s): {r.get('error')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate BRDs and test cases for a batch of use case files.")
+    parser.add_argument("inputs", nargs="+", help="Use case directories (*.txt) or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="batch_output")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Use cases processed concurrently")
+    parser.add_argument("-r", "--retries", type=int, default=2, help="Retries per use case after a failure")
+    parser.add_argument("-f", "--format", choices=["xlsx", "csv", "both"], default="both")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default=PROVIDER, help="Model backend (stub runs offline)")
+    parser.add_argument("--structured", action="store_true", help="Request schema-constrained JSON instead of CSV")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help="Similarity at which test cases count as near-duplicates and are pruned (0 disables)")
+    parser.add_argument("--no-compact", action="store_true", help="Embed the BRD as generated, without stripping boilerplate")
+    parser.add_argument("--token-budget", type=int, default=PROMPT_TOKEN_BUDGET, help="Estimated prompt tokens allowed per call")
+    parser.add_argument("--budget-action", choices=BUDGET_ACTIONS, default=PROMPT_BUDGET_ACTION,
+                        help="What to do with a prompt over the token budget")
+    parser.add_argument("--pack-brds", action="store_true",
+                        help="Generate BRDs for several short use cases per request, splitting the response per use case")
+    parser.add_argument("--pack-tokens", type=int, default=BRD_PACK_TOKENS, help="Estimated prompt tokens per packed BRD request")
+    parser.add_argument("--metrics-file", help="Write stage latency, token and parse metrics here in the Prometheus text format")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--fan-out", action="store_true", help="One test case request per transaction type")
+    mode.add_argument("--chunk-tokens", type=int, default=0, help="Split large BRDs into chunks of this many tokens")
+    args = parser.parse_args(argv)
+
+    files = find_usecase_files(args.inputs)
+    if not files:
+        parser.error("no use case files matched the given inputs")
+    os.makedirs(args.output_dir, exist_ok=True)
+    formats = {"xlsx", "csv"} if args.format == "both" else {args.format}
+    stems = output_stems(files)
+    for path, stem in stems.items():
+        if stem != output_stem(path):
+            print(f"{path}: another input has the same name, writing its results as {stem}_*")
+
+    load_dotenv()
+    model = get_model(args.provider)
+    today = datetime.now().strftime("%B %d, %Y")
+
+    print(f"Processing {len(files)} use case(s) with {args.workers} worker(s)...")
+    results, frames = [], []
+    print_lock = threading.Lock()
+    started = time.perf_counter()
+    packed_brds, packing = {}, None
+    if args.pack_brds:
+        packed_brds, packing = pack_brds(model, files, today, args.no_cache, args.pack_tokens, args.token_budget, args.budget_action)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [
+            executor.submit(process_file, model, path, args.output_dir, formats, args.retries, today, args.no_cache, args.fan_out, args.chunk_tokens,
+                            args.structured, args.near_dup_threshold, not args.no_compact, args.token_budget, args.budget_action,
+                            print_lock, packed_brds.get(path), stems[path])
+            for path in files
+        ]
+        for future in as_completed(futures):
+            result, df_result = future.result()
+            results.append(result)
+            if df_result is not None:
+                frames.append(df_result)
+            with print_lock:
+                status = f"{result['rows']} test cases, {result['prompt_tokens']:,} prompt tokens" if result["ok"] else "failed"
+                print(f"[{len(results)}/{len(files)}] {result['file']}: {status}")
+    elapsed = time.perf_counter() - started
+
+    if frames:
+        combined = pd.concat(frames, ignore_index=True)
+        combined = combined[["Use Case"] + DEFAULT_COLUMNS].sort_values("Use Case", kind="stable")
+        write_xlsx(combined, os.path.join(args.output_dir, "all_test_cases.xlsx"))
+
+    print_summary(results, elapsed, packing)
+    if args.metrics_file:
+        write_metrics_file(args.metrics_file)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
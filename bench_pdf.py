@@ -0,0 +1,106 @@
+import argparse
+import random
+import sys
+import time
+from io import BytesIO
+
+from fpdf import FPDF
+
+from pdf_renderer import BRDRenderer, parse_blocks
+
+WORDS = (
+    "policy account agent underwriting coverage vehicle driver premium quote bind issue "
+    "rating endorsement cancellation reinstatement rewrite submission liability collision "
+    "comprehensive deductible limit effective date jurisdiction validation rule screen"
+).split()
+
+
+def synthetic_brd(sections, seed=7):
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    parts = ["# Business Requirements Document", "Date: October 17, 2026", ""]
+    for s in range(1, sections + 1):
+        parts.append(f"## {s}. {sentence(4)[:-1]}")
+        parts.append(" ".join(sentence(rng.randint(8, 20)) for _ in range(5)))
+        parts.append("")
+        parts.extend(f"- {sentence(rng.randint(6, 14))}" for _ in range(4))
+        parts.append("")
+        parts.append("| Requirement ID | Description | Priority | Acceptance Criteria |")
+        parts.append("|---|---|---|---|")
+        for r in range(1, 6):
+            parts.append(f"| FR-{s}.{r} | {sentence(rng.randint(6, 18))} | {rng.choice(['High', 'Medium', 'Low'])} | {sentence(rng.randint(4, 12))} |")
+        parts.append("")
+    return "\n".join(parts)
+
+
+def legacy_generate_pdf_from_text(text):
+    # Previous renderer, kept here as the baseline for comparison
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    lines = text.encode("latin-1", errors="replace").decode("latin-1").strip().splitlines()
+    width = pdf.w - pdf.l_margin - pdf.r_margin
+
+    def multi_cell(line):
+        # Explicit width and x: fpdf2 leaves x at the right edge after multi_cell, where width 0 has no room
+        pdf.set_x(pdf.l_margin)
+        pdf.multi_cell(width, 10, line)
+
+    if any("|" in line for line in lines):
+        for line in lines:
+            if "|" not in line:
+                multi_cell(line)
+            else:
+                for col in [col.strip() for col in line.split("|") if col.strip()]:
+                    pdf.cell(40, 10, col, border=1)
+                pdf.ln()
+    else:
+        for line in lines:
+            multi_cell(line)
+    data = pdf.output(dest="S")
+    return len(data), pdf.page_no()
+
+
+def new_generate_pdf_from_text(text):
+    buffer = BytesIO()
+    pages = BRDRenderer().render(parse_blocks(text)).write_to(buffer)
+    return buffer.tell(), pages
+
+
+def bench(name, render, text, repeats):
+    kib = len(text) / 1024
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        size, pages = render(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {name:<8} {pages:5d} pages  {best:7.3f} s  {pages / best:8.1f} pages/s  {kib / best:8.0f} KiB markdown/s  {size / 1024:6.0f} KiB pdf")
+    return pages / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark BRD PDF rendering on synthetic documents.")
+    parser.add_argument("--sections", type=int, nargs="+", default=[10, 100, 400])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args(argv)
+
+    for sections in args.sections:
+        text = synthetic_brd(sections)
+        print(f"{sections} sections, {len(text) / 1024:.0f} KiB of markdown")
+        bench("new", new_generate_pdf_from_text, text, args.repeats)
+        if not args.skip_legacy:
+            try:
+                bench("legacy", legacy_generate_pdf_from_text, text, args.repeats)
+            except Exception as e:
+                # The baseline is only for comparison; an fpdf it cannot run on should not end the run
+                print(f"  legacy   unavailable: {type(e).__name__}: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
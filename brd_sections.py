@@ -0,0 +1,194 @@
+import hashlib
+import re
+
+# Markdown headings ("## 2. Scope") and bold-only lines ("**Functional Requirements**")
+HEADING_RE = re.compile(r"^\s*(#{1,6}\s+\S.*|\*\*[^*\n]+\*\*:?)\s*$")
+
+# --- Compaction: boilerplate that costs prompt tokens in every test case call but states no requirement ---
+REVISION_HEADING_RE = re.compile(r"^(\d+(\.\d+)*\.?\s*)?(document\s+)?(revision|version|change)\s+(history|log|control)$", re.I)
+SIGNATURE_HEADING_RE = re.compile(
+    r"^(\d+(\.\d+)*\.?\s*)?(document\s+|stakeholder\s+)?(approvals?|sign[- ]?offs?|signatures?|approval\s+signatures)$", re.I
+)
+# Empty form fields ("Approved by: ______") and signature rules
+SIGNATURE_LINE_RE = re.compile(
+    r"^\s*[-*]?\s*(\*\*)?(signature|signed|approved by|reviewed by|prepared by|name|date|title|role)(\*\*)?\s*:?\s*(\*\*)?"
+    r"\s*(_{3,}|\.{3,}|\[[^\]]*\])?\s*$|^\s*_{3,}\s*$",
+    re.I,
+)
+MIN_REPEATED_SECTION_TOKENS = 25
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English prose
+    return max(1, len(text) // 4) if text else 0
+
+
+def split_sections(brd_text):
+    """Returns (heading, text) pairs in document order; text includes the heading line."""
+    sections = []
+    heading, lines = "", []
+    for line in brd_text.splitlines():
+        if HEADING_RE.match(line):
+            if any(l.strip() for l in lines):
+                sections.append((heading, "\n".join(lines).strip()))
+                lines = []
+            heading = line.strip().strip("#* :").strip()
+        lines.append(line)
+    if any(l.strip() for l in lines):
+        sections.append((heading, "\n".join(lines).strip()))
+    return sections
+
+
+def _split_oversized(text, token_budget):
+    # Paragraphs first, then single lines for paragraphs that are still too big
+    pieces, current = [], ""
+    for block in re.split(r"\n\s*\n", text):
+        parts = [block] if estimate_tokens(block) <= token_budget else block.splitlines()
+        for part in parts:
+            candidate = f"{current}\n\n{part}" if current else part
+            if current and estimate_tokens(candidate) > token_budget:
+                pieces.append(current)
+                current = part
+            else:
+                current = candidate
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def chunk_brd(brd_text, token_budget=6000):
+    """Packs consecutive sections into chunks of at most token_budget estimated tokens.
+
+    Returns a list of dicts with the chunk text and the headings it covers.
+    """
+    sections = split_sections(brd_text)
+    if not sections:
+        return []
+
+    # Text before the first real heading (title, date, author) is context for every chunk
+    preamble = ""
+    if not sections[0][0] and len(sections) > 1:
+        preamble = sections.pop(0)[1]
+    budget = max(1, token_budget - estimate_tokens(preamble))
+
+    chunks, current, headings = [], [], []
+
+    def flush():
+        if current:
+            body = "\n\n".join(current)
+            chunks.append({"text": f"{preamble}\n\n{body}" if preamble else body, "headings": list(headings)})
+            current.clear()
+            headings.clear()
+
+    for heading, text in sections:
+        pieces = [text] if estimate_tokens(text) <= budget else _split_oversized(text, budget)
+        for piece in pieces:
+            if current and estimate_tokens("\n\n".join(current + [piece])) > budget:
+                flush()
+            current.append(piece)
+            if heading and heading not in headings:
+                headings.append(heading)
+    flush()
+    return chunks
+
+
+def section_key(text):
+    # Content hash that ignores case and whitespace, so reflowed text still matches
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def section_units(brd_text, token_budget=6000):
+    """Splits a BRD into (preamble, units) for incremental regeneration.
+
+    Units are sections (oversized ones split into pieces) as dicts with the
+    heading, text and content key. The preamble is context for every unit.
+    """
+    sections = split_sections(brd_text)
+    preamble = ""
+    if sections and not sections[0][0] and len(sections) > 1:
+        preamble = sections.pop(0)[1]
+    budget = max(1, token_budget - estimate_tokens(preamble))
+    units = []
+    for heading, text in sections:
+        pieces = [text] if estimate_tokens(text) <= budget else _split_oversized(text, budget)
+        for piece in pieces:
+            units.append({"heading": heading, "text": piece, "key": section_key(piece)})
+    return preamble, units
+
+
+def _table_kind(header):
+    # Classifies a markdown table by its header row
+    cells = {cell.strip(" *").lower() for cell in header.strip().strip("|").split("|")}
+    if "signature" in cells:
+        return "signature"
+    if cells & {"version", "revision", "rev", "rev."} and "date" in cells and \
+            cells & {"author", "description", "changes", "change", "comments", "changed by", "change description"}:
+        return "revision"
+    return None
+
+
+def _compact_lines(text, removed):
+    kept, lines = [], text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.lstrip().startswith("|"):
+            end = i
+            while end < len(lines) and lines[end].lstrip().startswith("|"):
+                end += 1
+            kind = _table_kind(line)
+            if kind:
+                removed["Revision Tables" if kind == "revision" else "Signature Blocks"] += 1
+            else:
+                kept.extend(lines[i:end])
+            i = end
+            continue
+        if SIGNATURE_LINE_RE.match(line) and line.strip():
+            removed["Signature Lines"] += 1
+        else:
+            kept.append(line)
+        i += 1
+    return "\n".join(kept).strip()
+
+
+def compact_brd(brd_text):
+    """Strips boilerplate from a BRD before it is embedded in test case prompts.
+
+    Drops revision/version history sections and tables, approval and
+    signature blocks, empty form fields, repeated headings and sections that
+    repeat an earlier one word for word. Returns (text, report).
+    """
+    removed = {"Revision Tables": 0, "Signature Blocks": 0, "Signature Lines": 0, "Repeated Headings": 0, "Repeated Sections": 0}
+    sections = split_sections(brd_text or "")
+    kept, seen = [], set()
+    for index, (heading, text) in enumerate(sections):
+        if heading and REVISION_HEADING_RE.match(heading):
+            removed["Revision Tables"] += 1
+            continue
+        if heading and SIGNATURE_HEADING_RE.match(heading):
+            removed["Signature Blocks"] += 1
+            continue
+        body = text.split("\n", 1)[1] if heading and "\n" in text else "" if heading else text
+        next_heading = sections[index + 1][0] if index + 1 < len(sections) else None
+        if heading and not body.strip() and next_heading and next_heading.lower() == heading.lower():
+            # The same heading twice in a row (e.g. repeated page headers)
+            removed["Repeated Headings"] += 1
+            continue
+        key = section_key(text)
+        # Short sections ("N/A", a shared acceptance line) may repeat on purpose
+        if key in seen and estimate_tokens(text) >= MIN_REPEATED_SECTION_TOKENS:
+            removed["Repeated Sections"] += 1
+            continue
+        seen.add(key)
+        text = _compact_lines(text, removed)
+        if text:
+            kept.append(text)
+    compacted = "\n\n".join(kept)
+    original_tokens, compacted_tokens = estimate_tokens(brd_text or ""), estimate_tokens(compacted)
+    report = {
+        "Original Tokens": original_tokens,
+        "Compacted Tokens": compacted_tokens,
+        "Tokens Saved": original_tokens - compacted_tokens,
+        **removed,
+    }
+    return compacted, report
@@ -0,0 +1,226 @@
+import csv
+import io
+import re
+
+FENCE_RE = re.compile(r"^\s*```[A-Za-z]*")
+TRAILING_FENCE_RE = re.compile(r"\s*```\s*$")
+ROW_START_RE = re.compile(r'^\s*"?\s*\d+\s*"?\s*,')
+ROW_START_LOOKAHEAD = 16
+QUOTE_OR_NEWLINE_RE = re.compile(r'["\n]')
+
+
+def _normalize_name(name):
+    return " ".join(name.replace("*", "").split()).lower()
+
+
+class IncrementalCSVParser:
+    """Feeds model output chunk by chunk and emits complete CSV rows.
+
+    A record only ends on a newline outside double quotes, so multiline
+    "Steps" cells are held back until their closing quote arrives.
+
+    Model output is parsed tolerantly: code fences, text around the table,
+    unclosed or backslash-escaped quotes, literal "\\n" sequences and rows
+    with too many or too few fields are repaired where possible. Every fix
+    and every dropped record is listed in `issues`.
+    """
+
+    def __init__(self, columns=None):
+        self.header = None
+        self.rows = []
+        self.issues = []
+        self._expected = {_normalize_name(col): col for col in columns or []}
+        self._header_key = None
+        self._held = None
+        self._chunks = []
+        self._pending = ""
+        self._scan_pos = 0
+        self._in_quotes = False
+        self._line = 1
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    @property
+    def repaired(self):
+        return sum(1 for issue in self.issues if issue["Action"] == "repaired")
+
+    @property
+    def dropped(self):
+        return sum(1 for issue in self.issues if issue["Action"] == "dropped")
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        self._pending += chunk
+        return self._scan()
+
+    def close(self):
+        new_rows = self._scan(final=True)
+        records = [self._pending] if self._pending.strip() else []
+        self._pending = ""
+        self._scan_pos = 0
+        self._in_quotes = False
+        return new_rows + self._accept(records, final=True)
+
+    def _scan(self, final=False):
+        # Records are accepted as soon as they end, so the header is known for the rest
+        new_rows = []
+        start = 0
+        pending = self._pending
+        i = len(pending)
+        for match in QUOTE_OR_NEWLINE_RE.finditer(pending, self._scan_pos):
+            i = match.start()
+            if match.group() == '"':
+                self._in_quotes = not self._in_quotes
+            elif not self._in_quotes:
+                new_rows += self._accept([pending[start:i]])
+                start = i + 1
+            elif self.header is not None:
+                # Usually a line break inside a multiline cell; the start of the
+                # next line tells us whether a quote was left open instead
+                lookahead = pending[i + 1:i + 1 + ROW_START_LOOKAHEAD]
+                if not final and len(lookahead) < ROW_START_LOOKAHEAD and "\n" not in lookahead:
+                    break
+                if self._unclosed_quote(pending[start:i], lookahead):
+                    new_rows += self._accept([pending[start:i]])
+                    self._in_quotes = False
+                    start = i + 1
+        else:
+            i = len(pending)
+        self._pending = pending[start:]
+        self._scan_pos = i - start
+        return new_rows
+
+    def _unclosed_quote(self, record, next_line):
+        # The next line opens a new numbered row, or this record already has every field
+        if not next_line.startswith('"'):
+            return False
+        if ROW_START_RE.match(next_line):
+            return True
+        fields = next(csv.reader(io.StringIO(record + '"'), skipinitialspace=True), [])
+        return len(fields) >= len(self.header)
+
+    def _issue(self, action, line, issue, row=None):
+        self.issues.append({"Line": line, "Row": row, "Action": action, "Issue": issue})
+
+    def _accept(self, records, final=False):
+        new_rows = []
+        for record in records:
+            line = self._line
+            self._line += record.count("\n") + 1
+            record = record.rstrip("\r")
+            # Skip blank lines and markdown code fences the model adds anyway
+            if record.lstrip().startswith("```"):
+                record = FENCE_RE.sub("", record, count=1)
+            record = TRAILING_FENCE_RE.sub("", record)
+            if not record.strip():
+                continue
+
+            fixes = []
+            if '\\"' in record:
+                record = record.replace('\\"', '""')
+                fixes.append("backslash-escaped quotes")
+            if record.count('"') % 2:
+                fixes.append("unclosed quote")
+            fields = next(csv.reader(io.StringIO(record), skipinitialspace=True), [])
+            if self.header is None:
+                if self._take_header(fields, line) == "data":
+                    self._emit(line, fields, fixes, new_rows)
+                continue
+
+            if self._held is not None:
+                held_line, held_fields, held_fixes = self._held
+                self._held = None
+                continues = '"' in record and not ROW_START_RE.match(record)
+                if continues and len(held_fields) + len(fields) - 1 <= len(self.header):
+                    # A stray quote ended the record early; this line is the rest of its last cell
+                    fields = held_fields[:-1] + [held_fields[-1] + "\n" + fields[0]] + fields[1:]
+                    line, fixes = held_line, held_fixes + fixes + ["row split across lines rejoined"]
+                else:
+                    self._emit(held_line, held_fields, held_fixes, new_rows)
+            if len(fields) < len(self.header) and not final:
+                # Wait for the next line before padding a short row
+                self._held = (line, fields, fixes)
+                continue
+            self._emit(line, fields, fixes, new_rows)
+
+        if final and self._held is not None:
+            self._emit(*self._held, new_rows)
+            self._held = None
+        return new_rows
+
+    def _emit(self, line, fields, fixes, new_rows):
+        row = self._fit_row(fields, line, fixes)
+        if row is None:
+            return
+        self.rows.append(row)
+        new_rows.append(row)
+        if fixes:
+            self._issue("repaired", line, "; ".join(fixes), len(self.rows))
+
+    def _take_header(self, fields, line):
+        # Returns "header" when the record is the header, "data" when the model
+        # skipped the header and the record is a row, None when it is dropped
+        names = [field.strip() for field in fields]
+        if len([name for name in names if name]) < min(2, len(self._expected) or 2):
+            self._issue("dropped", line, "text before the CSV header")
+            return None
+        if self._expected and not any(_normalize_name(name) in self._expected for name in names):
+            if len(names) == len(self._expected) and names[0].isdigit():
+                self.header = list(self._expected.values())
+                self._header_key = list(self._expected)
+                self._issue("repaired", line, "missing header row, used the template columns")
+                return "data"
+            self._issue("dropped", line, "text before the CSV header")
+            return None
+
+        header, seen = [], set()
+        for index, name in enumerate(names, start=1):
+            name = self._expected.get(_normalize_name(name)) or name.replace("*", "").strip() or f"Column {index}"
+            base, n = name, 2
+            while name in seen:
+                name, n = f"{base} ({n})", n + 1
+            seen.add(name)
+            header.append(name)
+        self.header = header
+        self._header_key = [_normalize_name(name) for name in names]
+        return "header"
+
+    def _fit_row(self, fields, line, fixes):
+        width = len(self.header)
+        if _normalize_name(fields[0]) == self._header_key[0] and [_normalize_name(f) for f in fields][:width] == self._header_key:
+            self._issue("dropped", line, "repeated header row")
+            return None
+        if sum(1 for field in fields if field.strip()) < min(2, width):
+            self._issue("dropped", line, "not a table row")
+            return None
+
+        while len(fields) > width and not fields[-1].strip():
+            fields.pop()
+        if len(fields) > width:
+            # Usually an unquoted comma in free text; keep the text rather than lose the row
+            fixes.append(f"{len(fields) - width} extra field(s) merged into '{self.header[-1]}'")
+            fields = fields[:width - 1] + [", ".join(fields[width - 1:])]
+        elif len(fields) < width:
+            fixes.append(f"{width - len(fields)} missing field(s) left blank")
+            fields = fields + [""] * (width - len(fields))
+        if any("\\n" in field for field in fields):
+            fixes.append("literal \\n turned into line breaks")
+            fields = [field.replace("\\r\\n", "\n").replace("\\n", "\n") for field in fields]
+        return fields
+
+    def records(self, rows=None):
+        header = self.header or []
+        rows = self.rows if rows is None else rows
+        width = len(header)
+        return [dict(zip(header, (row + [""] * width)[:width])) for row in rows]
+
+
+def parse_csv_tolerant(text, columns=None):
+    parser = IncrementalCSVParser(columns)
+    parser.feed(text)
+    parser.close()
+    return parser
@@ -0,0 +1,209 @@
+import hashlib
+import numbers
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import xlsxwriter
+
+from metrics import SIZE_BUCKETS, registry, stage
+
+EXPORT_MEMO_MAX_MB = float(os.getenv("EXPORT_MEMO_MAX_MB", "64"))
+
+# --- Excel Export Settings ---
+EXPORT_TMP_DIR = os.getenv("EXPORT_TMP_DIR") or None  # where workbooks are spooled (default: system temp)
+XLSX_SPLIT_COLUMN = "Transaction Type"  # one sheet per value
+XLSX_MAX_WIDTH = 80
+XLSX_WRAP_CHARS = 50  # columns with longer (or multiline) values wrap
+XLSX_SIZE_SAMPLE = 5000  # rows looked at to size each column
+XLSX_MAX_ROWS = 1048576  # Excel's limit per sheet, header included
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def content_digest(content):
+    if isinstance(content, pd.DataFrame):
+        digest = hashlib.sha256("\x1f".join(map(str, content.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(content, index=False).values.tobytes())
+        return digest.hexdigest()
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class ExportMemo:
+    """Process-wide LRU of rendered export bytes, bounded by total size."""
+
+    def __init__(self, max_mb=EXPORT_MEMO_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.renders = 0
+        self.hits = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        data = render()
+        with self._lock:
+            self.renders += 1
+            if key not in self._entries:
+                self._entries[key] = data
+                self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+        return data
+
+
+_memo = ExportMemo()
+
+
+def lazy_export(fmt, content, render, digest=None):
+    # Returns a zero-argument callable for st.download_button(data=...).
+    # Nothing is rendered until the user clicks, and each content hash renders once.
+    # content may itself be a zero-argument loader; digest is then required.
+    key = (fmt, digest or content_digest(content))
+
+    def produce():
+        return _memo.get_or_render(key, lambda: _timed_render(fmt, render, content))
+
+    return produce
+
+
+def _timed_render(fmt, render, content):
+    # Only real renders are timed; memo hits cost nothing worth measuring
+    with stage("export", format=fmt) as info:
+        data = render(content() if callable(content) else content)
+        info["bytes"] = len(data)
+    registry.observe("genai_artifact_bytes", len(data), SIZE_BUCKETS, format=fmt)
+    return data
+
+
+# --- Renderers ---
+def text_bytes(text):
+    return text.encode("utf-8")
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def xlsx_bytes(df, sheet_name="TestCases", split_by=XLSX_SPLIT_COLUMN, widths=None):
+    # The workbook is built in a temp file and only the finished bytes are read back
+    with tempfile.TemporaryDirectory(prefix="genai-xlsx-", dir=EXPORT_TMP_DIR) as tmpdir:
+        path = os.path.join(tmpdir, "export.xlsx")
+        write_xlsx(df, path, sheet_name, split_by, widths, tmpdir=tmpdir)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def write_xlsx(df, path, sheet_name="TestCases", split_by=XLSX_SPLIT_COLUMN, widths=None, tmpdir=EXPORT_TMP_DIR):
+    """Streams df into an .xlsx file at path, one row at a time.
+
+    xlsxwriter's constant_memory mode flushes each row to a temp file as soon
+    as the next one starts, so memory stays flat however many rows there are.
+    With split_by, each of its values (transaction types) gets its own sheet,
+    in order of first appearance; otherwise everything goes on sheet_name.
+    widths optionally fixes column widths by position; the rest are sized
+    from a sample of the values. Returns {sheet name: rows written}.
+    """
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tmpdir or tempfile.gettempdir()})
+    try:
+        header_format = workbook.add_format({"bold": True, "text_wrap": True, "valign": "top", "bottom": 1})
+        wrap_format = workbook.add_format({"text_wrap": True, "valign": "top"})
+        top_format = workbook.add_format({"valign": "top"})
+        columns = [str(col) for col in df.columns]
+        layout = _column_layout(df, widths)
+        sheets = {}  # split value -> [worksheet, next row]
+        used_names = set()
+        counts = {}
+
+        def open_sheet(name):
+            name = _sheet_name(name, used_names)
+            worksheet = workbook.add_worksheet(name)
+            # Formats and widths are set once per column, not per cell
+            for col, (width, wrap) in enumerate(layout):
+                worksheet.set_column(col, col, width, wrap_format if wrap else top_format)
+            for col, header in enumerate(columns):
+                worksheet.write_string(0, col, header, header_format)
+            worksheet.freeze_panes(1, 0)
+            counts[name] = 0
+            return [worksheet, 1, name]
+
+        if split_by in df.columns and len(df):
+            keys = df[split_by].fillna("").astype(str).str.strip().replace("", "Other")
+        else:
+            keys = None
+            sheets[None] = open_sheet(sheet_name)
+        for i, row in enumerate(df.itertuples(index=False, name=None)):
+            key = keys.iat[i] if keys is not None else None
+            sheet = sheets.get(key)
+            if sheet is None or sheet[1] >= XLSX_MAX_ROWS:
+                # A full sheet carries on in a new one of the same name plus a suffix
+                sheet = sheets[key] = open_sheet(key if key is not None else sheet_name)
+            worksheet, row_number = sheet[0], sheet[1]
+            for col, value in enumerate(row):
+                _write_cell(worksheet, row_number, col, value)
+            sheet[1] += 1
+            counts[sheet[2]] += 1
+        for worksheet, next_row, _ in sheets.values():
+            if columns:
+                worksheet.autofilter(0, 0, next_row - 1, len(columns) - 1)
+    finally:
+        workbook.close()
+    return counts
+
+
+def _write_cell(worksheet, row, col, value):
+    # Strings are written as strings: a generated "=..." or URL is never turned into a formula or link
+    if isinstance(value, str):
+        if value:
+            worksheet.write_string(row, col, value)
+    elif isinstance(value, bool):
+        worksheet.write_boolean(row, col, value)
+    elif isinstance(value, numbers.Number):
+        if value == value and abs(value) != float("inf"):
+            worksheet.write_number(row, col, value)
+    elif value is not None and not (pd.api.types.is_scalar(value) and pd.isna(value)):
+        worksheet.write_string(row, col, str(value))
+
+
+def _column_layout(df, widths=None):
+    # (width, wrap) per column, from the header and a sample of the values
+    sample = df if len(df) <= XLSX_SIZE_SAMPLE else df.sample(XLSX_SIZE_SAMPLE, random_state=0)
+    layout = []
+    for col_index, col in enumerate(df.columns):
+        values = sample.iloc[:, col_index].dropna().astype(str)
+        longest_line = values.str.split("\n").map(lambda lines: max(map(len, lines))) if len(values) else values
+        typical = float(longest_line.quantile(0.9)) if len(values) else 0.0
+        wrap = bool(len(values)) and (int(longest_line.max()) > XLSX_WRAP_CHARS or bool(values.str.contains("\n", regex=False).any()))
+        width = min(max(len(str(col)), typical) + 2, XLSX_MAX_WIDTH)
+        if widths is not None and col_index < len(widths) and widths[col_index]:
+            width = widths[col_index]
+        layout.append((width, wrap))
+    return layout
+
+
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def _sheet_name(name, used):
+    # Excel sheet names: at most 31 characters, none of []:*?/\, unique ignoring case
+    base = _INVALID_SHEET_CHARS.sub(" ", str(name)).strip().strip("'")[:31].strip() or "Sheet"
+    if base.lower() == "history":
+        base = "History (data)"  # reserved by Excel
+    candidate, n = base, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = base[:31 - len(suffix)].rstrip() + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
@@ -0,0 +1,157 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from genai_client import stub_brd, stub_test_case_csv, stub_test_case_json
+
+# Local stand-in for the Gemini REST API (v1beta generateContent, streamGenerateContent
+# and countTokens) that injects 429 and 500 responses. Point the app at it with
+#   GENAI_TRANSPORT=rest GENAI_API_ENDPOINT=http://127.0.0.1:8765
+PATH_RE = re.compile(r"^/v1beta/models/([^:/]+):(\w+)")
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rpm=0, error_rate_429=0.0, error_rate_500=0.0, retry_after=1.0,
+                 latency=0.0, rows=8, seed=None):
+        super().__init__(address, FakeGeminiHandler)
+        self.rpm = rpm
+        self.error_rate_429 = error_rate_429
+        self.error_rate_500 = error_rate_500
+        self.retry_after = retry_after
+        self.latency = latency
+        self.rows = rows
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.counts = {"requests": 0, "ok": 0, "quota_429": 0, "injected_429": 0, "injected_500": 0}
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        # Returns (status, retry_after) for the next request, counting it against the quota window
+        with self.lock:
+            self.counts["requests"] += 1
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= 60:
+                self.window.popleft()
+            if self.rpm and len(self.window) >= self.rpm:
+                self.counts["quota_429"] += 1
+                return 429, 60 - (now - self.window[0])
+            roll = self.random.random()
+            if roll < self.error_rate_429:
+                self.counts["injected_429"] += 1
+                return 429, self.retry_after
+            if roll < self.error_rate_429 + self.error_rate_500:
+                self.counts["injected_500"] += 1
+                return 500, None
+            self.window.append(now)
+            self.counts["ok"] += 1
+            return 200, None
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        match = PATH_RE.match(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not match:
+            return self._send_json(404, {"error": {"code": 404, "message": f"unknown path {self.path}", "status": "NOT_FOUND"}})
+        method = match.group(2)
+        prompt = "\n".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        if method == "countTokens":
+            return self._send_json(200, {"totalTokens": len(prompt) // 4})
+
+        status, retry_after = self.server.admit()
+        if status == 429:
+            return self._send_json(429, {"error": {
+                "code": 429,
+                "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after:.3f}s"}],
+            }}, {"Retry-After": f"{retry_after:.3f}"})
+        if status == 500:
+            return self._send_json(500, {"error": {"code": 500, "message": "Internal error encountered.", "status": "INTERNAL"}})
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        text = self._respond(prompt, body.get("generationConfig") or {})
+        usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4,
+                 "totalTokenCount": (len(prompt) + len(text)) // 4}
+        if method == "streamGenerateContent":
+            chunks = [text[i:i + 200] for i in range(0, len(text), 200)] or [""]
+            return self._send_json(200, [_candidate(chunk, usage) for chunk in chunks])
+        return self._send_json(200, _candidate(text, usage))
+
+    def _respond(self, prompt, generation_config):
+        rng = random.Random(prompt)
+        if prompt.lstrip().startswith("Create a detailed Business Requirements Document"):
+            return stub_brd(prompt, rng)
+        if generation_config.get("responseMimeType") == "application/json":
+            return stub_test_case_json(prompt, rng, self.server.rows, generation_config.get("responseSchema"))
+        return stub_test_case_csv(prompt, rng, self.server.rows)
+
+
+def _candidate(text, usage):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": usage,
+    }
+
+
+def start_in_background(port=0, **options):
+    server = FakeGeminiServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Gemini REST API with 429/500 injection.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=0, help="Server-side requests/minute quota (0 = unlimited)")
+    parser.add_argument("--error-rate-429", type=float, default=0.1)
+    parser.add_argument("--error-rate-500", type=float, default=0.05)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Seconds advertised on injected 429s")
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = FakeGeminiServer(("127.0.0.1", args.port), args.rpm, args.error_rate_429, args.error_rate_500,
+                              args.retry_after, args.latency)
+    print(f"Fake Gemini API on {server.endpoint} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from metrics import log_event
+from rate_limiter import get_rate_limiter
+from token_usage import check_prompt, metered_stream, record_call
+
+MODEL_NAME = os.getenv("GENAI_MODEL", "gemini-2.0-flash-exp")
+PROVIDER = os.getenv("GENAI_PROVIDER", "gemini")
+
+
+# --- Response shape shared by every provider (mirrors google.generativeai) ---
+class _Part:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Content:
+    def __init__(self, text):
+        self.parts = [_Part(text)]
+
+
+class _Candidate:
+    def __init__(self, text):
+        self.content = _Content(text)
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.candidates = [_Candidate(text)]
+        self.text = text
+
+
+# --- Providers ---
+class GeminiProvider:
+    """google.generativeai model, configured once per process.
+
+    The underlying gRPC channel (or REST session with GENAI_TRANSPORT=rest)
+    is kept open and reused by every session that shares this instance.
+    Every call goes through the process-wide rate limiter, which queues,
+    retries and backs off on 429 and transient 5xx errors, and is checked
+    against the prompt token budget and counted before and after sending.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name=MODEL_NAME, api_key=None):
+        import google.generativeai as genai
+
+        client_options = None
+        api_endpoint = os.getenv("GENAI_API_ENDPOINT")
+        if api_endpoint:
+            client_options = {"api_endpoint": api_endpoint}
+        genai.configure(
+            api_key=api_key or os.getenv("GOOGLE_API_KEY"),
+            transport=os.getenv("GENAI_TRANSPORT") or None,
+            client_options=client_options,
+        )
+        self._model = genai.GenerativeModel(model_name)
+        self.model_name = self._model.model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        kwargs = {"stream": stream}
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        limiter = get_rate_limiter()
+        estimated = check_prompt(prompt)
+        started = time.perf_counter()
+
+        def charge(response, record):
+            # Charge the tokens/minute bucket for what the call actually used beyond the estimate
+            usage = getattr(response, "usage_metadata", None)
+            total = getattr(usage, "total_token_count", 0) or record["Prompt Tokens"] + record["Response Tokens"]
+            limiter.debit_tokens(total - estimated)
+
+        if stream:
+            chunks = limiter.call_stream(lambda: self._model.generate_content(prompt, **kwargs), estimated)
+            return metered_stream(self.model_name, estimated, chunks, started, on_done=charge)
+        response = limiter.call(lambda: self._model.generate_content(prompt, **kwargs), estimated)
+        charge(response, record_call(self.model_name, estimated, response, seconds=time.perf_counter() - started))
+        return response
+
+    def warm_up(self):
+        # count_tokens opens the connection without spending generation quota
+        self._model.count_tokens("ping")
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class StubProvider:
+    """Deterministic offline backend for load tests and local development.
+
+    Responses are derived from a hash of the prompt, so identical prompts
+    always produce identical BRDs and test case tables.
+    """
+
+    name = "stub"
+
+    def __init__(self, model_name=MODEL_NAME, api_key=None):
+        self.model_name = f"stub/{model_name}"
+        self.latency = float(os.getenv("GENAI_STUB_LATENCY", "0"))
+        self.rows = int(os.getenv("GENAI_STUB_ROWS", "8"))
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if not isinstance(prompt, str):
+            prompt = "\n".join(str(part) for part in prompt)
+        estimated = check_prompt(prompt)
+        started = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+        text = self._respond(prompt, generation_config)
+        if stream:
+            return metered_stream(self.model_name, estimated, self._stream(text), started)
+        if self.latency:
+            time.sleep(self.latency)
+        response = StubResponse(text)
+        record_call(self.model_name, estimated, response, text, time.perf_counter() - started)
+        return response
+
+    def _stream(self, text, chunk_size=80):
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield StubResponse(chunk)
+
+    def warm_up(self):
+        pass
+
+    def _respond(self, prompt, generation_config=None):
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        if prompt.lstrip().startswith("Create a detailed Business Requirements Document"):
+            return stub_brd(prompt, rng)
+        if prompt_kind(prompt) == "brd_pack":
+            return stub_packed_brds(prompt)
+        if config_value(generation_config, "response_mime_type") == "application/json":
+            return stub_test_case_json(prompt, rng, self.rows, config_value(generation_config, "response_schema"))
+        return stub_test_case_csv(prompt, rng, self.rows)
+
+
+def config_value(generation_config, key):
+    # GenerationConfig may be a dict, a dataclass or a proto-like object
+    if generation_config is None:
+        return None
+    if isinstance(generation_config, dict):
+        return generation_config.get(key)
+    return getattr(generation_config, key, None)
+
+
+class ReplayProvider:
+    """Replays recorded responses instead of calling a model (see pipeline_bench.py).
+
+    Recordings are {"kind", "prompt_sha256", "response"} entries, where kind is
+    "brd" or "test_cases". A prompt is answered with the recording of the
+    same hash; a prompt that was not recorded falls back to the first
+    recording of its kind and is counted in `drift`.
+    """
+
+    name = "replay"
+
+    def __init__(self, model_name=MODEL_NAME, api_key=None, recordings=None):
+        self.model_name = f"replay/{model_name}"
+        self.calls = 0
+        self.drift = 0
+        self._lock = threading.Lock()
+        if recordings is None:
+            path = os.getenv("GENAI_REPLAY_FILE", "bench_recordings.json")
+            with open(path, encoding="utf-8") as f:
+                # A file of several use cases replays all of them
+                recordings = [entry for entries in json.load(f)["use_cases"].values() for entry in entries]
+        self.load(recordings)
+
+    def load(self, recordings):
+        with self._lock:
+            self._by_hash = {entry["prompt_sha256"]: entry["response"] for entry in recordings}
+            self._by_kind = {}
+            for entry in recordings:
+                self._by_kind.setdefault(entry["kind"], entry["response"])
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if not isinstance(prompt, str):
+            prompt = "\n".join(str(part) for part in prompt)
+        estimated = check_prompt(prompt)
+        started = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+            text = self._by_hash.get(prompt_sha256(prompt))
+            if text is None:
+                text = self._by_kind.get(prompt_kind(prompt))
+                if text is None:
+                    raise KeyError(f"no recorded {prompt_kind(prompt)} response to replay")
+                self.drift += 1
+        if stream:
+            chunks = (StubResponse(text[i:i + 80]) for i in range(0, len(text), 80))
+            return metered_stream(self.model_name, estimated, chunks, started)
+        response = StubResponse(text)
+        record_call(self.model_name, estimated, response, text, time.perf_counter() - started)
+        return response
+
+    def warm_up(self):
+        pass
+
+
+def prompt_sha256(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def prompt_kind(prompt):
+    start = prompt.lstrip()
+    if start.startswith("Create separate detailed Business Requirements Documents"):
+        return "brd_pack"
+    return "brd" if start.startswith(("Create a detailed Business Requirements Document", "Revise the Business Requirements Document")) \
+        else "test_cases"
+
+
+def stub_brd(prompt, rng):
+    usecase = prompt.split("use case:", 1)[-1].strip() or "Generic PolicyCenter change"
+    date = re.search(r"today's date \(([^)]*)\)", prompt)
+    requirements = "\n".join(
+        f"- FR-{i}: The system shall support step {i} of the use case ({rng.choice(['validation', 'rating', 'quoting', 'issuance', 'underwriting'])})."
+        for i in range(1, 6)
+    )
+    # Revision history and sign-off blocks, like the boilerplate real BRDs come back with
+    return (
+        "# Business Requirements Document\n"
+        f"Date: {date.group(1) if date else ''}\n\n"
+        "## Revision History\n| Version | Date | Author | Description |\n|---|---|---|---|\n"
+        f"| 1.0 | {date.group(1) if date else ''} | Business Analyst | Initial draft |\n\n"
+        f"## 1. Introduction\n{usecase}\n\n"
+        "## 2. Scope\nGuidewire PolicyCenter Commercial Auto line of business.\n\n"
+        f"## 3. Functional Requirements\n{requirements}\n\n"
+        "## 4. Non-Functional Requirements\n- Quotes must be returned within 5 seconds.\n\n"
+        "## 5. Approvals\n| Name | Role | Signature | Date |\n|---|---|---|---|\n"
+        "| | Product Owner | | |\n| | QA Lead | | |\n"
+    )
+
+
+def stub_packed_brds(prompt):
+    # Each BRD is what the single-use-case prompt would get, wrapped in the echoed markers
+    date = re.search(r"today's date \(([^)]*)\)", prompt)
+    brds = []
+    for case_id, usecase in re.findall(r"<<<USE CASE (UC-\d+)>>>\n(.*?)\n<<<END USE CASE \1>>>", prompt, re.DOTALL):
+        single = f"today's date ({date.group(1) if date else ''}) use case:\n\n{usecase}"
+        rng = random.Random(hashlib.sha256(usecase.encode("utf-8")).hexdigest())
+        brds.append(f"<<<BRD {case_id}>>>\n{stub_brd(single, rng)}<<<END BRD {case_id}>>>")
+    return "\n\n".join(brds)
+
+
+def stub_test_case_csv(prompt, rng, rows):
+    header = re.search(r'Use the exact headers below:\s*\n\s*"(.+)"', prompt)
+    header_row = re.search(r"start with this header row exactly: *(.+)", prompt)
+    if header:
+        columns = header.group(1).split('","')
+    elif header_row and header_row.group(1).strip():
+        columns = [col.strip() for col in header_row.group(1).split(",")]
+    else:
+        columns = ["Test Case Number", "Title", "Steps"]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(columns)
+    for values in _stub_rows(prompt, rng, rows):
+        writer.writerow([values.get(col, "") for col in columns])
+    return buffer.getvalue()
+
+
+def stub_test_case_json(prompt, rng, rows, schema=None):
+    properties = ((schema or {}).get("items") or {}).get("properties") or {}
+    columns = list(properties) or ["Test Case Number", "Title", "Steps"]
+    return json.dumps([{col: values.get(col, "") for col in columns} for values in _stub_rows(prompt, rng, rows)], indent=1)
+
+
+def _stub_rows(prompt, rng, rows):
+    only = re.search(r"Only cover the (.+?) transaction", prompt)
+    transaction_types = [only.group(1)] if only else ["Submission", "Policy Change", "Cancellation", "Rewrite", "Reinstatement"]
+    for i in range(1, rows + 1):
+        transaction_type = transaction_types[(i - 1) % len(transaction_types)]
+        scenario = rng.choice(["Positive", "Negative"])
+        yield {
+            "Test Case Number": str(i),
+            "Title": f"{scenario} {transaction_type} scenario {rng.randint(1000, 9999)}",
+            "Preconditions": "Agent is logged into PolicyCenter.",
+            "Steps": "\n".join(f"{step}. Perform action {step}" for step in range(1, rng.randint(3, 6))),
+            "Expected Results": "Transaction completes as described in the BRD.",
+            "Transaction Type": transaction_type,
+            "Status": "Draft",
+            "Test Data": f"Account {rng.randint(100000, 999999)}",
+        }
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "stub": StubProvider,
+    "replay": ReplayProvider,
+}
+
+
+def register_provider(name, factory):
+    PROVIDERS[name] = factory
+
+
+# --- Process-wide pool ---
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(provider=None, model_name=None, api_key=None):
+    # Shared by every Streamlit session and rerun in this process
+    key = (provider or PROVIDER, model_name or MODEL_NAME)
+    with _models_lock:
+        if key not in _models:
+            factory = PROVIDERS.get(key[0])
+            if factory is None:
+                raise ValueError(f"Unknown model provider '{key[0]}'. Available: {', '.join(PROVIDERS)}")
+            _models[key] = factory(key[1], api_key=api_key)
+        return _models[key]
+
+
+_warm_up_started = set()
+
+
+def warm_up_in_background(provider=None, model_name=None, api_key=None):
+    # Builds and warms the shared client in the background; the apps call this on login
+    key = (provider or PROVIDER, model_name or MODEL_NAME)
+    with _models_lock:
+        if key in _warm_up_started:
+            return
+        _warm_up_started.add(key)
+
+    def run():
+        try:
+            get_model(*key, api_key=api_key).warm_up()
+        except Exception as e:
+            log_event("model_warm_up_failed", logging.WARNING, provider=key[0], model=key[1], error=str(e)[:500])
+
+    threading.Thread(target=run, name="genai-warm-up", daemon=True).start()
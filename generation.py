@@ -0,0 +1,102 @@
+from response_cache import get_response_cache
+from single_flight import get_single_flight
+from token_usage import record_cached
+
+
+def response_text(response):
+    return (
+        response.candidates[0].content.parts[0].text.strip()
+        if response and response.candidates and response.candidates[0].content.parts
+        else ""
+    )
+
+
+def model_name_of(model):
+    return getattr(model, "model_name", type(model).__name__)
+
+
+# --- Single entry point for model calls ---
+def generate_text(model, prompt, generation_config=None, bypass_cache=False):
+    # bypass_cache skips the lookup but still refreshes the stored response.
+    # Identical requests already in flight (from any session) are joined, not repeated.
+    cache = get_response_cache()
+    key = cache.make_key(model_name_of(model), prompt, generation_config)
+    if not bypass_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record_cached()
+            return cached
+
+    flights = get_single_flight()
+    flight, leader = flights.join(key)
+    if not leader:
+        record_cached()
+        return flight.result()
+    error = RuntimeError("the identical in-flight request was abandoned")
+    try:
+        if generation_config is None:
+            response = model.generate_content(prompt)
+        else:
+            response = model.generate_content(prompt, generation_config=generation_config)
+        text = response_text(response)
+        if text:
+            cache.put(key, text)
+        flight.publish(text)
+        error = None
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        flights.release(key, flight, error)
+    return text
+
+
+def stream_text(model, prompt, generation_config=None, bypass_cache=False):
+    # Yields text chunks as they arrive; a cache hit is yielded as one chunk
+    cache = get_response_cache()
+    key = cache.make_key(model_name_of(model), prompt, generation_config)
+    if not bypass_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record_cached()
+            yield cached
+            return
+
+    flights = get_single_flight()
+    flight, leader = flights.join(key)
+    if not leader:
+        record_cached()
+        # Followers see the leader's chunks as they arrive
+        yield from flight.follow()
+        return
+    error = RuntimeError("the identical in-flight request was abandoned")
+    try:
+        if generation_config is None:
+            response = model.generate_content(prompt, stream=True)
+        else:
+            response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+        parts = []
+        for chunk in response:
+            text = chunk_text(chunk)
+            if text:
+                parts.append(text)
+                flight.publish(text)
+                yield text
+        full_text = "".join(parts).strip()
+        if full_text:
+            cache.put(key, full_text)
+        error = None
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # Also reached when the consumer stops early, so followers are never left waiting
+        flights.release(key, flight, error)
+
+
+def chunk_text(chunk):
+    return (
+        chunk.candidates[0].content.parts[0].text
+        if chunk and chunk.candidates and chunk.candidates[0].content.parts
+        else ""
+    )
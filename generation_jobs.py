@@ -0,0 +1,194 @@
+import pandas as pd
+
+from brd_sections import compact_brd
+from csv_stream import IncrementalCSVParser
+from exports import content_digest
+from generation import generate_text, model_name_of, stream_text
+from history_store import get_history_store
+from metrics import stage
+from near_duplicates import near_duplicate_summary
+from pipeline import (
+    TRANSACTION_TYPES, build_brd_prompt, build_brd_revision_prompt, build_test_case_prompt, fan_out_test_cases,
+    incremental_test_cases, map_reduce_test_cases, parse_issue_summary, parse_test_cases, parse_test_cases_json,
+    prune_test_cases, structured_generation_config, test_case_frame,
+)
+from token_usage import record_saved, token_summary, track_tokens
+
+# Generation modes, as labelled in the apps
+SINGLE_MODE = "Single request"
+PARALLEL_MODE = "Parallel per transaction type"
+CHUNKED_MODE = "Chunked for large BRDs"
+INCREMENTAL_MODE = "Incremental (changed BRD sections only)"
+GENERATION_MODES = [SINGLE_MODE, PARALLEL_MODE, CHUNKED_MODE, INCREMENTAL_MODE]
+
+# Job functions run on a job_queue worker: no Streamlit calls here. Results go to the
+# session store; the report says what the page should show once the job is done.
+
+
+def result_report(df, warnings=(), captions=(), details=(), source=None):
+    return {
+        "warnings": list(warnings),
+        "captions": list(captions),
+        # {"title": expander title, "tables": [list of row dicts, ...]}
+        "details": list(details),
+        "source": source,
+        "digest": content_digest(df),
+    }
+
+
+def brd_job(job, model, session_store, session_id, usecase, today, revise=False, token_budget=None, budget_action=None,
+            bypass_cache=False):
+    prompt = build_brd_prompt(usecase, today)
+    previous_brd = session_store.get(session_id, "brd_text", "")
+    if revise and previous_brd and session_store.get(session_id, "brd_usecase", "") != usecase:
+        # Revise the current BRD so untouched sections (and their test cases) carry over
+        prompt = build_brd_revision_prompt(previous_brd, usecase, today)
+    job.update(0.1, "Generating the BRD")
+    with track_tokens(token_budget, budget_action) as brd_tokens, stage("brd"):
+        brd_text = generate_text(model, prompt, bypass_cache=bypass_cache)
+    job.check()  # a cancelled job leaves the current BRD in place
+    session_store.put(session_id, "brd_text", brd_text)
+    session_store.put(session_id, "brd_usecase", usecase)
+    return {"warnings": list(brd_tokens.warnings)}
+
+
+def _single_request(job, model, prompt_brd, columns, structured, stream, bypass_cache, warnings):
+    prompt = build_test_case_prompt(prompt_brd, columns, structured=structured)
+    job.update(0.1, "Generating test cases")
+    with stage("test_cases", streamed=stream) as stage_info:
+        if stream:
+            # Rows are published as soon as their closing quote and newline arrive
+            parser = IncrementalCSVParser(columns)
+            for chunk in stream_text(model, prompt, bypass_cache=bypass_cache):
+                if parser.feed(chunk):
+                    records = parser.records()
+                    job.update(message=f"Streaming test cases: {len(records)} row(s) so far", partial=records)
+                else:
+                    job.check()
+            parser.close()
+            output_text = parser.text.strip()
+        else:
+            generation_config = structured_generation_config(columns) if structured else None
+            output_text = generate_text(model, prompt, generation_config, bypass_cache=bypass_cache)
+        stage_info["chars"] = len(output_text)
+    job.update(0.85, "Parsing test cases")
+    try:
+        if stream:
+            df = test_case_frame(parser, columns)
+        elif structured:
+            df = parse_test_cases_json(output_text, columns)
+        else:
+            df = parse_test_cases(output_text, columns)
+    except Exception as e:
+        warnings.append(f"Error parsing CSV: {e}")
+        df = pd.DataFrame({"Output": [output_text]})
+    return df, prompt, output_text
+
+
+def build_test_cases(job, model, brd_text, columns, mode=SINGLE_MODE, structured=False, stream=False, prune=True,
+                     compact=True, chunk_token_budget=6000, token_budget=None, budget_action=None, bypass_cache=False,
+                     incremental_state=None):
+    """Generates, parses and prunes test cases for one BRD.
+
+    Returns (df, report, run): the report is what result_report() builds; run
+    holds the prompt and raw output (single request only), the new incremental
+    state and the token tally.
+    """
+    warnings, captions, details = [], [], []
+    prompt = output_text = incremental_state_out = None
+    # Boilerplate is stripped from the copy embedded in prompts; the BRD itself is kept as generated
+    prompt_brd, compaction = compact_brd(brd_text) if compact else (brd_text, None)
+    with track_tokens(token_budget, budget_action) as run_tokens:
+        if mode == PARALLEL_MODE:
+            # One request per transaction type; wall-clock is the slowest single type
+            job.update(0.05, f"Generating test cases for {len(TRANSACTION_TYPES)} transaction types in parallel")
+            df, failures = fan_out_test_cases(model, prompt_brd, columns, bypass_cache=bypass_cache, structured=structured,
+                                              progress=job.step_progress(0.05, 0.85, "Transaction types done"))
+            for transaction_type, error in failures.items():
+                warnings.append(f"No test cases generated for {transaction_type}: {error}")
+        elif mode == INCREMENTAL_MODE:
+            # Only new or changed BRD sections go to the model; the rest reuse the last run's rows
+            job.update(0.05, "Generating test cases for new or changed BRD sections")
+            df, incremental_state_out, section_report = incremental_test_cases(
+                model, prompt_brd, incremental_state, columns,
+                token_budget=chunk_token_budget, bypass_cache=bypass_cache, structured=structured,
+                progress=job.step_progress(0.05, 0.85, "Changed sections done"),
+            )
+            regenerated = sum(1 for entry in section_report if entry["Source"] == "regenerated")
+            reused = sum(1 for entry in section_report if entry["Source"] == "reused")
+            captions.append(f"{regenerated} BRD section(s) regenerated, {reused} reused")
+            details.append({"title": "Section details", "tables": [section_report]})
+        elif mode == CHUNKED_MODE:
+            # Map over BRD chunks in parallel, then merge, dedupe and renumber
+            job.update(0.05, "Generating test cases per BRD chunk")
+            df, chunk_report = map_reduce_test_cases(model, prompt_brd, columns, token_budget=chunk_token_budget,
+                                                     bypass_cache=bypass_cache, structured=structured,
+                                                     progress=job.step_progress(0.05, 0.85, "BRD chunks done"))
+            captions.append(f"BRD split into {len(chunk_report)} chunk(s)")
+            details.append({"title": "Chunk details", "tables": [chunk_report]})
+        else:
+            df, prompt, output_text = _single_request(job, model, prompt_brd, columns, structured, stream, bypass_cache,
+                                                      warnings)
+        if compaction:
+            # Every prompt that embedded the whole BRD would have carried the boilerplate
+            record_saved(compaction["Tokens Saved"] * (len(TRANSACTION_TYPES) if mode == PARALLEL_MODE else 1))
+
+    # Near-duplicate pruning within each transaction type
+    if prune and is_parsed(df):
+        job.update(0.9, "Pruning near-duplicate test cases")
+        df = prune_test_cases(df)
+
+    # Incremental runs show where each row came from, but exports leave it out
+    row_source = df.pop("Source") if "Source" in df.columns else None
+    if row_source is not None:
+        captions.append(f"{int((row_source == 'reused').sum())} row(s) reused, {int((row_source == 'regenerated').sum())} regenerated")
+        row_source = row_source.tolist()
+    parse_note = parse_issue_summary(df)
+    if parse_note:
+        captions.append(parse_note)
+        details.append({"title": "Parsing details", "tables": [df.attrs["parse_issues"]]})
+    prune_note = near_duplicate_summary(df)
+    if prune_note:
+        captions.append(prune_note)
+        details.append({"title": "Pruned near-duplicates", "tables": [df.attrs["near_duplicates"]]})
+    # Token usage of this run, per call and after compaction
+    warnings.extend(run_tokens.warnings)
+    token_note = token_summary(run_tokens)
+    if token_note:
+        captions.append(token_note)
+        details.append({"title": "Token usage", "tables": ([[compaction]] if compaction else []) + [list(run_tokens.records)]})
+    run = {"prompt": prompt, "output_text": output_text, "incremental_state": incremental_state_out, "tokens": run_tokens}
+    return df, result_report(df, warnings, captions, details, row_source), run
+
+
+def is_parsed(df):
+    # False for the single "Output" column kept when the model output could not be parsed
+    return list(df.columns) != ["Output"]
+
+
+def record_history(report, usecase, df, brd_text, run, model, mode, app=None):
+    # Every run is kept in the local history so it can be searched and reused later
+    if not is_parsed(df):
+        return
+    try:
+        with stage("history", rows=len(df)):
+            get_history_store().record_run(
+                usecase, df.to_dict("records"), list(df.columns), brd=brd_text, prompt=run["prompt"],
+                raw_output=run["output_text"], app=app, model=model_name_of(model), mode=mode,
+            )
+    except Exception as e:
+        report["warnings"].append(f"Could not save this run to history: {e}")
+
+
+def test_case_job(job, model, session_store, session_id, usecase, brd_text, columns, mode=SINGLE_MODE, app=None, **options):
+    previous_state = session_store.get(session_id, "incremental_state") if mode == INCREMENTAL_MODE else None
+    df, report, run = build_test_cases(job, model, brd_text, columns, mode, incremental_state=previous_state, **options)
+    job.check()  # a cancelled job leaves the previous results in place
+    if run["incremental_state"] is not None:
+        session_store.put(session_id, "incremental_state", run["incremental_state"])
+    record_history(report, usecase, df, brd_text, run, model, mode, app)
+
+    job.update(0.95, "Saving results")
+    session_store.put(session_id, "test_case_result", df)
+    session_store.put(session_id, "test_case_report", report)
+    return {"rows": len(df)}
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+# --- History Settings ---
+HISTORY_DB = os.getenv("HISTORY_DB", "generation_history.sqlite3")
+HISTORY_PAGE_SIZE = 20
+
+# Template columns that feed the indexed fields, matched case-insensitively
+TITLE_COLUMNS = ("title", "test case title", "scenario", "section")
+STEPS_COLUMNS = ("steps", "test steps", "details")
+TRANSACTION_COLUMNS = ("transaction type", "transaction")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    app TEXT,
+    model TEXT,
+    mode TEXT,
+    use_case_hash TEXT NOT NULL,
+    use_case TEXT,
+    brd TEXT,
+    prompt TEXT,
+    raw_output TEXT,
+    columns TEXT,
+    row_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_use_case_hash ON runs (use_case_hash, created_at);
+
+CREATE TABLE IF NOT EXISTS test_cases (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    row_no INTEGER NOT NULL,
+    transaction_type TEXT,
+    title TEXT,
+    steps TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS test_cases_run ON test_cases (run_id, row_no);
+CREATE INDEX IF NOT EXISTS test_cases_transaction_type ON test_cases (transaction_type, run_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS test_cases_fts USING fts5 (
+    title, steps, content='test_cases', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS test_cases_fts_insert AFTER INSERT ON test_cases BEGIN
+    INSERT INTO test_cases_fts (rowid, title, steps) VALUES (new.id, new.title, new.steps);
+END;
+CREATE TRIGGER IF NOT EXISTS test_cases_fts_delete AFTER DELETE ON test_cases BEGIN
+    INSERT INTO test_cases_fts (test_cases_fts, rowid, title, steps) VALUES ('delete', old.id, old.title, old.steps);
+END;
+"""
+
+
+def use_case_hash(use_case):
+    return hashlib.sha256(" ".join((use_case or "").split()).encode("utf-8")).hexdigest()
+
+
+def _pick(columns, candidates):
+    names = {" ".join(str(col).replace("*", "").split()).lower(): col for col in columns}
+    return next((names[name] for name in candidates if name in names), None)
+
+
+def _fts_query(text):
+    # Each word is quoted so user input cannot break the FTS5 query syntax
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+class HistoryStore:
+    """Persistent history of generation runs in a local SQLite database.
+
+    Each run keeps the use case, BRD, prompt, raw model output and the parsed
+    rows. Rows are indexed by transaction type and full-text searchable over
+    titles and steps (FTS5, falling back to LIKE where it is unavailable).
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._ready = False
+        self.fts = True
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        with self._schema_lock:
+            if not self._ready:
+                conn.executescript(SCHEMA)
+                try:
+                    conn.executescript(FTS_SCHEMA)
+                except sqlite3.OperationalError:
+                    self.fts = False
+                self._ready = True
+        return conn
+
+    def record_run(self, use_case, rows=None, columns=None, brd=None, prompt=None, raw_output=None,
+                   app=None, model=None, mode=None):
+        """Stores one run; rows are dicts keyed by column name. Returns the run id."""
+        rows = list(rows or [])
+        columns = list(columns or (rows[0].keys() if rows else []))
+        title_col = _pick(columns, TITLE_COLUMNS)
+        steps_col = _pick(columns, STEPS_COLUMNS)
+        transaction_col = _pick(columns, TRANSACTION_COLUMNS)
+        conn = self._connect()
+        with conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (created_at, app, model, mode, use_case_hash, use_case, brd, prompt, raw_output, columns, row_count)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), app, model, mode, use_case_hash(use_case), use_case,
+                 brd, prompt, raw_output, json.dumps(columns), len(rows)),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO test_cases (run_id, row_no, transaction_type, title, steps, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (run_id, row_no, str(row.get(transaction_col) or "") if transaction_col else None,
+                     str(row.get(title_col) or "") if title_col else None,
+                     str(row.get(steps_col) or "") if steps_col else None,
+                     json.dumps(row, ensure_ascii=False, default=str))
+                    for row_no, row in enumerate(rows, start=1)
+                ),
+            )
+        return run_id
+
+    def _run_filter(self, search=None, transaction_type=None, use_case=None):
+        clauses, params = [], []
+        if use_case:
+            clauses.append("runs.use_case_hash = ?")
+            params.append(use_case_hash(use_case))
+        if transaction_type:
+            clauses.append("runs.id IN (SELECT run_id FROM test_cases WHERE transaction_type = ?)")
+            params.append(transaction_type)
+        if search and search.strip():
+            if self.fts:
+                clauses.append("runs.id IN (SELECT test_cases.run_id FROM test_cases_fts"
+                               " JOIN test_cases ON test_cases.id = test_cases_fts.rowid WHERE test_cases_fts MATCH ?)")
+                params.append(_fts_query(search))
+            else:
+                clauses.append("runs.id IN (SELECT run_id FROM test_cases WHERE title LIKE ? OR steps LIKE ?)")
+                params += [f"%{search.strip()}%"] * 2
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count_runs(self, search=None, transaction_type=None, use_case=None):
+        where, params = self._run_filter(search, transaction_type, use_case)
+        return self._connect().execute(f"SELECT COUNT(*) FROM runs{where}", params).fetchone()[0]
+
+    def page_runs(self, page=1, page_size=HISTORY_PAGE_SIZE, search=None, transaction_type=None, use_case=None):
+        """One page of runs, newest first, without the large text columns."""
+        where, params = self._run_filter(search, transaction_type, use_case)
+        rows = self._connect().execute(
+            "SELECT id, created_at, app, model, mode, row_count, substr(use_case, 1, 120) AS use_case"
+            f" FROM runs{where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, (max(page, 1) - 1) * page_size],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_run(self, run_id):
+        row = self._connect().execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["columns"] = json.loads(run["columns"] or "[]")
+        return run
+
+    def run_rows(self, run_id, transaction_type=None):
+        query = "SELECT data FROM test_cases WHERE run_id = ?"
+        params = [run_id]
+        if transaction_type:
+            query += " AND transaction_type = ?"
+            params.append(transaction_type)
+        return [json.loads(row[0]) for row in self._connect().execute(query + " ORDER BY row_no", params)]
+
+    def latest_run_for(self, use_case):
+        # Most recent run for the same use case (whitespace-insensitive), so it can be reused
+        row = self._connect().execute(
+            "SELECT id FROM runs WHERE use_case_hash = ? ORDER BY created_at DESC, id DESC LIMIT 1",
+            (use_case_hash(use_case),),
+        ).fetchone()
+        return row[0] if row else None
+
+    def transaction_types(self):
+        rows = self._connect().execute(
+            "SELECT DISTINCT transaction_type FROM test_cases WHERE transaction_type <> '' ORDER BY transaction_type"
+        )
+        return [row[0] for row in rows]
+
+    def delete_run(self, run_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+
+_default_history = None
+_default_history_lock = threading.Lock()
+
+
+def get_history_store():
+    global _default_history
+    with _default_history_lock:
+        if _default_history is None:
+            _default_history = HistoryStore()
+        return _default_history
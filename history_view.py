@@ -0,0 +1,37 @@
+import pandas as pd
+import streamlit as st
+
+from history_store import HISTORY_PAGE_SIZE
+
+
+def show_history(store, key="history"):
+    """Searchable, paginated list of past runs; only the visible page is queried.
+
+    Returns the selected run (with its rows) when the user chooses to reuse it,
+    otherwise None.
+    """
+    col_search, col_type = st.columns([2, 1])
+    search = col_search.text_input("Search test case titles and steps", key=f"{key}_search")
+    transaction_type = col_type.selectbox("Transaction type", [""] + store.transaction_types(), key=f"{key}_type",
+                                          format_func=lambda value: value or "All")
+    total = store.count_runs(search, transaction_type)
+    if not total:
+        st.caption("No matching runs yet.")
+        return None
+
+    pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    # Keyed by the filters so a new search starts again from page 1
+    page = st.number_input(f"Page (of {pages}, {total} runs)", min_value=1, max_value=pages, value=1, step=1,
+                           key=f"{key}_page_{search}_{transaction_type}")
+    runs = store.page_runs(int(page), search=search, transaction_type=transaction_type)
+    st.dataframe(pd.DataFrame(runs), use_container_width=True, hide_index=True)
+
+    labels = {run["id"]: f"#{run['id']} · {run['created_at']} · {run['row_count']} rows" for run in runs}
+    run_id = st.selectbox("Open run", list(labels), format_func=labels.get, key=f"{key}_run")
+    rows = store.run_rows(run_id, transaction_type or None)
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    if st.button("♻️ Reuse this run", key=f"{key}_reuse"):
+        run = store.get_run(run_id)
+        run["rows"] = store.run_rows(run_id)
+        return run
+    return None
@@ -0,0 +1,208 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import log_event, registry
+
+# --- Job Queue Settings ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "64"))  # unfinished jobs across all sessions
+JOB_MAX_PER_SESSION = int(os.getenv("JOB_MAX_PER_SESSION", "2"))
+JOB_RETENTION_MINUTES = float(os.getenv("JOB_RETENTION_MINUTES", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    """A unit of background work and the state the UI polls.
+
+    The job function receives the Job as its first argument and reports
+    through update(); update() and check() raise JobCancelled once the job
+    has been cancelled, so work stops at the next progress point.
+    """
+
+    def __init__(self, owner, kind, label=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.kind = kind
+        self.label = label or kind
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting for a worker"
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def cancel(self):
+        # Takes effect at the job's next update() or check()
+        self._cancel.set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def update(self, progress=None, message=None, partial=None):
+        self.check()
+        if progress is not None:
+            self.progress = min(1.0, max(0.0, progress))
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    def step_progress(self, start, end, message):
+        # Callback for pipeline stages that report (done, total)
+        return lambda done, total: self.update(start + (end - start) * done / max(total, 1), f"{message} ({done}/{total})")
+
+
+class JobQueue:
+    """Bounded worker pool for generation jobs, shared by every session in the process.
+
+    At most `max_jobs` jobs are unfinished at once and each session may have
+    `per_session` of them; submit() raises QueueFull beyond that. Finished
+    jobs are kept for `retention_minutes` so the UI can pick up the outcome.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_jobs=JOB_QUEUE_MAX, per_session=JOB_MAX_PER_SESSION,
+                 retention_minutes=JOB_RETENTION_MINUTES):
+        self.max_jobs = max_jobs
+        self.per_session = per_session
+        self.retention_seconds = retention_minutes * 60
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="genai-job")
+        self._jobs = OrderedDict()
+        self._finished = deque()  # finished jobs in finish order, so expiry only looks at the due ones
+        self._lock = threading.Lock()
+        self.workers = max(1, workers)
+
+    def _expire(self, now):
+        while self._finished and now - self._finished[0].finished > self.retention_seconds:
+            self._jobs.pop(self._finished.popleft().id, None)
+
+    def submit(self, owner, kind, fn, *args, label=None, **kwargs):
+        with self._lock:
+            self._expire(time.time())
+            unfinished = [job for job in self._jobs.values() if not job.done]
+            if len(unfinished) >= self.max_jobs:
+                raise QueueFull(f"{len(unfinished)} generation jobs are already waiting or running; please try again shortly")
+            if sum(1 for job in unfinished if job.owner == owner) >= self.per_session:
+                raise QueueFull(f"you already have {self.per_session} generation job(s) running; wait for one to finish or cancel it")
+            job = Job(owner, kind, label)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        registry.inc("genai_jobs_total", kind=kind, status="submitted")
+        log_event("job_submitted", job=job.id, kind=kind, owner=owner)
+        return job
+
+    def _finish(self, job, status, error=None):
+        with self._lock:
+            finished = self._mark_finished(job, status, error)
+        if finished:
+            self._record_finish(job, status, error)
+
+    def _mark_finished(self, job, status, error=None):
+        # Caller holds self._lock
+        if job.done:
+            return False
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        if status == CANCELLED:
+            job.message = "Cancelled"
+        self._finished.append(job)
+        return True
+
+    def _record_finish(self, job, status, error=None):
+        registry.inc("genai_jobs_total", kind=job.kind, status=status)
+        if job.started:
+            registry.observe("genai_job_seconds", job.finished - job.started, kind=job.kind)
+        log_event("job_finished", logging.INFO if status != FAILED else logging.WARNING, job=job.id, kind=job.kind,
+                  status=status, seconds=round(job.finished - (job.started or job.created), 3), error=error)
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if job.done:
+                return  # cancelled while queued
+            job.status = RUNNING
+            job.started = time.time()
+            job.message = "Started"
+        registry.observe("genai_job_queue_seconds", job.started - job.created, kind=job.kind)
+        try:
+            result = fn(job, *args, **kwargs)
+            job.check()
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            self._finish(job, FAILED, str(e))
+        else:
+            job.result = result
+            job.progress = 1.0
+            job.message = "Done"
+            self._finish(job, SUCCEEDED)
+
+    def get(self, job_id, owner=None):
+        with self._lock:
+            self._expire(time.time())
+            job = self._jobs.get(job_id)
+        # Sessions only ever see their own jobs
+        return job if job is not None and (owner is None or job.owner == owner) else None
+
+    def cancel(self, job_id, owner=None):
+        job = self.get(job_id, owner)
+        if job is None:
+            return False
+        with self._lock:
+            if job.done:
+                return False
+            job.cancel()
+            job.message = "Cancelling after the current step"
+            # Same lock as _run's QUEUED -> RUNNING, so a job that has started is never reported cancelled
+            finished = job.status == QUEUED and self._mark_finished(job, CANCELLED)
+        if finished:
+            self._record_finish(job, CANCELLED)
+        return True
+
+    def stats(self):
+        with self._lock:
+            # Also expires here, so finished jobs do not pile up on a server that stops receiving submits
+            self._expire(time.time())
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "finished": sum(1 for status in statuses if status in FINISHED),
+        }
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
@@ -0,0 +1,51 @@
+import pandas as pd
+import streamlit as st
+
+from job_queue import CANCELLED, FAILED, JOB_POLL_SECONDS
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job(queue, job_id, owner):
+    """Progress bar and Cancel button for a running job.
+
+    Only this fragment is re-run while polling; once the job has finished the
+    whole page reruns so the result shows up. Call it only for unfinished jobs.
+    """
+    job = queue.get(job_id, owner)
+    if job is None:
+        return
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"{job.label}: {job.message}")
+    if job.partial:
+        # Rows streamed so far
+        st.dataframe(pd.DataFrame(job.partial), use_container_width=True, hide_index=True)
+    if st.button("✖️ Cancel", key=f"cancel_{job.id}"):
+        queue.cancel(job.id, owner)
+        st.rerun()
+
+
+def show_job_outcome(job, what):
+    if job.status == FAILED:
+        # Rate-limit and transient errors were already retried with backoff
+        st.error(f"{what} failed: {job.error}")
+    elif job.status == CANCELLED:
+        st.info(f"{what} was cancelled.")
+    elif job.result:
+        for warning in job.result.get("warnings", []):
+            st.warning(warning)
+
+
+def show_test_case_report(df, report):
+    if report.get("source"):
+        # Incremental runs show where each row came from
+        df = df.assign(Source=report["source"])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    for warning in report["warnings"]:
+        st.warning(warning)
+    for caption in report["captions"]:
+        st.caption(caption)
+    for detail in report["details"]:
+        with st.expander(detail["title"]):
+            for rows in detail["tables"]:
+                st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
@@ -1,9 +1,11 @@
 import os
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as gen_ai
+from genai_client import get_model, warm_up_in_background
 import pandas as pd
-from io import BytesIO
+from exports import xlsx_bytes
+from history_store import get_history_store
+from history_view import show_history
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +24,11 @@ st.set_page_config(
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
+
+def use_case_workbook(df):
+    return xlsx_bytes(df, sheet_name="Use Case & Test Cases", split_by=None, widths=[40, 80])
+
+
 if not st.session_state.logged_in:
     st.title("Login to Access Test Case Generator")
     with st.form("login_form"):
@@ -32,6 +39,8 @@ if not st.session_state.logged_in:
     if login_button:
         if username == VALID_USERNAME and password == VALID_PASSWORD:
             st.session_state.logged_in = True
+            # The model client warms up in the background while the main page loads
+            warm_up_in_background(api_key=GOOGLE_API_KEY)
             st.success("Welcome to the Test Case Generator!")
             st.rerun()
         else:
@@ -48,15 +57,11 @@ if st.session_state.logged_in:
         st.session_state.current_model = selected_model
 
     if st.session_state.current_model != selected_model:
-        st.session_state.test_case_history = []
         st.session_state.current_model = selected_model
-        st.info(f"You have switched to {selected_model}. Test case generation history has been cleared.")
+        st.info(f"You have switched to {selected_model}. Earlier runs stay in the history below, labelled by model.")
         
-    def configure_google_model():
-        gen_ai.configure(api_key=GOOGLE_API_KEY)
-        return gen_ai.GenerativeModel("gemini-2.0-flash-exp")
-
-    model = configure_google_model()
+    # One shared client per process instead of reconfiguring on every rerun
+    model = get_model(api_key=GOOGLE_API_KEY)
 
     st.sidebar.header("Input Details")
 
@@ -117,21 +122,31 @@ if st.session_state.logged_in:
             st.write("Generated Use Case & Test Cases")
             st.dataframe(df)
 
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                df.to_excel(writer, sheet_name="Use Case & Test Cases", index=False)
-                worksheet = writer.sheets["Use Case & Test Cases"]
-                worksheet.set_column(0, 0, 40)
-                worksheet.set_column(1, 1, 80)
-
-            output.seek(0)
+            # Kept in the local SQLite history so the run survives a refresh
+            try:
+                get_history_store().record_run(
+                    use_case_text, df.to_dict("records"), list(df.columns), prompt=prompt_test_cases,
+                    raw_output=generated_text, app="use_case_document", model=selected_model,
+                )
+            except Exception as e:
+                st.warning(f"Could not save this run to history: {e}")
 
             st.download_button(
                 label= "Download Use Case & Test Case",
-                data=output,
+                data=use_case_workbook(df),
                 file_name="Use_cases.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
         else:
-            st.warning("Please uplaoda a file or enter use case details manually.")
\ No newline at end of file
+            st.warning("Please uplaoda a file or enter use case details manually.")
+
+    st.subheader("History")
+    reused_run = show_history(get_history_store(), key="use_case_history")
+    if reused_run:
+        st.download_button(
+            label="Download this run",
+            data=use_case_workbook(pd.DataFrame(reused_run["rows"], columns=reused_run["columns"] or None)),
+            file_name=f"Use_cases_run_{reused_run['id']}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
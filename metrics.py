@@ -0,0 +1,240 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Metrics Settings ---
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 leaves the endpoint off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (64, 256, 1024, 4096, 8192, 16384, 32768, 65536, 131072, 262144)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# name -> (type, help)
+METRICS = {
+    "genai_stage_seconds": ("histogram", "Wall-clock seconds per pipeline stage"),
+    "genai_stage_errors_total": ("counter", "Pipeline stages that raised an error"),
+    "genai_model_call_seconds": ("histogram", "Seconds per model call, including rate limiter queueing and retries"),
+    "genai_prompt_tokens": ("histogram", "Prompt tokens per model call"),
+    "genai_tokens_total": ("counter", "Model tokens by kind (prompt or response)"),
+    "genai_cached_calls_total": ("counter", "Generation requests served from the cache or a joined in-flight call"),
+    "genai_prompts_over_budget_total": ("counter", "Prompts over the token budget, by action taken"),
+    "genai_parsed_rows_total": ("counter", "Test case rows parsed from model output"),
+    "genai_parse_issues_total": ("counter", "Rows the parser repaired or lines it dropped"),
+    "genai_artifact_bytes": ("histogram", "Size of rendered export artifacts"),
+    "genai_jobs_total": ("counter", "Background generation jobs by kind and status (submitted or final)"),
+    "genai_job_queue_seconds": ("histogram", "Seconds a job waited for a worker"),
+    "genai_job_seconds": ("histogram", "Seconds a job ran on a worker"),
+    "genai_packed_brds_total": ("counter", "Use cases in packed BRD requests, by outcome (split or fallback)"),
+    "genai_api_requests_total": ("counter", "HTTP API requests by endpoint and status code"),
+    "genai_api_request_seconds": ("histogram", "HTTP API request latency, queueing included"),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In-process counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> _Histogram
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, help_text = METRICS.get(name, ("untyped", ""))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def stage_summary(self):
+        # Count and mean seconds per stage, for on-screen display
+        with self._lock:
+            summary = {}
+            for (name, labels), histogram in self._histograms.items():
+                if name != "genai_stage_seconds":
+                    continue
+                stage_name = dict(labels)["stage"]
+                entry = summary.setdefault(stage_name, {"Stage": stage_name, "Runs": 0, "Seconds": 0.0})
+                entry["Runs"] += histogram.count
+                entry["Seconds"] += histogram.sum
+        for entry in summary.values():
+            entry["Mean Seconds"] = round(entry.pop("Seconds") / entry["Runs"], 3) if entry["Runs"] else 0.0
+        return list(summary.values())
+
+
+registry = MetricsRegistry()
+
+
+# --- Structured logs ---
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        return f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname} {record.getMessage()} {fields}".rstrip()
+
+
+logger = logging.getLogger("genai")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL.upper())
+    logger.propagate = False
+
+
+def log_event(event, level=logging.INFO, **fields):
+    logger.log(level, event, extra={"fields": fields})
+
+
+@contextmanager
+def stage(name, **fields):
+    """Times a pipeline stage into genai_stage_seconds and logs it as one structured line.
+
+    The yielded dict is logged with the stage, so callers can add fields such
+    as rows or bytes.
+    """
+    info = dict(fields)
+    status = "error"
+    started = time.perf_counter()
+    try:
+        yield info
+        status = "ok"
+    except Exception as e:
+        info["error"] = str(e)[:500]
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe("genai_stage_seconds", seconds, stage=name)
+        if status != "ok":
+            registry.inc("genai_stage_errors_total", stage=name)
+        log_event("stage", logging.INFO if status == "ok" else logging.WARNING, stage=name, status=status,
+                  seconds=round(seconds, 4), **info)
+
+
+# --- Prometheus endpoint ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_attempted = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serves /metrics from a daemon thread, once per process. Returns the server, or None when disabled."""
+    global _server, _server_attempted
+    with _server_lock:
+        # Streamlit reruns call this on every interaction; only the first call binds
+        if not _server_attempted and port:
+            _server_attempted = True
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                # Another app process on this host already owns the port
+                log_event("metrics_server_unavailable", logging.WARNING, host=host, port=port, error=str(e))
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            log_event("metrics_server_started", host=host, port=_server.server_address[1])
+        return _server
+
+
+def write_metrics_file(path):
+    # Prometheus textfile-collector format, for batch runs that exit before a scrape
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
@@ -0,0 +1,70 @@
+import argparse
+import random
+import sys
+import time
+
+import pandas as pd
+
+from near_duplicates import NEAR_DUPLICATE_THRESHOLD, find_near_duplicates
+
+# Deliberately small, QA-style vocabulary: unrelated rows collide in LSH buckets all the time
+WORDS = (
+    "verify policy account agent underwriting coverage vehicle driver premium quote bind issue rating endorsement "
+    "cancellation reinstatement rewrite submission liability collision comprehensive deductible limit effective date"
+).split()
+TRANSACTION_TYPES = ["Submission", "Policy Change", "Cancellation", "Rewrite", "Reinstatement"]
+
+
+def synthetic_suite(rows, copy_every=2, seed=3):
+    """(df, copies): every copy_every-th row repeats the row before it, with only case and punctuation changed."""
+    rng = random.Random(seed)
+
+    def words(low, high):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+    records, copies = [], []
+    while len(records) < rows:
+        if len(records) % copy_every == copy_every - 1:
+            original = records[-1]
+            copies.append(len(records))
+            records.append({
+                "Transaction Type": original["Transaction Type"],
+                "Title": original["Title"].upper() + ".",
+                "Steps": original["Steps"].replace(". ", ") "),
+            })
+        else:
+            records.append({
+                "Transaction Type": rng.choice(TRANSACTION_TYPES),
+                "Title": f"Verify {words(4, 8)}",
+                "Steps": "\n".join(f"{s}. {words(5, 12)}" for s in range(1, rng.randint(3, 7))),
+            })
+    return pd.DataFrame(records), copies
+
+
+def check(rows, copy_every, threshold):
+    df, copies = synthetic_suite(rows, copy_every)
+    started = time.perf_counter()
+    duplicates = find_near_duplicates(df, threshold=threshold)
+    elapsed = time.perf_counter() - started
+    found = len(set(copies) & set(duplicates))
+    print(f"  {rows:>7} rows  {len(copies):>6} copies  {found:>6} pruned  {len(duplicates) - found:>5} other rows pruned  "
+          f"{elapsed:6.2f} s  {rows / elapsed:9.0f} rows/s")
+    return found == len(copies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that near-duplicate pruning finds every copy, at scale.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[300, 3000, 30000, 100000])
+    parser.add_argument("--copy-every", type=int, default=2, help="Every Nth row is a copy of the one before it")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    print(f"Exact copies (modulo case and punctuation), one every {args.copy_every} rows")
+    missed = [rows for rows in args.rows if not check(rows, args.copy_every, args.threshold)]
+    for rows in missed:
+        print(f"FAIL: copies missed at {rows} rows")
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Near-Duplicate Settings ---
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+SHINGLE_CHARS = 5  # at most 8, a shingle is packed into one uint64
+NUM_BINS = 64  # signature length; one-permutation hashing spreads each row's shingles over these bins
+BANDS = 16
+BUCKET_COMPARISONS = 8  # distinct signatures each one is compared with inside an LSH bucket
+BLOCK_ROWS = 20000  # rows hashed (or candidate pairs confirmed) per numpy block, bounds the temporaries
+
+_BIN_BITS = 6
+_VALUE_MASK = np.uint64((1 << (64 - _BIN_BITS)) - 1)
+_EMPTY = np.iinfo(np.uint64).max
+_rng = np.random.default_rng(1)
+_MIX = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_BAND_MIX = _rng.integers(1, 2 ** 63, NUM_BINS // BANDS, dtype=np.uint64) | np.uint64(1)
+_FULL_MIX = _rng.integers(1, 2 ** 63, NUM_BINS, dtype=np.uint64) | np.uint64(1)
+# Lowercase ASCII letters and digits, turn other ASCII into spaces; non-ASCII bytes pass through
+_NORMALIZE = bytes(
+    ord(chr(b).lower()) if chr(b).isalnum() or b >= 128 else ord(" ") for b in range(256)
+)
+
+
+def _signatures(texts):
+    """(len(texts), NUM_BINS) MinHash signatures over character shingles of the texts.
+
+    Case, punctuation and spacing are normalized away first. Uses
+    one-permutation hashing: every shingle is hashed once, its top bits pick a
+    bin and each bin keeps its minimum. Empty bins borrow the next non-empty
+    bin (rotation densification). Rows without a full shingle stay at _EMPTY.
+    """
+    n = len(texts)
+    signatures = np.full(n * NUM_BINS, _EMPTY, dtype=np.uint64)
+    window_mask = np.uint64((1 << (8 * SHINGLE_CHARS)) - 1)
+    for first in range(0, n, BLOCK_ROWS):
+        # One newline-separated buffer per block; a newline never appears inside a normalized text
+        block = b"\n".join(text.encode("utf-8").translate(_NORMALIZE) for text in texts[first:first + BLOCK_ROWS])
+        data = np.frombuffer(block, dtype=np.uint8)
+        # Collapse runs of spaces
+        data = data[np.r_[True, (data[1:] != ord(" ")) | (data[:-1] != ord(" "))]]
+        block = data.tobytes() + b"\n" * 8
+        data = np.frombuffer(block, dtype=np.uint8)
+        count = len(data) - 8
+        # Every byte offset read as a little-endian uint64; its low bytes are the shingle itself
+        windows = np.ndarray((count,), dtype="<u8", buffer=block, strides=(1,)) & window_mask
+        newlines = np.cumsum(data == ord("\n"))
+        whole = (newlines[SHINGLE_CHARS - 1:count + SHINGLE_CHARS - 1] == newlines[:count]) & (data[:count] != ord("\n"))
+        hashed = windows[whole]
+        shingle_rows = first + newlines[:count][whole]
+        # splitmix-style finalizer, so the top bits pick a well-spread bin
+        hashed ^= hashed >> np.uint64(31)
+        hashed *= _MIX
+        hashed ^= hashed >> np.uint64(29)
+        hashed *= _MIX2
+        hashed ^= hashed >> np.uint64(32)
+        bins = (hashed >> np.uint64(64 - _BIN_BITS)).astype(np.int64)
+        np.minimum.at(signatures, shingle_rows * NUM_BINS + bins, hashed & _VALUE_MASK)
+
+    signatures = signatures.reshape(n, NUM_BINS)
+    empty = signatures == _EMPTY
+    partial = empty.any(axis=1) & ~empty.all(axis=1)
+    if partial.any():
+        block = signatures[partial]
+        doubled = np.concatenate([block, block], axis=1)
+        positions = np.where(doubled == _EMPTY, 2 * NUM_BINS, np.arange(2 * NUM_BINS))
+        source = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :NUM_BINS]
+        distance = (source - np.arange(NUM_BINS)).astype(np.uint64)
+        signatures[partial] = np.take_along_axis(doubled, source, axis=1) + distance * _MIX
+    return signatures
+
+
+def _pair_keys(first, second, n):
+    # Flat int64 key per unordered pair of row positions
+    return np.minimum(first, second).astype(np.int64) * n + np.maximum(first, second)
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        # The lower row index stays the root, so the first occurrence is kept
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def find_near_duplicates(df, columns=("Title", "Steps"), group_by="Transaction Type", threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Maps each near-duplicate row position to (kept row position, estimated similarity).
+
+    Rows are compared on character shingles of `columns` using MinHash with LSH
+    banding, so only rows that share a band are ever compared. Rows in
+    different `group_by` values (e.g. transaction types) are never merged.
+    """
+    columns = [col for col in columns if col in df.columns]
+    if not columns or len(df) < 2:
+        return {}
+    n = len(df)
+    texts = df[columns[0]].fillna("").astype(str)
+    for col in columns[1:]:
+        texts = texts + " " + df[col].fillna("").astype(str)
+    signatures = _signatures(texts.tolist())
+    has_text = signatures[:, 0] != _EMPTY
+    if group_by in df.columns:
+        groups = pd.factorize(df[group_by].fillna("").astype(str).str.strip().str.lower())[0].astype(np.uint64)
+    else:
+        groups = np.zeros(n, dtype=np.uint64)
+
+    # Rows with the same full signature (and group) are copies of the first of them;
+    # only that first row takes part in LSH
+    index = np.flatnonzero(has_text)
+    row_keys = (signatures[index] * _FULL_MIX).sum(axis=1) ^ (groups[index] * np.uint64(0x9E3779B97F4A7C15))
+    order = np.argsort(row_keys, kind="stable")
+    sorted_keys = row_keys[order]
+    new_signature = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    signature_first = order[np.maximum.accumulate(np.where(new_signature, np.arange(len(order)), 0))]
+    copies = ~new_signature
+    candidate_keys = [_pair_keys(index[signature_first[copies]], index[order[copies]], n)]
+    index = np.sort(index[order[new_signature]])
+
+    # LSH: distinct signatures sharing any band are candidates. Each is compared with up to
+    # BUCKET_COMPARISONS others in its bucket, so huge buckets stay linear.
+    rows_per_band = NUM_BINS // BANDS
+    for band in range(BANDS):
+        block = signatures[index, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = (block * _BAND_MIX).sum(axis=1) ^ (groups[index] * np.uint64(0x9E3779B97F4A7C15))
+        order = np.argsort(keys, kind="stable")
+        bucket = np.cumsum(np.r_[True, keys[order][1:] != keys[order][:-1]])
+        members = index[order]
+        for offset in range(1, BUCKET_COMPARISONS + 1):
+            same_bucket = bucket[offset:] == bucket[:-offset]
+            if not same_bucket.any():
+                break  # no bucket has more members than this
+            candidate_keys.append(_pair_keys(members[:-offset][same_bucket], members[offset:][same_bucket], n))
+    # Pairs found by several bands are confirmed once
+    pair_keys = np.sort(np.concatenate(candidate_keys))
+    if not len(pair_keys):
+        return {}
+    pair_keys = pair_keys[np.r_[True, pair_keys[1:] != pair_keys[:-1]]]
+
+    # Candidates are confirmed on the full signature and within the same group, a block at a time
+    union_find = _UnionFind(n)
+    confirmed = []
+    for first in range(0, len(pair_keys), BLOCK_ROWS):
+        pairs = np.stack([pair_keys[first:first + BLOCK_ROWS] // n, pair_keys[first:first + BLOCK_ROWS] % n], axis=1)
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        confirmed.append(pairs[(similarity >= threshold) & (groups[pairs[:, 0]] == groups[pairs[:, 1]])])
+    confirmed = np.concatenate(confirmed)
+    for i, j in confirmed.tolist():
+        union_find.union(i, j)
+
+    duplicates = {}
+    removed = [i for i in set(confirmed.ravel().tolist()) if union_find.find(i) != i]
+    if removed:
+        removed = np.array(sorted(removed))
+        kept = np.array([union_find.find(i) for i in removed.tolist()])
+        kept_similarity = (signatures[removed] == signatures[kept]).mean(axis=1)
+        duplicates = {int(i): (int(k), float(s)) for i, k, s in zip(removed, kept, kept_similarity)}
+    return duplicates
+
+
+def prune_near_duplicates(df, columns=("Title", "Steps"), group_by="Transaction Type", threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Keeps one row per near-duplicate cluster (the first) and lists the rest in attrs["near_duplicates"]."""
+    duplicates = find_near_duplicates(df, columns, group_by, threshold)
+    title_col = next((col for col in columns if col in df.columns), None)
+    titles = df[title_col].fillna("").astype(str).to_numpy() if title_col else None
+    report = [
+        {
+            "Removed Row": removed + 1,
+            "Kept Row": kept + 1,
+            "Similarity": round(similarity, 2),
+            "Removed Title": titles[removed] if title_col else "",
+            "Kept Title": titles[kept] if title_col else "",
+        }
+        for removed, (kept, similarity) in sorted(duplicates.items())
+    ]
+    attrs = dict(df.attrs)
+    if duplicates:
+        keep = np.ones(len(df), dtype=bool)
+        keep[list(duplicates)] = False
+        df = df[keep].reset_index(drop=True)
+    else:
+        df = df.copy()
+    df.attrs = attrs
+    df.attrs["near_duplicates"] = report
+    return df
+
+
+def near_duplicate_summary(df):
+    report = df.attrs.get("near_duplicates") or []
+    if not report:
+        return ""
+    clusters = len({entry["Kept Row"] for entry in report})
+    return f"Pruned {len(report)} near-duplicate row(s) in {clusters} cluster(s); {len(df)} row(s) kept"
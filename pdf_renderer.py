@@ -0,0 +1,301 @@
+import re
+from io import BytesIO
+
+from fpdf import FPDF
+
+FONT = "Arial"
+BODY_SIZE = 11
+LINE_HEIGHT = 6
+CELL_LINE_HEIGHT = 5
+HEADING_SIZES = {1: 18, 2: 15, 3: 13, 4: 12, 5: 11, 6: 11}
+MAX_COLUMN_SHARE = 0.45
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+BOLD_LINE_RE = re.compile(r"^\*\*([^*]+)\*\*:?$")
+BULLET_RE = re.compile(r"^(\s*)(?:[-*+\xb7]|\d+[.)])\s+(.*)$")
+TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$")
+INLINE_MARKUP_RE = re.compile(r"\*\*|__|`")
+
+# Core PDF fonts are latin-1 only; map common model punctuation instead of printing "?"
+LATIN1_FALLBACKS = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u2022": "\xb7", "\u2026": "...",
+    "\u2192": "->", "\u2264": "<=", "\u2265": ">=", "\u00a0": " ",
+    "\u2713": "x", "\u2714": "x", "\u274c": "x",
+})
+
+
+def to_latin1(text):
+    return text.translate(LATIN1_FALLBACKS).encode("latin-1", errors="replace").decode("latin-1")
+
+
+def _clean_inline(text):
+    return INLINE_MARKUP_RE.sub("", text).strip()
+
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [_clean_inline(cell) for cell in line.split("|")]
+
+
+def parse_blocks(text):
+    """Parses BRD markdown once into ("heading", level, text), ("paragraph", text),
+    ("bullet", depth, text), ("table", header_rows, rows) and ("space",) blocks."""
+    blocks = []
+    table = []
+    header_rows = 0
+
+    def flush_table():
+        nonlocal table, header_rows
+        if table:
+            width = max(len(row) for row in table)
+            rows = [row + [""] * (width - len(row)) for row in table]
+            blocks.append(("table", header_rows, rows))
+        table, header_rows = [], 0
+
+    for raw in to_latin1(text).strip().splitlines():
+        line = raw.rstrip()
+        stripped = line.strip()
+        if "|" in stripped and len(_split_row(stripped)) >= 2:
+            if TABLE_SEPARATOR_RE.match(stripped):
+                header_rows = len(table)
+            else:
+                table.append(_split_row(stripped))
+            continue
+        flush_table()
+
+        if not stripped:
+            if blocks and blocks[-1] != ("space",):
+                blocks.append(("space",))
+            continue
+        heading = HEADING_RE.match(stripped)
+        if heading:
+            blocks.append(("heading", len(heading.group(1)), _clean_inline(heading.group(2))))
+            continue
+        bold = BOLD_LINE_RE.match(stripped)
+        if bold:
+            blocks.append(("heading", 4, bold.group(1).strip()))
+            continue
+        bullet = BULLET_RE.match(line)
+        if bullet:
+            blocks.append(("bullet", len(bullet.group(1).expandtabs(4)) // 2, _clean_inline(bullet.group(2))))
+            continue
+        blocks.append(("paragraph", _clean_inline(stripped.lstrip("> "))))
+    flush_table()
+    return blocks
+
+
+class _Wrapper:
+    # Word widths are cached per font so long documents measure each word once
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self._caches = {}
+
+    def _font_cache(self):
+        pdf = self.pdf
+        key = (pdf.font_family, pdf.font_style, pdf.font_size_pt)
+        cache = self._caches.get(key)
+        if cache is None:
+            cache = self._caches[key] = {}
+        return cache
+
+    def _measure(self, text):
+        font = self.pdf.current_font
+        char_widths = font.get("cw") if isinstance(font, dict) else None
+        if not isinstance(char_widths, dict):
+            return self.pdf.get_string_width(text)
+        # Same arithmetic as FPDF.get_string_width for core fonts, minus the per-call overhead
+        return sum(char_widths.get(ch, 0) for ch in text) * self.pdf.font_size / 1000.0
+
+    def width(self, text, cache=None):
+        cache = self._font_cache() if cache is None else cache
+        width = cache.get(text)
+        if width is None:
+            width = cache[text] = self._measure(text)
+        return width
+
+    def text_width(self, text):
+        # Sum of cached word widths; avoids measuring every long table cell char by char
+        cache = self._font_cache()
+        words = text.split()
+        return sum(self.width(word, cache) for word in words) + self.width(" ", cache) * max(0, len(words) - 1)
+
+    def wrap(self, text, max_width):
+        if not text:
+            return [""]
+        cache = self._font_cache()
+        space = self.width(" ", cache)
+        lines, current, current_width = [], [], 0.0
+        for word in text.split():
+            word_width = cache.get(word)
+            if word_width is None:
+                word_width = cache[word] = self._measure(word)
+            if word_width > max_width:
+                # Hard-break words that cannot fit on a line of their own
+                if current:
+                    lines.append(" ".join(current))
+                    current, current_width = [], 0.0
+                piece = ""
+                for ch in word:
+                    if piece and self._measure(piece + ch) > max_width:
+                        lines.append(piece)
+                        piece = ""
+                    piece += ch
+                current, current_width = [piece], self._measure(piece)
+                continue
+            needed = word_width if not current else current_width + space + word_width
+            if current and needed > max_width:
+                lines.append(" ".join(current))
+                current, current_width = [word], word_width
+            else:
+                current.append(word)
+                current_width = needed
+        if current:
+            lines.append(" ".join(current))
+        return lines or [""]
+
+
+class BRDRenderer:
+    def __init__(self):
+        self.pdf = FPDF()
+        self.pdf.set_auto_page_break(True, margin=15)
+        self.pdf.set_margins(15, 15, 15)
+        self.pdf.add_page()
+        self.wrapper = _Wrapper(self.pdf)
+        self.content_width = self.pdf.w - self.pdf.l_margin - self.pdf.r_margin
+
+    def _ensure_space(self, height):
+        if self.pdf.get_y() + height > self.pdf.page_break_trigger:
+            self.pdf.add_page()
+
+    def _text(self, x, y, height, line):
+        # FPDF.text skips cell()'s border and page-break bookkeeping; same baseline as cell()
+        if line:
+            self.pdf.text(x + self.pdf.c_margin, y + 0.5 * height + 0.3 * self.pdf.font_size, line)
+
+    def _lines(self, lines, height, indent=0.0):
+        pdf = self.pdf
+        x = pdf.l_margin + indent
+        for line in lines:
+            self._ensure_space(height)
+            y = pdf.get_y()
+            self._text(x, y, height, line)
+            pdf.set_y(y + height)
+
+    def heading(self, level, text):
+        size = HEADING_SIZES.get(level, BODY_SIZE)
+        self.pdf.set_font(FONT, "B", size)
+        self.pdf.ln(2)
+        self._lines(self.wrapper.wrap(text, self.content_width), size * 0.5)
+        self.pdf.set_font(FONT, "", BODY_SIZE)
+
+    def paragraph(self, text):
+        self._lines(self.wrapper.wrap(text, self.content_width), LINE_HEIGHT)
+
+    def bullet(self, depth, text):
+        indent = 5 + depth * 5
+        lines = self.wrapper.wrap(text, self.content_width - indent)
+        self._ensure_space(LINE_HEIGHT)
+        self._text(self.pdf.l_margin + indent - 4, self.pdf.get_y(), LINE_HEIGHT, "\xb7")
+        self._lines(lines, LINE_HEIGHT, indent)
+
+    def table(self, header_rows, rows):
+        pdf = self.pdf
+        padding = 2 * pdf.c_margin
+        pdf.set_font(FONT, "", BODY_SIZE - 1)
+
+        # Column widths are computed once per table from content, then scaled to the page
+        cap = self.content_width * MAX_COLUMN_SHARE
+        natural = [
+            min(cap, max(self.wrapper.text_width(row[i]) for row in rows) + padding) + 0.01
+            for i in range(len(rows[0]))
+        ]
+        min_width = min(20.0, self.content_width / len(natural))
+        widths = [max(min_width, w) for w in natural]
+        scale = self.content_width / sum(widths) if sum(widths) > self.content_width else 1.0
+        widths = [w * scale for w in widths]
+
+        pdf.set_font(FONT, "B", BODY_SIZE - 1)
+        header = [[self.wrapper.wrap(t, max(1.0, w - padding)) for t, w in zip(row, widths)] for row in rows[:header_rows]]
+        header_lines = sum(max(len(lines) for lines in cells) for cells in header)
+        page_lines = int((pdf.page_break_trigger - pdf.t_margin) / CELL_LINE_HEIGHT)
+        for index, row in enumerate(rows):
+            is_header = index < header_rows
+            pdf.set_font(FONT, "B" if is_header else "", BODY_SIZE - 1)
+            cells = header[index] if is_header else [self.wrapper.wrap(t, max(1.0, w - padding)) for t, w in zip(row, widths)]
+            # A header taking half a page or more is not repeated
+            repeat = [] if is_header or header_lines * 2 >= page_lines else header
+            first_slice = True
+            while True:
+                needed = max(len(lines) for lines in cells)
+                fits = int((pdf.page_break_trigger - pdf.get_y()) / CELL_LINE_HEIGHT + 1e-6)
+                if needed <= fits:
+                    break
+                if first_slice and needed <= page_lines - (header_lines if repeat else 0):
+                    # Fits on a fresh page: move the whole row rather than split it
+                    self._table_page(repeat, widths)
+                    break
+                if fits > 0:
+                    # Taller than a page: draw what fits here and carry the rest over as a continuation row
+                    self._row(widths, [lines[:fits] for lines in cells])
+                    cells = [lines[fits:] for lines in cells]
+                first_slice = False
+                self._table_page(repeat, widths)
+            self._row(widths, cells)
+        pdf.set_font(FONT, "", BODY_SIZE)
+        pdf.ln(2)
+
+    def _table_page(self, header, widths):
+        # New page, with the header rows repeated at the top
+        pdf = self.pdf
+        pdf.add_page()
+        if header:
+            style = pdf.font_style
+            pdf.set_font(FONT, "B", BODY_SIZE - 1)
+            for cells in header:
+                self._row(widths, cells)
+            pdf.set_font(FONT, style, BODY_SIZE - 1)
+
+    def _row(self, widths, cells):
+        pdf = self.pdf
+        height = max(1, max(len(lines) for lines in cells)) * CELL_LINE_HEIGHT
+        x, y = pdf.l_margin, pdf.get_y()
+        for width, lines in zip(widths, cells):
+            pdf.rect(x, y, width, height)
+            for i, line in enumerate(lines):
+                self._text(x, y + i * CELL_LINE_HEIGHT, CELL_LINE_HEIGHT, line)
+            x += width
+        pdf.set_y(y + height)
+
+    def render(self, blocks):
+        self.pdf.set_font(FONT, "", BODY_SIZE)
+        for block in blocks:
+            kind = block[0]
+            if kind == "heading":
+                self.heading(block[1], block[2])
+            elif kind == "paragraph":
+                self.paragraph(block[1])
+            elif kind == "bullet":
+                self.bullet(block[1], block[2])
+            elif kind == "table":
+                self.table(block[1], block[2])
+            elif kind == "space":
+                self.pdf.ln(2)
+        return self
+
+    def write_to(self, fileobj):
+        data = self.pdf.output(dest="S")
+        # pyfpdf 1.7 returns a latin-1 str, fpdf2 returns bytes
+        fileobj.write(data.encode("latin-1") if isinstance(data, str) else bytes(data))
+        return self.pdf.page_no()
+
+
+def generate_pdf_from_text(text: str) -> BytesIO:
+    buffer = BytesIO()
+    BRDRenderer().render(parse_blocks(text)).write_to(buffer)
+    buffer.seek(0)
+    return buffer
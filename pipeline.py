@@ -0,0 +1,507 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime
+
+import pandas as pd
+
+from brd_sections import chunk_brd, estimate_tokens, section_units
+from csv_stream import parse_csv_tolerant
+from generation import generate_text
+from metrics import registry, stage
+from near_duplicates import NEAR_DUPLICATE_THRESHOLD, prune_near_duplicates
+from token_usage import PromptTooLarge
+
+DEFAULT_COLUMNS = [
+    "Test Case Number", "Title", "Preconditions", "Steps",
+    "Expected Results", "Transaction Type", "Status", "Test Data"
+]
+
+TRANSACTION_TYPES = ["Submission", "Policy Change", "Cancellation", "Rewrite", "Reinstatement"]
+
+# Sections shorter than this (a bare heading, a sign-off) get no test cases of their own
+MIN_SECTION_TOKENS = 20
+
+# --- Prompt Packing Settings ---
+BRD_PACK_TOKENS = int(os.getenv("BRD_PACK_TOKENS", "2000"))  # estimated prompt tokens per packed BRD request
+BRD_PACK_MAX = int(os.getenv("BRD_PACK_MAX", "6"))  # use cases per request; bounds the response length
+PACKED_BRD_RE = re.compile(r"^\W*<<<BRD (UC-\d+)>>>\W*$(.*?)^\W*<<<END BRD \1>>>\W*$", re.MULTILINE | re.DOTALL)
+
+
+# --- Prompts ---
+def build_brd_prompt(usecase, today=None):
+    today = today or datetime.now().strftime("%B %d, %Y")
+    return f"Create a detailed Business Requirements Document (BRD) with today's date ({today}) based on the following Guidewire PolicyCenter use case:\n\n{usecase}"
+
+
+def build_packed_brd_prompt(usecases, today=None):
+    # The model must echo each use case's id around its BRD so the response can be split
+    today = today or datetime.now().strftime("%B %d, %Y")
+    blocks = "\n\n".join(
+        f"<<<USE CASE UC-{i}>>>\n{usecase}\n<<<END USE CASE UC-{i}>>>" for i, usecase in enumerate(usecases, start=1)
+    )
+    return f"""Create separate detailed Business Requirements Documents (BRDs), one for each of the {len(usecases)} Guidewire PolicyCenter use cases below, each with today's date ({today}).
+Write every BRD in full as if it were the only one, without referring to the other use cases.
+Start each BRD with a line containing only <<<BRD UC-n>>> and end it with a line containing only <<<END BRD UC-n>>>, where UC-n is the id of its use case. Keep the order of the use cases and write nothing outside these markers.
+
+{blocks}"""
+
+
+def build_brd_revision_prompt(previous_brd, usecase, today=None):
+    # Unchanged sections must come back verbatim so their test cases can be reused
+    today = today or datetime.now().strftime("%B %d, %Y")
+    return f"""Revise the Business Requirements Document (BRD) below so that it matches the updated Guidewire PolicyCenter use case, with today's date ({today}).
+Keep every section that the use case changes do not affect exactly as it is, word for word and with the same heading. Only rewrite, add or remove the sections affected by the changes. Return the complete revised BRD.
+
+Updated use case:
+{usecase}
+
+Current BRD:
+{previous_brd}"""
+
+
+def build_test_case_prompt(brd_text, columns=DEFAULT_COLUMNS, transaction_type=None, part=None, structured=False):
+    if transaction_type:
+        scope = f"""1. Only cover the {transaction_type} transaction. Every row must have Transaction Type = {transaction_type}.
+2. Generate detailed test cases."""
+        coverage = f"5. Include positive, negative and edge-case scenarios specific to {transaction_type}"
+    else:
+        scope = """1. Automatically detect the transaction type (e.g., New Business, Policy Change, etc.).
+2. Generate detailed test cases."""
+        coverage = "5. Include at least one of each Transaction type other than Use Case (e.g., Submission, Policy Change, Cancellation, Rewrite, Reinstatement)"
+    if part:
+        index, total = part
+        coverage = f"5. The BRD below is part {index} of {total} of a larger document. Only cover requirements stated in this part"
+    if structured:
+        output_format = f"""Return a JSON array with one object per test case, using exactly these keys:
+{json.dumps(list(columns))}
+
+Every value is a string. In the Steps value, number each step (e.g., 1. Do this, 2. Do that, 3. ...) and put each step on its own line."""
+    else:
+        output_format = f"""Output strict CSV format (comma-separated). Wrap all fields in double quotes, even multiline ones.
+Do NOT include markdown or ``` formatting.
+
+Use the exact headers below:
+"{'","'.join(columns)}"
+
+In the steps field, number each step (e.g., 1. Do this, 2. Do that, 3. ...). Do not use "\\n" or any escape characters. Each new step should be on a new line inside the cell using a real line break (press Enter/Return), not the characters "\\n\""""
+    return f"""
+You are a QA test case generator for Guidewire PolicyCenter. Based on the BRD below, do the following:
+
+{scope}
+3. Each test case must include:
+- Test Case Number (1, 2, 3...)
+- A descriptive Title
+- Preconditions
+- Detailed, numbered Steps
+- Expected Results
+- Transaction Type (e.g., Submission, Policy Change)
+- Status = Draft
+- Test Data (e.g., customer info, product, vehicle)
+4. Include additional scenarios based on the BRD (both Positive and Negative)
+{coverage}
+
+{output_format}
+
+BRD:
+{brd_text}
+"""
+
+
+# --- Structured output ---
+def test_case_schema(columns=DEFAULT_COLUMNS):
+    # OpenAPI subset accepted by Gemini's response_schema: an array of string-only rows
+    return {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {col: {"type": "STRING"} for col in columns},
+            "required": list(columns),
+        },
+    }
+
+
+def structured_generation_config(columns=DEFAULT_COLUMNS):
+    return {"response_mime_type": "application/json", "response_schema": test_case_schema(columns)}
+
+
+# --- Parsing ---
+def conform_columns(df, columns=DEFAULT_COLUMNS):
+    for col in columns:
+        if col not in df.columns:
+            df[col] = ""
+    return df[columns]
+
+
+def test_case_frame(parser, columns=DEFAULT_COLUMNS):
+    # Repaired and dropped rows travel with the frame in df.attrs["parse_issues"]
+    if parser.header is None or not parser.rows:
+        raise ValueError("no CSV table found in the model output")
+    df = pd.DataFrame(parser.rows, columns=parser.header)
+    if columns:
+        df = conform_columns(df, columns)
+    df.attrs["parse_issues"] = list(parser.issues)
+    record_parse(df, "csv")
+    return df
+
+
+def record_parse(df, fmt):
+    # Parse-failure rate in production: issues per parsed row, by output format
+    issues = df.attrs.get("parse_issues") or []
+    repaired = sum(1 for issue in issues if issue["Action"] == "repaired")
+    registry.inc("genai_parsed_rows_total", len(df), format=fmt)
+    registry.inc("genai_parse_issues_total", repaired, format=fmt, action="repaired")
+    registry.inc("genai_parse_issues_total", len(issues) - repaired, format=fmt, action="dropped")
+
+
+def parse_test_cases(output_text, columns=DEFAULT_COLUMNS):
+    with stage("parse", format="csv", chars=len(output_text or "")) as info:
+        df = test_case_frame(parse_csv_tolerant(output_text, columns), columns)
+        info["rows"] = len(df)
+    return df
+
+
+def parse_test_cases_json(output_text, columns=DEFAULT_COLUMNS):
+    with stage("parse", format="json", chars=len(output_text or "")) as info:
+        df = _parse_test_cases_json(output_text, columns)
+        info["rows"] = len(df)
+    record_parse(df, "json")
+    return df
+
+
+def _parse_test_cases_json(output_text, columns):
+    # Validates the schema-constrained response and loads it in one go; no text cleanup needed
+    try:
+        data = json.loads(output_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"model did not return valid JSON: {e}") from e
+    if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), list):
+        data = next(iter(data.values()))
+    if not isinstance(data, list):
+        raise ValueError(f"expected a JSON array of test cases, got {type(data).__name__}")
+
+    records, issues = [], []
+    for index, item in enumerate(data, start=1):
+        if not isinstance(item, dict):
+            issues.append({"Line": index, "Row": None, "Action": "dropped", "Issue": f"array item is a {type(item).__name__}, not an object"})
+            continue
+        missing = [col for col in columns if col not in item]
+        extra = [key for key in item if key not in columns]
+        record = {}
+        for col in columns:
+            value = item.get(col, "")
+            if isinstance(value, list):
+                value = "\n".join(str(v) for v in value)
+            record[col] = "" if value is None else str(value)
+        records.append(record)
+        fixes = []
+        if missing:
+            fixes.append(f"missing {', '.join(missing)}")
+        if extra:
+            fixes.append(f"ignored {', '.join(extra)}")
+        if fixes:
+            issues.append({"Line": index, "Row": len(records), "Action": "repaired", "Issue": "; ".join(fixes)})
+    if not records:
+        raise ValueError("no test cases in the JSON response")
+    df = pd.DataFrame.from_records(records, columns=list(columns))
+    df.attrs["parse_issues"] = issues
+    return df
+
+
+def parse_issue_summary(df):
+    issues = df.attrs.get("parse_issues") or []
+    repaired = sum(1 for issue in issues if issue["Action"] == "repaired")
+    return f"CSV parser repaired {repaired} row(s) and dropped {len(issues) - repaired} line(s)" if issues else ""
+
+
+def merge_test_case_frames(frames, columns=DEFAULT_COLUMNS):
+    # Concatenate partial results, drop repeated titles and renumber globally
+    frames = [conform_columns(df.copy(), columns) for df in frames]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    if "Title" in df.columns:
+        title_key = df["Title"].fillna("").astype(str).str.lower().str.split().str.join(" ")
+        df = df[(title_key == "") | ~title_key.duplicated()]
+    df = df.reset_index(drop=True)
+    if "Test Case Number" in df.columns:
+        df["Test Case Number"] = range(1, len(df) + 1)
+    df.attrs["parse_issues"] = [issue for frame in frames for issue in frame.attrs.get("parse_issues", [])]
+    return df
+
+
+def prune_test_cases(df, threshold=NEAR_DUPLICATE_THRESHOLD):
+    # Drop near-duplicate rows within each transaction type and keep numbering contiguous
+    with stage("prune", rows=len(df)) as info:
+        df = prune_near_duplicates(df, threshold=threshold)
+        info["removed"] = len(df.attrs["near_duplicates"])
+    if df.attrs["near_duplicates"] and "Test Case Number" in df.columns:
+        df["Test Case Number"] = range(1, len(df) + 1)
+    return df
+
+
+# --- Stages ---
+def generate_brd(model, usecase, today=None, bypass_cache=False):
+    with stage("brd") as info:
+        brd_text = generate_text(model, build_brd_prompt(usecase, today), bypass_cache=bypass_cache)
+        info["chars"] = len(brd_text)
+    return brd_text
+
+
+def pack_usecases(usecases, token_budget=BRD_PACK_TOKENS, max_per_pack=BRD_PACK_MAX):
+    """Groups use case positions, in order, into packs whose packed BRD prompt fits token_budget.
+
+    A use case too large to share a prompt ends up in a pack of its own.
+    """
+    overhead = estimate_tokens(build_packed_brd_prompt([]))
+    per_case = estimate_tokens("<<<USE CASE UC-00>>>\n\n<<<END USE CASE UC-00>>>\n\n")
+    packs, current, used = [], [], overhead
+    for index, usecase in enumerate(usecases):
+        tokens = estimate_tokens(usecase) + per_case
+        if current and (used + tokens > token_budget or len(current) >= max_per_pack):
+            packs.append(current)
+            current, used = [], overhead
+        current.append(index)
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def split_packed_brds(text, count):
+    # {n: BRD} for the use cases (1-based) whose markers came back intact around a non-empty BRD
+    brds = {}
+    for match in PACKED_BRD_RE.finditer(text):
+        n, brd = int(match.group(1)[3:]), match.group(2).strip()
+        if 1 <= n <= count and n not in brds and brd and "<<<" not in brd:
+            brds[n] = brd
+    return brds
+
+
+def generate_brds_packed(model, usecases, today=None, token_budget=BRD_PACK_TOKENS, max_per_pack=BRD_PACK_MAX,
+                         bypass_cache=False, max_workers=4):
+    """BRDs for many use cases, packing several short ones into each request.
+
+    Returns (brds, report): brds[i] is the BRD for usecases[i], or the exception
+    raised while generating it; the report has one entry per pack. A use case
+    whose BRD cannot be split out of the packed response (or whose pack
+    failed) is generated with a request of its own.
+    """
+    def run_pack(number, indexes):
+        started = time.perf_counter()
+        entry = {"Pack": number, "Use Cases": len(indexes), "Prompt Tokens": None, "Split": 0, "Fallbacks": 0,
+                 "Seconds": None, "Error": ""}
+        brds = {}
+        if len(indexes) > 1:
+            prompt = build_packed_brd_prompt([usecases[i] for i in indexes], today)
+            entry["Prompt Tokens"] = estimate_tokens(prompt)
+            try:
+                with stage("brd_pack", use_cases=len(indexes)) as info:
+                    split = split_packed_brds(generate_text(model, prompt, bypass_cache=bypass_cache), len(indexes))
+                    info["split"] = len(split)
+                brds = {indexes[n - 1]: brd for n, brd in split.items()}
+            except Exception as e:
+                entry["Error"] = str(e)
+            entry["Split"] = len(brds)
+            entry["Fallbacks"] = len(indexes) - len(brds)
+            registry.inc("genai_packed_brds_total", entry["Split"], outcome="split")
+            registry.inc("genai_packed_brds_total", entry["Fallbacks"], outcome="fallback")
+        for i in indexes:
+            if i not in brds:
+                try:
+                    brds[i] = generate_brd(model, usecases[i], today, bypass_cache=bypass_cache)
+                except Exception as e:
+                    brds[i] = e
+        entry["Seconds"] = round(time.perf_counter() - started, 2)
+        return brds, entry
+
+    packs = pack_usecases(usecases, token_budget, max_per_pack)
+    brds, report = [None] * len(usecases), []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(packs) or 1))) as executor:
+        futures = [executor.submit(copy_context().run, run_pack, n, indexes) for n, indexes in enumerate(packs, start=1)]
+        for future in futures:
+            pack_brds, entry = future.result()
+            for i, brd in pack_brds.items():
+                brds[i] = brd
+            report.append(entry)
+    return brds, report
+
+
+def generate_test_cases(model, brd_text, columns=DEFAULT_COLUMNS, bypass_cache=False, transaction_type=None, part=None,
+                        structured=False):
+    prompt = build_test_case_prompt(brd_text, columns, transaction_type, part, structured)
+    generation_config = structured_generation_config(columns) if structured else None
+    with stage("test_cases", transaction_type=transaction_type, part=part and part[0]) as info:
+        output_text = generate_text(model, prompt, generation_config, bypass_cache=bypass_cache)
+        info["chars"] = len(output_text)
+    if structured:
+        return parse_test_cases_json(output_text, columns), output_text
+    return parse_test_cases(output_text, columns), output_text
+
+
+def _all_failed(message, errors):
+    # Every request refused as too large is still "too large" to the caller (the API answers 413)
+    if errors and all(isinstance(e, PromptTooLarge) for e in errors):
+        return PromptTooLarge(f"{message}: {errors[0]}")
+    return ValueError(message)
+
+
+def _report_progress(progress, done, total, futures):
+    # progress(done, total) may raise (e.g. a cancelled job); requests not started yet are dropped
+    try:
+        progress(done, total)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def fan_out_test_cases(model, brd_text, columns=DEFAULT_COLUMNS, transaction_types=TRANSACTION_TYPES,
+                       bypass_cache=False, max_workers=None, structured=False, progress=None):
+    # One request per transaction type, all in flight at once against the same BRD.
+    # Workers run in a copy of the caller's context so the run's token tally sees their calls.
+    with ThreadPoolExecutor(max_workers=max_workers or len(transaction_types)) as executor:
+        futures = [
+            executor.submit(copy_context().run, generate_test_cases, model, brd_text, columns, bypass_cache, transaction_type,
+                            structured=structured)
+            for transaction_type in transaction_types
+        ]
+        frames, failures, errors = [], {}, []
+        for done, (transaction_type, future) in enumerate(zip(transaction_types, futures), start=1):
+            try:
+                df, _ = future.result()
+            except Exception as e:
+                failures[transaction_type] = str(e)
+                errors.append(e)
+            else:
+                if "Transaction Type" in df.columns:
+                    df["Transaction Type"] = df["Transaction Type"].fillna("").replace("", transaction_type)
+                frames.append(df)
+            if progress:
+                _report_progress(progress, done, len(futures), futures)
+
+    if not frames:
+        raise _all_failed(f"test case generation failed for every transaction type: {failures}", errors) from (errors[0] if errors else None)
+    return merge_test_case_frames(frames, columns), failures
+
+
+def map_reduce_test_cases(model, brd_text, columns=DEFAULT_COLUMNS, token_budget=6000,
+                          bypass_cache=False, max_workers=4, structured=False, progress=None):
+    # Map: one request per BRD chunk. Reduce: merge, dedupe and renumber.
+    chunks = chunk_brd(brd_text, token_budget)
+    total = len(chunks)
+
+    def run_chunk(index, chunk):
+        started = time.perf_counter()
+        part = (index, total) if total > 1 else None
+        df, _ = generate_test_cases(model, chunk["text"], columns, bypass_cache, part=part, structured=structured)
+        return df, time.perf_counter() - started
+
+    report, frames, errors = [], [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total or 1))) as executor:
+        futures = [executor.submit(copy_context().run, run_chunk, i, chunk) for i, chunk in enumerate(chunks, start=1)]
+        for i, (chunk, future) in enumerate(zip(chunks, futures), start=1):
+            entry = {
+                "Chunk": i,
+                "Sections": ", ".join(chunk["headings"]),
+                "Estimated Tokens": estimate_tokens(chunk["text"]),
+                "Rows": 0,
+                "Seconds": None,
+                "Error": "",
+            }
+            try:
+                df, seconds = future.result()
+                entry["Rows"], entry["Seconds"] = len(df), round(seconds, 2)
+                frames.append(df)
+            except Exception as e:
+                entry["Error"] = str(e)
+                errors.append(e)
+            report.append(entry)
+            if progress:
+                _report_progress(progress, i, total, futures)
+
+    if not frames:
+        raise _all_failed(f"test case generation failed for all {total} BRD chunk(s)", errors) from (errors[0] if errors else None)
+    return merge_test_case_frames(frames, columns), report
+
+
+def incremental_test_cases(model, brd_text, previous=None, columns=DEFAULT_COLUMNS, token_budget=6000,
+                           bypass_cache=False, max_workers=4, structured=False, progress=None):
+    """Regenerates test cases only for BRD sections that are new or changed since the last run.
+
+    `previous` is the state returned by the last call. Returns (df, state,
+    report); df has a "Source" column ("reused" or "regenerated") and the
+    report has one entry per section, including removed ones.
+    """
+    columns = list(columns)
+    if not previous or previous.get("columns") != columns:
+        previous = {"columns": columns, "sections": {}}
+    preamble, units = section_units(brd_text, token_budget)
+    if not units:
+        raise ValueError("the BRD has no content to generate test cases from")
+    total = len(units)
+    previous_headings = {section["heading"] for section in previous["sections"].values()}
+
+    def run_unit(index, unit):
+        started = time.perf_counter()
+        text = f"{preamble}\n\n{unit['text']}" if preamble else unit["text"]
+        df, _ = generate_test_cases(model, text, columns, bypass_cache, part=(index, total), structured=structured)
+        return df, time.perf_counter() - started
+
+    pending = {
+        index: unit for index, unit in enumerate(units, start=1)
+        if unit["key"] not in previous["sections"] and estimate_tokens(unit["text"]) >= MIN_SECTION_TOKENS
+    }
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending) or 1))) as executor:
+        futures = {index: executor.submit(copy_context().run, run_unit, index, unit) for index, unit in pending.items()}
+
+        state = {"columns": columns, "sections": {}}
+        report, frames, errors = [], [], []
+        for index, unit in enumerate(units, start=1):
+            reused = previous["sections"].get(unit["key"])
+            entry = {
+                "Section": unit["heading"] or "(untitled)",
+                "Status": "unchanged" if reused else "changed" if unit["heading"] in previous_headings else "new",
+                "Source": "reused",
+                "Rows": 0,
+                "Seconds": None,
+                "Error": "",
+            }
+            if reused:
+                df = pd.DataFrame(reused["rows"], columns=columns)
+            elif index in futures:
+                entry["Source"] = "regenerated"
+                try:
+                    df, seconds = futures[index].result()
+                    entry["Seconds"] = round(seconds, 2)
+                except Exception as e:
+                    entry["Source"], entry["Error"] = "failed", str(e)
+                    errors.append(e)
+                    report.append(entry)
+                    continue
+                finally:
+                    if progress:
+                        _report_progress(progress, sum(future.done() for future in futures.values()), len(futures),
+                                         list(futures.values()))
+            else:
+                entry["Source"] = "skipped"
+                df = pd.DataFrame(columns=columns)
+            # Duplicate keys (identical sections) share one set of rows
+            if unit["key"] not in state["sections"]:
+                state["sections"][unit["key"]] = {"heading": unit["heading"], "rows": df.to_dict("records")}
+                entry["Rows"] = len(df)
+                frames.append(df.assign(Source=entry["Source"]))
+            report.append(entry)
+
+    # Old versions of changed sections are already reported as "changed"
+    current = {unit["key"] for unit in units} | {unit["heading"] for unit in units}
+    for key, section in previous["sections"].items():
+        if key not in current and section["heading"] not in current:
+            report.append({"Section": section["heading"] or "(untitled)", "Status": "removed", "Source": "dropped",
+                           "Rows": len(section["rows"]), "Seconds": None, "Error": ""})
+    if not any(len(df) for df in frames):
+        raise _all_failed("test case generation failed for every changed BRD section", errors) from (errors[0] if errors else None)
+    return merge_test_case_frames(frames, columns + ["Source"]), state, report
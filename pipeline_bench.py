@@ -0,0 +1,346 @@
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RECORDINGS_FILE = "bench_recordings.json"
+BASELINE_FILE = "bench_baseline.json"
+SEED_USE_CASES = ["UseCase 1.txt", "UseCase 2.txt"]
+SYNTHETIC_ROWS = [10, 1000, 50000]
+# Fixed so the prompts, and the hashes the recordings are keyed by, do not change from day to day
+BENCH_DATE = "October 17, 2026"
+# Bump a stage's version when its implementation is deliberately replaced. Baseline numbers from
+# another version are shown but not compared until --save-baseline records the new ones.
+STAGE_VERSIONS = {
+    "xlsx": 2,  # streaming constant_memory writer, one sheet per transaction type
+}
+
+WORDS = (
+    "policy account agent underwriting coverage vehicle driver premium quote bind issue rating endorsement "
+    "cancellation reinstatement rewrite submission liability collision comprehensive deductible limit "
+    "effective date jurisdiction validation rule screen producer garaging territory symbol"
+).split()
+TRANSACTION_TYPES = ["Submission", "Policy Change", "Cancellation", "Rewrite", "Reinstatement"]
+
+
+def synthetic_response(rows, seed=11):
+    """A CSV test case response of `rows` rows, with the quirks real responses have.
+
+    A chatty preamble and a code fence, columns in another order than the
+    template, an extra column and a missing one, rows with a stray field,
+    and every 20th row a near-copy of the one before it.
+    """
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+    columns = ["Title", "Test Case Number", "Transaction Type", "Preconditions", "Steps", "Expected Results", "Priority",
+               "Test Data"]
+    buffer = io.StringIO()
+    buffer.write("Here are the test cases based on the BRD:\n\n```csv\n")
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(columns)
+    previous = None
+    for i in range(1, rows + 1):
+        transaction_type = TRANSACTION_TYPES[i % len(TRANSACTION_TYPES)]
+        if previous and i % 20 == 0:
+            row = list(previous)
+            row[0] = row[0] + " again"
+            row[1] = str(i)
+        else:
+            row = [
+                f"{rng.choice(['Positive', 'Negative', 'Edge'])} {transaction_type}: {sentence(rng.randint(4, 9))}",
+                str(i),
+                transaction_type,
+                f"{sentence(6)}.",
+                "\n".join(f"{step}. {sentence(rng.randint(5, 12))}" for step in range(1, rng.randint(3, 7))),
+                f"{sentence(rng.randint(6, 14))}.",
+                rng.choice(["High", "Medium", "Low"]),
+                f"Account {rng.randint(100000, 999999)}",
+            ]
+        previous = row
+        writer.writerow(row + ["stray"] if i % 97 == 0 else row)
+    buffer.write("```\n")
+    return buffer.getvalue()
+
+
+def load_recordings(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Scenario:
+    """One benchmark input: a use case replayed from recordings, or a synthetic response."""
+
+    def __init__(self, name, usecase=None, brd=None, recordings=None):
+        self.name = name
+        self.usecase = usecase
+        self.brd = brd
+        self.recordings = recordings or []
+
+    def stages(self, model, columns):
+        # Deferred: the pipeline reads its settings from the environment main() prepares
+        from brd_sections import compact_brd
+        from csv_stream import parse_csv_tolerant
+        from exports import csv_bytes, xlsx_bytes
+        from generation import generate_text
+        from pdf_renderer import generate_pdf_from_text
+        from pipeline import build_brd_prompt, build_test_case_prompt, prune_test_cases, test_case_frame
+
+        state = {"brd": self.brd}
+
+        def brd_prompt():
+            state["brd_prompt"] = build_brd_prompt(self.usecase, BENCH_DATE)
+
+        def brd_replay():
+            state["brd"] = generate_text(model, state["brd_prompt"], bypass_cache=True)
+
+        def prompt():
+            state["prompt"] = build_test_case_prompt(compact_brd(state["brd"])[0], columns)
+
+        def replay():
+            state["output"] = generate_text(model, state["prompt"], bypass_cache=True)
+
+        def parse():
+            state["parser"] = parse_csv_tolerant(state["output"], columns)
+
+        def reconcile():
+            state["df"] = test_case_frame(state["parser"], columns)
+            state["rows"] = len(state["df"])
+
+        def prune():
+            state["df"] = prune_test_cases(state["df"])
+            state["kept_rows"] = len(state["df"])
+
+        def xlsx():
+            state["xlsx_bytes"] = len(xlsx_bytes(state["df"]))
+
+        def csv_export():
+            state["csv_bytes"] = len(csv_bytes(state["df"]))
+
+        def pdf():
+            state["pdf_bytes"] = len(generate_pdf_from_text(state["brd"]).getvalue())
+
+        stages = [("brd_prompt", brd_prompt), ("brd_replay", brd_replay)] if self.usecase else []
+        stages += [("prompt", prompt), ("replay", replay), ("parse", parse), ("reconcile", reconcile), ("prune", prune),
+                   ("xlsx", xlsx), ("csv", csv_export), ("pdf", pdf)]
+        return stages, state
+
+
+def seeded_scenarios(recordings):
+    scenarios = []
+    for path in SEED_USE_CASES:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            usecase = f.read().strip()
+        scenarios.append(Scenario(name, usecase=usecase, recordings=recordings["use_cases"].get(name, [])))
+    return scenarios
+
+
+def synthetic_scenarios(row_counts):
+    from bench_pdf import synthetic_brd
+    from brd_sections import compact_brd
+    from genai_client import prompt_sha256
+    from pipeline import DEFAULT_COLUMNS, build_test_case_prompt
+
+    scenarios = []
+    for rows in row_counts:
+        # The BRD grows with the response so the PDF stage scales too
+        brd = synthetic_brd(max(1, min(100, rows // 500)))
+        prompt = build_test_case_prompt(compact_brd(brd)[0], DEFAULT_COLUMNS)
+        recording = {"kind": "test_cases", "prompt_sha256": prompt_sha256(prompt), "response": synthetic_response(rows)}
+        scenarios.append(Scenario(f"synthetic-{rows}", brd=brd, recordings=[recording]))
+    return scenarios
+
+
+def run_scenario(scenario, model, columns, repeats):
+    """Best-of-`repeats` seconds per stage, then one pass under tracemalloc for peak memory per stage."""
+    model.load(scenario.recordings)
+    seconds = {}
+    for _ in range(repeats):
+        stages, state = scenario.stages(model, columns)
+        for name, fn in stages:
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            seconds[name] = min(seconds.get(name, elapsed), elapsed)
+
+    peaks = {}
+    stages, state = scenario.stages(model, columns)
+    tracemalloc.start()
+    try:
+        for name, fn in stages:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks[name] = max(0, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    stage_results = {
+        name: {"seconds": round(seconds[name], 5), "peak_kib": round(peaks[name] / 1024, 1)} for name, _ in stages
+    }
+    checks = {key: state[key] for key in ("rows", "kept_rows", "csv_bytes") if key in state}
+    return {"stages": stage_results, "checks": checks}
+
+
+def environment():
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance, min_seconds=0.02, min_kib=256):
+    """Prints results against the baseline; returns the list of regressions."""
+    regressions = []
+    base_results = (baseline or {}).get("results", {})
+    replaced = replaced_stages(baseline)
+    print(f"{'scenario':<16} {'stage':<11} {'seconds':>9} {'base':>9} {'change':>7}   {'peak MiB':>9} {'base':>9} {'change':>7}")
+    for scenario, result in results.items():
+        base = base_results.get(scenario, {})
+        for stage, values in result["stages"].items():
+            base_values = base.get("stages", {}).get(stage)
+            line = f"{scenario:<16} {stage:<11} {values['seconds']:9.4f} "
+            flags = []
+            if base_values and stage in replaced:
+                line += f"{base_values['seconds']:9.4f} {'-':>7}   {values['peak_kib'] / 1024:9.2f} "
+                line += f"{base_values['peak_kib'] / 1024:9.2f} {'-':>7}  (baseline from an older implementation)"
+            elif base_values:
+                base_seconds, base_kib = base_values["seconds"], base_values["peak_kib"]
+                line += f"{base_seconds:9.4f} {_change(values['seconds'], base_seconds):>7}   "
+                line += f"{values['peak_kib'] / 1024:9.2f} {base_kib / 1024:9.2f} {_change(values['peak_kib'], base_kib):>7}"
+                # Small absolute differences are noise, whatever the ratio
+                if values["seconds"] > base_seconds * (1 + tolerance) and values["seconds"] - base_seconds > min_seconds:
+                    flags.append("slower")
+                if values["peak_kib"] > base_kib * (1 + tolerance) and values["peak_kib"] - base_kib > min_kib:
+                    flags.append("more memory")
+            else:
+                line += f"{'-':>9} {'-':>7}   {values['peak_kib'] / 1024:9.2f} {'-':>9} {'-':>7}"
+            if flags:
+                regressions.append(f"{scenario} {stage}: {', '.join(flags)}")
+                line += "  REGRESSION"
+            print(line)
+        if base.get("checks") and base["checks"] != result["checks"] and not replaced:
+            regressions.append(f"{scenario}: output changed from {base['checks']} to {result['checks']}")
+    return regressions
+
+
+def replaced_stages(baseline):
+    # Baselines from before versioning are version 1 throughout
+    base_versions = (baseline or {}).get("stage_versions", {})
+    return {stage for stage, version in STAGE_VERSIONS.items() if base_versions.get(stage, 1) != version}
+
+
+def _change(value, base):
+    return f"{(value - base) / base * 100:+.0f}%" if base else "-"
+
+
+def record(args):
+    from brd_sections import compact_brd
+    from genai_client import get_model, prompt_sha256
+    from generation import generate_text, model_name_of
+    from pipeline import DEFAULT_COLUMNS, build_brd_prompt, build_test_case_prompt
+
+    model = get_model(args.provider)
+    recordings = {"recorded_with": model_name_of(model), "date": BENCH_DATE, "use_cases": {}}
+    for path in SEED_USE_CASES:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            usecase = f.read().strip()
+        brd_prompt = build_brd_prompt(usecase, BENCH_DATE)
+        brd = generate_text(model, brd_prompt, bypass_cache=True)
+        prompt = build_test_case_prompt(compact_brd(brd)[0], DEFAULT_COLUMNS)
+        recordings["use_cases"][name] = [
+            {"kind": "brd", "prompt_sha256": prompt_sha256(brd_prompt), "response": brd},
+            {"kind": "test_cases", "prompt_sha256": prompt_sha256(prompt), "response": generate_text(model, prompt, bypass_cache=True)},
+        ]
+        print(f"Recorded {name} from {recordings['recorded_with']}")
+    with open(args.recordings, "w", encoding="utf-8") as f:
+        json.dump(recordings, f, indent=1)
+        f.write("\n")
+    print(f"Wrote {args.recordings}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline's non-model stages against recorded responses, and compare with a baseline."
+    )
+    parser.add_argument("--scenarios", nargs="+", help="Only run these scenarios (e.g. 'UseCase 1' synthetic-1000)")
+    parser.add_argument("--rows", type=int, nargs="+", default=SYNTHETIC_ROWS, help="Synthetic response sizes")
+    parser.add_argument("--repeats", type=int, default=3, help="Timing runs per scenario; the best is kept")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown or memory growth over the baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--recordings", default=RECORDINGS_FILE)
+    parser.add_argument("--record", action="store_true", help="Re-record the seed use cases from --provider instead of benchmarking")
+    parser.add_argument("--provider", default="stub", help="Model backend used by --record (gemini records real responses)")
+    args = parser.parse_args(argv)
+
+    # Keep the run away from the developer's response cache and quiet the per-stage logs
+    os.environ.setdefault("GENAI_CACHE_DIR", tempfile.mkdtemp(prefix="pipeline_bench_cache_"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # The largest synthetic BRD is over the default prompt budget on purpose
+    os.environ.setdefault("PROMPT_BUDGET_ACTION", "off")
+    if args.record:
+        return record(args)
+
+    from genai_client import ReplayProvider
+    from pipeline import DEFAULT_COLUMNS
+
+    scenarios = seeded_scenarios(load_recordings(args.recordings)) + synthetic_scenarios(args.rows)
+    if args.scenarios:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.scenarios]
+        if not scenarios:
+            parser.error("no scenario matched --scenarios")
+    model = ReplayProvider(recordings=[])
+
+    results = {}
+    for scenario in scenarios:
+        started = time.perf_counter()
+        results[scenario.name] = run_scenario(scenario, model, DEFAULT_COLUMNS, args.repeats)
+        print(f"{scenario.name}: {results[scenario.name]['checks']} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    if model.drift:
+        print(f"Note: {model.drift} prompt(s) no longer match the recordings and were answered by kind; "
+              f"re-record with --record", file=sys.stderr)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != environment():
+            print("Note: the baseline was measured on a different machine or Python; timings may not be comparable",
+                  file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        if baseline and args.scenarios:
+            if replaced_stages(baseline):
+                # The other scenarios' numbers would be filed under the new stage versions
+                print("The baseline predates a replaced stage; save it from a full run, without --scenarios",
+                      file=sys.stderr)
+                return 1
+            # A partial run only replaces the scenarios it ran
+            results = {**baseline.get("results", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "stage_versions": STAGE_VERSIONS, "results": results}, f, indent=1)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if regressions:
+        print()
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the model rate limiter against the fake Gemini server.")
+    parser.add_argument("-n", "--requests", type=int, default=60)
+    parser.add_argument("-w", "--workers", type=int, default=12, help="Concurrent callers (simulated sessions)")
+    parser.add_argument("--rpm", type=float, default=300, help="Client limiter requests/minute")
+    parser.add_argument("--tpm", type=float, default=1000000, help="Client limiter tokens/minute")
+    parser.add_argument("--server-rpm", type=int, default=360, help="Fake server quota (0 = unlimited)")
+    parser.add_argument("--error-rate-429", type=float, default=0.1)
+    parser.add_argument("--error-rate-500", type=float, default=0.1)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--backoff-base", type=float, default=0.2)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    # The limiter reads its settings when first imported
+    os.environ.update({
+        "GENAI_RPM": str(args.rpm),
+        "GENAI_TPM": str(args.tpm),
+        "GENAI_MAX_RETRIES": str(args.max_retries),
+        "GENAI_BACKOFF_BASE": str(args.backoff_base),
+        "GENAI_TRANSPORT": "rest",
+    })
+    from fake_gemini_server import start_in_background
+
+    server = start_in_background(
+        rpm=args.server_rpm, error_rate_429=args.error_rate_429, error_rate_500=args.error_rate_500,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+    os.environ["GENAI_API_ENDPOINT"] = server.endpoint
+
+    from genai_client import GeminiProvider
+    from generation import response_text
+    from rate_limiter import get_rate_limiter
+
+    model = GeminiProvider(api_key="fake-key")
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            text = response_text(model.generate_content(f"Use the exact headers below:\n\"Title\",\"Steps\"\nrequest {i}"))
+            return bool(text), time.perf_counter() - started
+        except Exception as e:
+            print(f"request {i} failed: {type(e).__name__}: {e}")
+            return False, time.perf_counter() - started
+
+    print(f"{args.requests} requests from {args.workers} callers -> {server.endpoint}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(one, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    ok = sum(1 for success, _ in results if success)
+    latencies = sorted(seconds for _, seconds in results)
+    limiter, served = get_rate_limiter().stats(), server.stats()
+    print(f"  succeeded          {ok}/{args.requests} in {wall:.1f}s ({ok / wall * 60:.0f} requests/min)")
+    print(f"  latency            p50 {statistics.median(latencies):.2f}s  p95 {latencies[int(0.95 * (len(latencies) - 1))]:.2f}s")
+    print(f"  limiter            throttled {limiter['throttled']} ({limiter['throttle_seconds']:.1f}s waiting), "
+          f"max queue depth {limiter['max_queue_depth']}")
+    print(f"  retries            {limiter['retries']} ({limiter['rate_limited']} after 429, {limiter['server_errors']} after 5xx), "
+          f"{limiter['failures']} gave up")
+    print(f"  server             {served['requests']} requests, {served['injected_429']} injected 429, "
+          f"{served['injected_500']} injected 500, {served['quota_429']} over quota")
+    server.shutdown()
+
+    failures = []
+    if ok < args.requests:
+        failures.append(f"{args.requests - ok} request(s) failed after retries")
+    if args.server_rpm and args.rpm <= args.server_rpm and served["quota_429"]:
+        failures.append("limiter let requests exceed the server quota")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import email.utils
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+# --- Limiter Settings (0 disables a limit) ---
+REQUESTS_PER_MINUTE = float(os.getenv("GENAI_RPM", "60"))
+TOKENS_PER_MINUTE = float(os.getenv("GENAI_TPM", "1000000"))
+MAX_RETRIES = int(os.getenv("GENAI_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = float(os.getenv("GENAI_BACKOFF_BASE", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("GENAI_BACKOFF_MAX", "60"))
+BURST_FRACTION = 0.1
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRY_HINT_RE = re.compile(r"retry(?:Delay\"?:\s*\"| in | after )(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+def error_status(exc):
+    # google.api_core errors carry an HTTP status in .code; REST errors may only have .response
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    if isinstance(value, int):
+        return value
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return 503
+    return None
+
+
+def retry_after_seconds(exc):
+    """Server-provided retry hint in seconds, or None.
+
+    Checks, in order: a retry_after attribute, the HTTP Retry-After header,
+    a google.rpc.RetryInfo detail and a "retry in Ns" hint in the message.
+    """
+    value = getattr(exc, "retry_after", None)
+    if value is not None:
+        return float(value)
+
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    header = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(header)
+            if parsed is not None:
+                return max(0.0, parsed.timestamp() - time.time())
+
+    try:
+        details = list(getattr(exc, "details", None) or [])
+    except TypeError:
+        details = []
+    for detail in details:
+        if isinstance(detail, dict):
+            # REST errors keep unparsed details as JSON, e.g. {"retryDelay": "23s"}
+            delay = str(detail.get("retryDelay", "")).rstrip("s")
+            if delay:
+                return float(delay)
+            continue
+        delay = getattr(detail, "retry_delay", None)
+        if delay is None:
+            continue
+        if hasattr(delay, "total_seconds"):
+            return delay.total_seconds()
+        return delay.seconds + delay.nanos / 1e9
+
+    match = RETRY_HINT_RE.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Allows a burst of up to a tenth of the per-minute limit, then refills at a
+    rate chosen so that no 60 second window exceeds per_minute."""
+
+    def __init__(self, per_minute, burst_fraction=BURST_FRACTION):
+        self.capacity = max(1.0, per_minute * burst_fraction)
+        self.rate = max(per_minute - self.capacity, per_minute / 2) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        # Waiting is capped at a full bucket (see wait_time), but the whole amount is charged;
+        # a request larger than the bucket leaves it in debt for the callers after it
+        self.tokens -= amount
+
+    def debit(self, amount):
+        # Actual usage above the estimate; the balance may go negative
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """Process-wide limiter for model calls.
+
+    Callers queue in FIFO order until both the request and the token bucket
+    can cover them. A 429 pauses every caller for the server's retry hint (or
+    the backoff delay); other transient errors only delay the failing caller.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE_SECONDS, backoff_max=BACKOFF_MAX_SECONDS):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._paused_until = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.calls = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.failures = 0
+
+    def _delay(self, tokens, now):
+        delay = self._paused_until - now
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1, now))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.wait_time(tokens, now))
+        return delay
+
+    def acquire(self, tokens=0):
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            started = now = time.monotonic()
+            try:
+                while True:
+                    if ticket == self._serving:
+                        delay = self._delay(tokens, now)
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                    now = time.monotonic()
+                if self.requests is not None:
+                    self.requests.take(1)
+                if self.tokens is not None and tokens:
+                    self.tokens.take(tokens)
+            finally:
+                self._serving += 1
+                self.queue_depth -= 1
+                self._cond.notify_all()
+            self.calls += 1
+            if now > started:
+                self.throttled += 1
+                self.throttle_seconds += now - started
+
+    def pause(self, seconds):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def debit_tokens(self, amount):
+        if self.tokens is not None and amount > 0:
+            with self._cond:
+                self.tokens.debit(amount)
+
+    def backoff(self, attempt):
+        # Exponential with jitter in the upper half, so retries neither stampede nor collapse to 0
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def call(self, fn, tokens=0):
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                status = error_status(e)
+                if status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                    with self._cond:
+                        self.failures += 1
+                    raise
+                hint = retry_after_seconds(e)
+                delay = min(self.backoff_max, hint) if hint is not None else self.backoff(attempt)
+                with self._cond:
+                    self.retries += 1
+                    if status == 429:
+                        self.rate_limited += 1
+                    else:
+                        self.server_errors += 1
+                if status == 429:
+                    # Quota is shared, so everyone waits rather than adding to the overload
+                    self.pause(delay)
+                else:
+                    time.sleep(delay)
+
+    def call_stream(self, start, tokens=0):
+        """call() for a streaming request; start() returns the chunk iterator.
+
+        Errors up to the first chunk are retried like any call. Later ones are
+        raised to the caller, since a retry would repeat output it already has,
+        but a 429 still pauses every caller.
+        """
+        def first_chunk():
+            chunks = iter(start())
+            for chunk in chunks:
+                return itertools.chain([chunk], chunks)
+            return iter(())
+
+        return self._watch_stream(self.call(first_chunk, tokens))
+
+    def _watch_stream(self, chunks):
+        try:
+            yield from chunks
+        except Exception as e:
+            status = error_status(e)
+            with self._cond:
+                self.failures += 1
+                if status == 429:
+                    self.rate_limited += 1
+            if status == 429:
+                hint = retry_after_seconds(e)
+                self.pause(min(self.backoff_max, hint) if hint is not None else self.backoff(0))
+            raise
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "throttle_seconds": round(self.throttle_seconds, 3),
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "server_errors": self.server_errors,
+                "failures": self.failures,
+            }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
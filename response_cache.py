@@ -0,0 +1,155 @@
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- Cache Settings ---
+CACHE_DIR = os.getenv("GENAI_CACHE_DIR", ".genai_cache")
+CACHE_MAX_MB = float(os.getenv("GENAI_CACHE_MAX_MB", "200"))
+CACHE_MAX_AGE_HOURS = float(os.getenv("GENAI_CACHE_MAX_AGE_HOURS", "168"))
+
+
+def config_fingerprint(generation_config):
+    # GenerationConfig may be a dict, a dataclass or a proto-like object
+    if generation_config is None:
+        return None
+    if dataclasses.is_dataclass(generation_config):
+        generation_config = dataclasses.asdict(generation_config)
+    if isinstance(generation_config, dict):
+        return json.dumps(generation_config, sort_keys=True, default=str)
+    return repr(generation_config)
+
+
+class ResponseCache:
+    """On-disk cache of model responses with size and age based LRU eviction."""
+
+    def __init__(self, directory=CACHE_DIR, max_mb=CACHE_MAX_MB, max_age_hours=CACHE_MAX_AGE_HOURS):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = None  # key -> size, ordered least to most recently used
+        self._total_bytes = 0
+
+    def make_key(self, model_name, prompt, generation_config=None):
+        payload = json.dumps(
+            [model_name, prompt, config_fingerprint(generation_config)],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".json"):
+                        continue
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def _drop(self, key):
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._drop(key)
+                self.misses += 1
+                return None
+            if time.time() - entry.get("created", 0) > self.max_age:
+                self._drop(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            # Touch the file so recency survives a process restart
+            os.utime(path, None)
+            self._index.move_to_end(key)
+            self.hits += 1
+            return entry["text"]
+
+    def put(self, key, text):
+        data = json.dumps({"created": time.time(), "text": text}, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _evict_locked(self):
+        now = time.time()
+        for key in list(self._index):
+            try:
+                mtime = os.path.getmtime(self._path(key))
+            except OSError:
+                mtime = 0
+            # Entries are in LRU order; stop at the first one that is fresh and fits
+            if now - mtime <= self.max_age and self._total_bytes <= self.max_bytes:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
@@ -0,0 +1,201 @@
+import gzip
+import os
+import pickle
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# --- Session Store Settings ---
+SESSION_STORE_DIR = os.getenv("SESSION_STORE_DIR", ".session_store")
+SESSION_MEMORY_MB = float(os.getenv("SESSION_MEMORY_MB", "16"))
+SESSION_STORE_MEMORY_MB = float(os.getenv("SESSION_STORE_MEMORY_MB", "256"))
+SESSION_IDLE_MINUTES = float(os.getenv("SESSION_IDLE_MINUTES", "20"))
+SESSION_RETENTION_HOURS = float(os.getenv("SESSION_RETENTION_HOURS", "24"))
+EVICTION_INTERVAL_SECONDS = 60
+COMPRESS_LEVEL = 3
+
+NAME_RE = re.compile(r"^[\w-]+$")
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def artifact_size(value):
+    # DataFrames report their real footprint; everything else is close enough with getsizeof
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class _Resident:
+    __slots__ = ("value", "size", "on_disk")
+
+    def __init__(self, value, size, on_disk):
+        self.value = value
+        self.size = size
+        self.on_disk = on_disk
+
+
+class SessionStore:
+    """Per-session artifacts (BRD text, result tables) under a memory budget.
+
+    Artifacts over the per-session or global budget are spilled, least
+    recently used first, to gzip-compressed pickles under `directory` and read
+    back on the next `get`. Sessions idle for `idle_minutes` are spilled in
+    full and forgotten; their files are deleted after `retention_hours`.
+    """
+
+    def __init__(self, directory=SESSION_STORE_DIR, session_mb=SESSION_MEMORY_MB, total_mb=SESSION_STORE_MEMORY_MB,
+                 idle_minutes=SESSION_IDLE_MINUTES, retention_hours=SESSION_RETENTION_HOURS):
+        self.directory = directory
+        self.session_bytes = int(session_mb * 1024 * 1024)
+        self.total_bytes = int(total_mb * 1024 * 1024)
+        self.idle_seconds = idle_minutes * 60
+        self.retention_seconds = retention_hours * 3600
+        self.spills = 0
+        self.rehydrates = 0
+        self.idle_evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()  # (session_id, name) -> _Resident, least to most recently used
+        self._memory = 0
+        self._session_memory = {}
+        self._last_seen = {}
+        self._next_sweep = 0.0
+
+    def _path(self, session_id, name):
+        if not (NAME_RE.match(session_id) and NAME_RE.match(name)):
+            raise ValueError(f"invalid session artifact {session_id!r}/{name!r}")
+        return os.path.join(self.directory, session_id, f"{name}.pkl.gz")
+
+    def _write(self, path, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=COMPRESS_LEVEL) as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        # Only files this store wrote itself are ever unpickled
+        with gzip.open(path, "rb") as f:
+            return pickle.load(f)
+
+    def _add(self, key, value, on_disk):
+        entry = _Resident(value, artifact_size(value), on_disk)
+        self._resident[key] = entry
+        self._memory += entry.size
+        self._session_memory[key[0]] = self._session_memory.get(key[0], 0) + entry.size
+
+    def _remove(self, key):
+        entry = self._resident.pop(key)
+        self._memory -= entry.size
+        self._session_memory[key[0]] -= entry.size
+        if not self._session_memory[key[0]]:
+            del self._session_memory[key[0]]
+        return entry
+
+    def _spill(self, key):
+        entry = self._remove(key)
+        if not entry.on_disk:
+            self._write(self._path(*key), entry.value)
+            self.spills += 1
+
+    def _enforce(self, session_id):
+        while self._session_memory.get(session_id, 0) > self.session_bytes:
+            self._spill(next(key for key in self._resident if key[0] == session_id))
+        while self._memory > self.total_bytes:
+            self._spill(next(iter(self._resident)))
+
+    def _sweep(self, now):
+        # Spill sessions nobody has touched for a while, then delete expired files
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + EVICTION_INTERVAL_SECONDS
+        for session_id, last_seen in list(self._last_seen.items()):
+            if now - last_seen < self.idle_seconds:
+                continue
+            for key in [key for key in self._resident if key[0] == session_id]:
+                self._spill(key)
+            del self._last_seen[session_id]
+            self.idle_evictions += 1
+        if not os.path.isdir(self.directory):
+            return
+        wall_now = time.time()
+        for session_id in os.listdir(self.directory):
+            path = os.path.join(self.directory, session_id)
+            if session_id in self._last_seen or not os.path.isdir(path):
+                continue
+            if wall_now - os.path.getmtime(path) > self.retention_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                self.expired += 1
+
+    def put(self, session_id, name, value):
+        key = (session_id, name)
+        path = self._path(session_id, name)
+        with self._lock:
+            now = time.monotonic()
+            self._last_seen[session_id] = now
+            if key in self._resident:
+                self._remove(key)
+            if os.path.exists(path):
+                os.remove(path)
+            if value is not None:
+                self._add(key, value, on_disk=False)
+                self._enforce(session_id)
+            self._sweep(now)
+
+    def get(self, session_id, name, default=None):
+        key = (session_id, name)
+        path = self._path(session_id, name)
+        with self._lock:
+            now = time.monotonic()
+            self._last_seen[session_id] = now
+            self._sweep(now)
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._resident.move_to_end(key)
+                return entry.value
+            if not os.path.exists(path):
+                return default
+            value = self._read(path)
+            self.rehydrates += 1
+            self._add(key, value, on_disk=True)
+            self._enforce(session_id)
+            return value
+
+    def has(self, session_id, name):
+        with self._lock:
+            return (session_id, name) in self._resident or os.path.exists(self._path(session_id, name))
+
+    def loader(self, session_id, name):
+        # Zero-argument callable for lazy_export, so a spilled table is read only when downloaded
+        return lambda: self.get(session_id, name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._last_seen),
+                "resident": len(self._resident),
+                "memory_mb": round(self._memory / (1024 * 1024), 2),
+                "spills": self.spills,
+                "rehydrates": self.rehydrates,
+                "idle_evictions": self.idle_evictions,
+                "expired": self.expired,
+            }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_session_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SessionStore()
+        return _default_store
@@ -0,0 +1,95 @@
+import threading
+
+
+class Flight:
+    """One in-flight model call whose text is shared with every caller that joins it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self):
+        # Replays the chunks published so far, then yields new ones as the leader streams them
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks = self.chunks[index:]
+                index += len(chunks)
+                done, error = self.done and index >= len(self.chunks), self.error
+            yield from chunks
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+    def result(self):
+        return "".join(self.follow()).strip()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent requests, keyed by the response cache key.
+
+    The first caller for a key becomes the leader and makes the model call;
+    callers arriving while it is in flight wait for the leader's text instead
+    of starting their own call. A leader's error is raised in every follower.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        # Returns (flight, is_leader)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.calls += 1
+            return flight, True
+
+    def release(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+            }
+
+
+_default_single_flight = None
+_default_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    global _default_single_flight
+    with _default_single_flight_lock:
+        if _default_single_flight is None:
+            _default_single_flight = SingleFlight()
+        return _default_single_flight
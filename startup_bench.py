@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Modules the login page must not pay for
+HEAVY_MODULES = ["pandas", "fpdf", "xlsxwriter", "google.generativeai"]
+
+# Runs in a fresh interpreter so every measurement is a real cold start
+CHILD_SCRIPT = r"""
+import json, sys, time
+
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_ms = (time.perf_counter() - started) * 1000
+
+app_path, heavy_modules = sys.argv[1], sys.argv[2].split(",")
+at = AppTest.from_file(app_path, default_timeout=120)
+
+started = time.perf_counter()
+at.run()
+login_ms = (time.perf_counter() - started) * 1000
+# The model warm-up only starts after login, so nothing here may have pulled in the SDK
+loaded_at_login = [m for m in heavy_modules if m in sys.modules]
+
+started = time.perf_counter()
+at.session_state["logged_in"] = True
+at.run()
+template = [s for s in at.selectbox if "template" in s.label.lower()]
+if template:
+    template[0].set_value("No").run()
+at.text_area[0].set_value("As an agent, I want to create a new commercial auto policy.").run()
+[b for b in at.button if "BRD" in b.label][0].click().run()
+first_generation_ms = (time.perf_counter() - started) * 1000
+
+errors = [e.message for e in at.exception]
+print(json.dumps({
+    "streamlit_import_ms": streamlit_ms,
+    "login_page_ms": login_ms,
+    "first_generation_ms": first_generation_ms,
+    "heavy_modules_at_login": loaded_at_login,
+    "errors": errors,
+}))
+"""
+
+
+def run_once(app_path, env):
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, app_path, ",".join(HEAVY_MODULES)],
+        cwd=os.path.dirname(app_path), env=env, capture_output=True, text=True, timeout=300,
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"benchmark run failed:\n{result.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time of a Streamlit app.")
+    parser.add_argument("app", nargs="?", default="appnew_updated_pooja.py")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--login-budget-ms", type=float, default=1500)
+    parser.add_argument("--generation-budget-ms", type=float, default=4000)
+    args = parser.parse_args(argv)
+
+    app_path = os.path.abspath(args.app)
+    env = dict(os.environ)
+    # Offline, uncached model so only app start-up cost is measured
+    env["GENAI_PROVIDER"] = "stub"
+    env["GENAI_CACHE_DIR"] = tempfile.mkdtemp(prefix="startup_bench_cache_")
+    env.setdefault("VALID_USERNAME", "bench")
+    env.setdefault("VALID_PASSWORD", "bench")
+
+    runs = []
+    for i in range(args.runs):
+        run = run_once(app_path, env)
+        runs.append(run)
+        print(f"run {i + 1}: login page {run['login_page_ms']:.0f} ms, first generation {run['first_generation_ms']:.0f} ms")
+
+    login_ms = statistics.median(r["login_page_ms"] for r in runs)
+    generation_ms = statistics.median(r["first_generation_ms"] for r in runs)
+    streamlit_ms = statistics.median(r["streamlit_import_ms"] for r in runs)
+    heavy = sorted({m for r in runs for m in r["heavy_modules_at_login"]})
+    errors = [e for r in runs for e in r["errors"]]
+
+    print()
+    print(f"{os.path.basename(app_path)} (median of {len(runs)} cold starts)")
+    print(f"  streamlit import     {streamlit_ms:8.0f} ms")
+    print(f"  time-to-login-page   {login_ms:8.0f} ms  (budget {args.login_budget_ms:.0f} ms)")
+    print(f"  time-to-first-BRD    {generation_ms:8.0f} ms  (budget {args.generation_budget_ms:.0f} ms)")
+    print(f"  heavy modules at login: {', '.join(heavy) or 'none'}")
+
+    failures = []
+    if login_ms > args.login_budget_ms:
+        failures.append("login page over budget")
+    if generation_ms > args.generation_budget_ms:
+        failures.append("first generation over budget")
+    if heavy:
+        failures.append(f"login page imported {', '.join(heavy)}")
+    if errors:
+        failures.append(f"app raised: {errors[0]}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
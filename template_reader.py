@@ -0,0 +1,70 @@
+import csv
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+TEMPLATE_CACHE_ENTRIES = 64
+
+_columns_cache = OrderedDict()
+_columns_cache_lock = threading.Lock()
+
+
+def _label_columns(names):
+    # Same column names pandas would give: blanks become "Unnamed: i", duplicates get ".1", ".2"
+    while names and (names[-1] is None or str(names[-1]).strip() == ""):
+        names = names[:-1]
+    columns, counts = [], {}
+    for index, name in enumerate(names):
+        name = f"Unnamed: {index}" if name is None or str(name).strip() == "" else str(name)
+        count = counts.get(name, 0)
+        counts[name] = count + 1
+        columns.append(f"{name}.{count}" if count else name)
+    return columns
+
+
+def _csv_header(data):
+    try:
+        text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+        return next(csv.reader(text), [])
+    except UnicodeDecodeError:
+        text = io.TextIOWrapper(io.BytesIO(data), encoding="latin-1", newline="")
+        return next(csv.reader(text), [])
+
+
+def _xlsx_header(data):
+    # read_only streams the sheet XML, so only the first row is ever parsed
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        return list(next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+    finally:
+        workbook.close()
+
+
+def read_template_columns(name, data):
+    """Column names of an uploaded .csv or .xlsx template, read from its header row only.
+
+    Results are cached by file content hash, so Streamlit reruns reuse the
+    columns of a template that was already read.
+    """
+    key = hashlib.sha256(data).hexdigest()
+    with _columns_cache_lock:
+        if key in _columns_cache:
+            _columns_cache.move_to_end(key)
+            return list(_columns_cache[key])
+
+    header = _csv_header(data) if name.lower().endswith(".csv") else _xlsx_header(data)
+    columns = _label_columns(header)
+    with _columns_cache_lock:
+        _columns_cache[key] = columns
+        while len(_columns_cache) > TEMPLATE_CACHE_ENTRIES:
+            _columns_cache.popitem(last=False)
+    return list(columns)
+
+
+def uploaded_template_columns(template_file):
+    # Streamlit UploadedFile: getvalue() returns the bytes without moving the read position
+    return read_template_columns(template_file.name, template_file.getvalue())
@@ -0,0 +1,210 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from brd_sections import estimate_tokens
+from metrics import TOKEN_BUCKETS, log_event, registry
+
+# --- Token Budget Settings ---
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "32000"))
+PROMPT_BUDGET_ACTION = os.getenv("PROMPT_BUDGET_ACTION", "warn")  # warn, block or off
+BUDGET_ACTIONS = ("warn", "block", "off")
+RECENT_CALLS = 500  # per-call records kept for the process-wide view
+
+
+class PromptTooLarge(ValueError):
+    pass
+
+
+def prompt_tokens_of(prompt):
+    return estimate_tokens(prompt if isinstance(prompt, str) else "".join(map(str, prompt)))
+
+
+def reported_usage(response):
+    # (prompt, response) token counts from the API's usage metadata, or None where there is none
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    if not prompt_tokens:
+        return None
+    return prompt_tokens, getattr(usage, "candidates_token_count", 0) or 0
+
+
+def _response_chars(response):
+    try:
+        return response.text
+    except Exception:
+        return ""
+
+
+class TokenTally:
+    """Token counts for one run, or for the whole process.
+
+    Prompt sizes are estimated before sending (that is what the budget is
+    checked against); after each call the counts the API reports replace the
+    estimate where available.
+    """
+
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET, action=PROMPT_BUDGET_ACTION, keep=None):
+        if action not in BUDGET_ACTIONS:
+            raise ValueError(f"unknown prompt budget action {action!r}, expected one of {', '.join(BUDGET_ACTIONS)}")
+        self.budget = budget
+        self.action = action
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.largest_prompt = 0
+        self.saved_tokens = 0
+        self.blocked = 0
+        self.warnings = []
+        self.records = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def add_call(self, record):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += record["Prompt Tokens"]
+            self.response_tokens += record["Response Tokens"]
+            self.largest_prompt = max(self.largest_prompt, record["Prompt Tokens"])
+            self.records.append(record)
+
+    def add_cached(self):
+        with self._lock:
+            self.cached_calls += 1
+
+    def add_saved(self, tokens):
+        with self._lock:
+            self.saved_tokens += max(0, tokens)
+
+    def add_warning(self, message, blocked=False):
+        with self._lock:
+            self.blocked += blocked
+            self.warnings.append(message)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "cached_calls": self.cached_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "response_tokens": self.response_tokens,
+                "largest_prompt": self.largest_prompt,
+                "saved_tokens": self.saved_tokens,
+                "over_budget": len(self.warnings),
+                "blocked": self.blocked,
+            }
+
+
+_current_tally = contextvars.ContextVar("token_tally", default=None)
+_process_tally = TokenTally(action="off", keep=RECENT_CALLS)
+
+
+def get_token_totals():
+    # Shared by every session in this process
+    return _process_tally
+
+
+@contextmanager
+def track_tokens(budget=None, action=None):
+    """Counts every model call made in this context (and in pools submitted via copy_context)."""
+    tally = TokenTally(PROMPT_TOKEN_BUDGET if budget is None else budget, action or PROMPT_BUDGET_ACTION)
+    reset = _current_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _current_tally.reset(reset)
+
+
+def _tallies():
+    tally = _current_tally.get()
+    return (_process_tally, tally) if tally is not None else (_process_tally,)
+
+
+def check_prompt(prompt):
+    """Estimated prompt tokens, after applying the current budget; raises PromptTooLarge when blocking."""
+    tokens = prompt_tokens_of(prompt)
+    tally = _current_tally.get()
+    budget, action = (tally.budget, tally.action) if tally is not None else (PROMPT_TOKEN_BUDGET, PROMPT_BUDGET_ACTION)
+    if action == "off" or not budget or tokens <= budget:
+        return tokens
+    blocked = action == "block"
+    message = f"Prompt of ~{tokens:,} tokens is over the {budget:,} token budget" + (" and was not sent" if blocked else "")
+    for target in _tallies():
+        target.add_warning(message, blocked)
+    registry.inc("genai_prompts_over_budget_total", action=action)
+    log_event("prompt_over_budget", logging.WARNING, prompt_tokens=tokens, budget=budget, action=action)
+    if blocked:
+        raise PromptTooLarge(message)
+    return tokens
+
+
+def record_call(model_name, estimated_prompt_tokens, response, response_text=None, seconds=None):
+    reported = reported_usage(response)
+    if reported is None:
+        text = _response_chars(response) if response_text is None else response_text
+        prompt_tokens, response_tokens, counted = estimated_prompt_tokens, estimate_tokens(text), "estimated"
+    else:
+        (prompt_tokens, response_tokens), counted = reported, "reported"
+    record = {
+        "Time": time.strftime("%H:%M:%S"),
+        "Model": model_name,
+        "Prompt Tokens": prompt_tokens,
+        "Response Tokens": response_tokens,
+        "Counted": counted,
+        "Seconds": round(seconds, 2) if seconds is not None else None,
+    }
+    for target in _tallies():
+        target.add_call(record)
+    registry.inc("genai_tokens_total", prompt_tokens, model=model_name, kind="prompt")
+    registry.inc("genai_tokens_total", response_tokens, model=model_name, kind="response")
+    registry.observe("genai_prompt_tokens", prompt_tokens, TOKEN_BUCKETS, model=model_name)
+    if seconds is not None:
+        registry.observe("genai_model_call_seconds", seconds, model=model_name)
+    log_event("model_call", model=model_name, prompt_tokens=prompt_tokens, response_tokens=response_tokens, counted=counted,
+              seconds=record["Seconds"])
+    return record
+
+
+def metered_stream(model_name, estimated_prompt_tokens, chunks, started=None, on_done=None):
+    # Passes chunks through and records the call once the stream ends; the last chunk carries the usage.
+    # on_done(last chunk, record) runs after recording, e.g. to charge the rate limiter.
+    parts, last = [], None
+    try:
+        for chunk in chunks:
+            last = chunk
+            parts.append(_response_chars(chunk))
+            yield chunk
+    finally:
+        seconds = time.perf_counter() - started if started is not None else None
+        record = record_call(model_name, estimated_prompt_tokens, last, "".join(parts), seconds)
+        if on_done is not None:
+            on_done(last, record)
+
+
+def record_cached():
+    # A cache hit or a joined in-flight request: no tokens spent
+    for target in _tallies():
+        target.add_cached()
+    registry.inc("genai_cached_calls_total")
+
+
+def record_saved(tokens):
+    for target in _tallies():
+        target.add_saved(tokens)
+
+
+def token_summary(tally):
+    stats = tally.stats()
+    if not stats["calls"] and not stats["cached_calls"]:
+        return ""
+    summary = (f"Tokens: {stats['prompt_tokens']:,} prompt + {stats['response_tokens']:,} response over "
+               f"{stats['calls']} model call(s), largest prompt {stats['largest_prompt']:,}")
+    if stats["cached_calls"]:
+        summary += f"; {stats['cached_calls']} call(s) served without the model"
+    if stats["saved_tokens"]:
+        summary += f"; BRD compaction saved ~{stats['saved_tokens']:,} prompt tokens"
+    return summary
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+WORDS = (
+    "policy account agent underwriting coverage vehicle driver premium quote bind issue rating endorsement "
+    "cancellation reinstatement rewrite submission liability collision comprehensive deductible limit "
+    "effective date jurisdiction validation rule screen producer garaging territory symbol"
+).split()
+TRANSACTION_TYPES = ["Submission", "Policy Change", "Cancellation", "Rewrite", "Reinstatement"]
+EXPORTERS = ["legacy", "streaming", "file"]
+
+
+def synthetic_test_cases(rows, seed=5):
+    """A test case frame of `rows` rows with long multiline Steps, as large suites have."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    records = []
+    for i in range(1, rows + 1):
+        records.append({
+            "Test Case ID": f"TC-{i:05d}",
+            "Transaction Type": TRANSACTION_TYPES[i % len(TRANSACTION_TYPES)],
+            "Test Case Title": sentence(rng.randint(4, 9)),
+            "Preconditions": sentence(rng.randint(6, 14)),
+            "Steps": "\n".join(f"{s}. {sentence(rng.randint(6, 16))}" for s in range(1, rng.randint(4, 10))),
+            "Expected Results": sentence(rng.randint(10, 24)),
+            "Priority": rng.choice(["High", "Medium", "Low"]),
+        })
+    return pd.DataFrame(records)
+
+
+def legacy_xlsx_bytes(df):
+    # Previous exporter, kept here as the baseline: the whole workbook is built in memory on one sheet
+    import pandas as pd
+
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        df.to_excel(writer, index=False, sheet_name="TestCases")
+    return buffer.getvalue()
+
+
+def peak_rss_mb():
+    # VmHWM can be reset (see reset_peak_rss); ru_maxrss is the fallback on other platforms
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def run_worker(exporter, rows):
+    # One export in this process, so peak RSS belongs to it alone
+    df = synthetic_test_cases(rows)
+    reset = reset_peak_rss()
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    if exporter == "legacy":
+        size = len(legacy_xlsx_bytes(df))
+    elif exporter == "streaming":
+        from exports import xlsx_bytes
+
+        size = len(xlsx_bytes(df))
+    else:
+        from exports import write_xlsx
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "bench.xlsx")
+            write_xlsx(df, path)
+            size = os.path.getsize(path)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"seconds": seconds, "bytes": size, "rss_before_mb": before, "peak_rss_mb": peak_rss_mb(),
+                      "peak_reset": reset}))
+
+
+def bench(exporter, rows):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", exporter, str(rows)],
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    growth = result["peak_rss_mb"] - result["rss_before_mb"]
+    print(f"  {exporter:<10} {result['seconds']:7.2f} s  {rows / result['seconds']:9.0f} rows/s  "
+          f"peak RSS {result['peak_rss_mb']:7.1f} MiB (+{growth:6.1f} MiB for the export"
+          f"{'' if result['peak_reset'] else ', includes building the frame'})  {result['bytes'] / 1024 / 1024:6.1f} MiB xlsx")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Excel exporters on synthetic test case suites.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--exporters", nargs="+", choices=EXPORTERS, default=EXPORTERS,
+                        help="legacy = pd.ExcelWriter in memory, streaming = xlsx_bytes(), file = write_xlsx() to disk")
+    parser.add_argument("--worker", nargs=2, metavar=("EXPORTER", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker[0], int(args.worker[1]))
+        return 0
+    for rows in args.rows:
+        print(f"{rows} test cases")
+        for exporter in args.exporters:
+            bench(exporter, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())